@@ -0,0 +1,327 @@
+"""
+MCP工具基准测试
+Benchmark of the MCP tools
+
+在进程内通过FastMCP客户端调用工具, 连接一个本地启动(或已有)的Jupyter服务器,
+按不同的Notebook大小、输出大小、图片数量与并发度测量每个工具的延迟(p50/p95/p99)、吞吐量与峰值内存,
+结果以JSON格式输出, 并可与保存的基线结果比较
+Drive the tools in-process through a FastMCP client against a locally started (or existing) Jupyter server,
+measure the latency (p50/p95/p99), throughput and peak RSS of each tool at several notebook sizes,
+output sizes, image counts and concurrency levels, write the results as JSON and compare them with a saved baseline
+
+Usage:
+    uv run python benchmarks/bench.py --sizes 10,1000 --concurrency 1,4 --output results.json
+    uv run python benchmarks/bench.py --baseline results.json --fail-on-regression
+"""
+
+import argparse, asyncio, json, os, platform, resource, secrets, socket, statistics, subprocess, sys, tempfile, time, urllib.request
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fastmcp import Client
+from better_jupyter_mcp_server import __version__
+from better_jupyter_mcp_server.server import mcp
+
+# 每次批量插入的Cell数量, 避免单次调用参数过大
+# Number of cells inserted per batch, so that a single call never gets too large
+BATCH_SIZE = 1000
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LocalJupyterServer:
+    """
+    在临时目录中启动的本地Jupyter服务器(包含协作扩展)
+    Local Jupyter server (with the collaboration extension) started in a temporary directory
+    """
+
+    def __init__(self):
+        self.port = _free_port()
+        self.token = secrets.token_hex(16)
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._root = tempfile.TemporaryDirectory(prefix="jupyter-mcp-bench-")
+        self._process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "LocalJupyterServer":
+        self._process = subprocess.Popen(
+            [
+                sys.executable, "-m", "jupyter", "server", "--no-browser", "--allow-root",
+                f"--port={self.port}", f"--ServerApp.token={self.token}", f"--ServerApp.root_dir={self._root.name}",
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f"{self.url}/api/status?token={self.token}", timeout=1)
+                return self
+            except Exception:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("Local Jupyter server did not start within 60 seconds")
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._root.cleanup()
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of the process in MB (high-water mark)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS以字节为单位, Linux以KB为单位
+    # Bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _percentile(latencies: list[float], percent: int) -> float:
+    if len(latencies) == 1:
+        return latencies[0]
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+class Benchmark:
+    """
+    基准测试运行器
+    Benchmark runner
+    """
+
+    def __init__(self, client: Client, server_url: str, token: str, args: argparse.Namespace):
+        self.client = client
+        self.server_url = server_url
+        self.token = token
+        self.args = args
+        self.results: list[dict[str, Any]] = []
+
+    async def call(self, tool: str, **kwargs) -> Any:
+        result = await self.client.call_tool(tool, kwargs, raise_on_error=False)
+        if result.is_error:
+            raise RuntimeError(f"{tool} failed: {result.content[0].text if result.content else ''}")
+        return result
+
+    async def measure(
+        self, scenario: str, tool: str, cells: int, concurrency: int, iterations: int,
+        make_call: Callable[[int], Any]) -> None:
+        """
+        以给定并发度执行iterations次调用并记录结果
+        Run `iterations` calls with the given concurrency and record the result
+        """
+        latencies = []
+        errors = 0
+        queue = asyncio.Queue()
+        for iteration in range(iterations):
+            queue.put_nowait(iteration)
+
+        async def worker() -> None:
+            nonlocal errors
+            while not queue.empty():
+                iteration = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    await make_call(iteration)
+                    latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors += 1
+                    if self.args.verbose:
+                        print(f"[{scenario}] {e}", file=sys.stderr)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        result = {
+            "scenario": scenario, "tool": tool, "cells": cells, "concurrency": concurrency,
+            "iterations": iterations, "errors": errors,
+            "p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None,
+            "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else None,
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+        if latencies:
+            result.update({
+                "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+                "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+                "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            })
+        self.results.append(result)
+        print(
+            f"{scenario:<28} cells={cells:<6} c={concurrency:<3} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"p99={result['p99_ms']}ms tput={result['throughput_per_s'] and round(result['throughput_per_s'], 1)}/s "
+            f"errors={errors} rss={result['peak_rss_mb']}MB",
+            file=sys.stderr,
+        )
+
+    async def prepare_notebook(self, name: str, cells: int) -> dict[str, int]:
+        """
+        创建包含指定数量Cell的Notebook, 以及一个大输出Cell与一个图片Cell
+        Create a notebook with the given number of cells, plus one large-output cell and one image cell
+        """
+        await self.call(
+            "connect_notebook", server_url=self.server_url, token=self.token,
+            notebook_name=name, notebook_path=f"{name}.ipynb", mode="create",
+        )
+        for start in range(0, cells, BATCH_SIZE):
+            operations = [
+                {"op": "insert", "cell_index": 1, "cell_content": f"value_{i} = {i}\nresult_{i} = value_{i} * 2\n# cell {i}"}
+                for i in range(start, min(start + BATCH_SIZE, cells))
+            ]
+            await self.call("batch_edit_cells", notebook_name=name, operations=operations)
+
+        output_code = f"for i in range({self.args.output_lines}):\n    print('output line', i, 'x' * 60)"
+        image_code = "\n".join([
+            "import io",
+            "from PIL import Image",
+            "from IPython.display import display, Image as IPImage",
+            f"for i in range({self.args.images}):",
+            "    buffer = io.BytesIO()",
+            "    Image.new('RGB', (1200, 900), (i * 40 % 255, 120, 200)).save(buffer, format='PNG')",
+            "    display(IPImage(data=buffer.getvalue()))",
+        ])
+        operations = [
+            {"op": "insert", "cell_index": cells + 1, "cell_content": output_code},
+            {"op": "insert", "cell_index": cells + 1, "cell_content": image_code},
+            {"op": "insert", "cell_index": cells + 1, "cell_content": "1 + 1"},
+        ]
+        await self.call("batch_edit_cells", notebook_name=name, operations=operations)
+        layout = {"output": cells + 1, "image": cells + 2, "trivial": cells + 3}
+        for index in layout.values():
+            await self.call("execute_cell", notebook_name=name, cell_index=index, timeout=120)
+        return layout
+
+    async def run_size(self, cells: int) -> None:
+        """Run every scenario on a notebook of the given size"""
+        name = f"bench_{cells}_{int(time.time() * 1000)}"
+        layout = await self.prepare_notebook(name, cells)
+        iterations = self.args.iterations
+        middle = max(cells // 2, 1)
+
+        scenarios: list[tuple[str, str, Callable[[int], Any]]] = [
+            ("list_cell", "list_cell",
+             lambda i: self.call("list_cell", notebook_name=name, start_index=middle, limit=50)),
+            ("read_notebook", "read_notebook",
+             lambda i: self.call("read_notebook", notebook_name=name, start_index=middle, limit=20)),
+            ("read_cell[output]", "read_cell",
+             lambda i: self.call("read_cell", notebook_name=name, cell_index=layout["output"])),
+            ("read_cell[images]", "read_cell",
+             lambda i: self.call("read_cell", notebook_name=name, cell_index=layout["image"])),
+            ("search_cells", "search_cells",
+             lambda i: self.call("search_cells", query=f"value_{(i * 7919) % max(cells, 1)}", notebook_name=name)),
+            ("execute_cell", "execute_cell",
+             lambda i: self.call("execute_cell", notebook_name=name, cell_index=layout["trivial"])),
+            ("execute_temporary_code", "execute_temporary_code",
+             lambda i: self.call("execute_temporary_code", notebook_name=name, cell_content="print(1)")),
+            ("overwrite_cell", "overwrite_cell",
+             lambda i: self.call("overwrite_cell", notebook_name=name, cell_index=middle, cell_content=f"value = {i}")),
+        ]
+        for scenario, tool, make_call in scenarios:
+            if self.args.tools and tool not in self.args.tools:
+                continue
+            for concurrency in self.args.concurrency:
+                await self.measure(scenario, tool, cells, concurrency, iterations, make_call)
+
+    async def run_connect(self) -> None:
+        """Measure connect_notebook, every iteration starts a new kernel"""
+        if self.args.tools and "connect_notebook" not in self.args.tools:
+            return
+        prefix = f"bench_connect_{int(time.time() * 1000)}"
+
+        async def connect(i: int) -> None:
+            await self.call(
+                "connect_notebook", server_url=self.server_url, token=self.token,
+                notebook_name=f"{prefix}_{i}", notebook_path=f"{prefix}_{i}.ipynb", mode="create",
+            )
+        for concurrency in self.args.concurrency:
+            await self.measure("connect_notebook", "connect_notebook", 1, concurrency, self.args.connect_iterations, connect)
+            prefix += "_"
+
+def compare(results: list[dict[str, Any]], baseline: list[dict[str, Any]], threshold: float) -> list[dict[str, Any]]:
+    """
+    与基线结果比较, 返回p50或p95变慢超过阈值的场景
+    Compare with the baseline results, return the scenarios whose p50 or p95 got slower than the threshold
+    """
+    baseline_map = {(item["scenario"], item["cells"], item["concurrency"]): item for item in baseline}
+    regressions = []
+    print(f"\n{'scenario':<28} {'cells':<6} {'c':<3} {'p50 ratio':<10} {'p95 ratio':<10}", file=sys.stderr)
+    for item in results:
+        base = baseline_map.get((item["scenario"], item["cells"], item["concurrency"]))
+        if base is None or not base.get("p50_ms") or not item.get("p50_ms"):
+            continue
+        ratios = {key: item[key] / base[key] for key in ("p50_ms", "p95_ms") if base.get(key)}
+        regressed = any(ratio > 1 + threshold for ratio in ratios.values())
+        print(
+            f"{item['scenario']:<28} {item['cells']:<6} {item['concurrency']:<3} "
+            f"{ratios.get('p50_ms', 0):<10.2f} {ratios.get('p95_ms', 0):<10.2f}{'  REGRESSION' if regressed else ''}",
+            file=sys.stderr,
+        )
+        if regressed:
+            regressions.append({"scenario": item["scenario"], "cells": item["cells"], "concurrency": item["concurrency"], **ratios})
+    return regressions
+
+def parse_args() -> argparse.Namespace:
+    def int_list(value: str) -> list[int]:
+        return [int(item) for item in value.split(",") if item]
+
+    parser = argparse.ArgumentParser(description="Benchmark the Jupyter MCP server tools")
+    parser.add_argument("--server-url", help="Use an existing Jupyter server instead of starting a local one")
+    parser.add_argument("--token", default="", help="Token of the existing Jupyter server")
+    parser.add_argument("--sizes", type=int_list, default=[10, 1000], help="Comma-separated notebook sizes in cells (e.g. 10,100,1000,10000)")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 4], help="Comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=30, help="Calls per scenario and concurrency level")
+    parser.add_argument("--connect-iterations", type=int, default=3, help="Calls of connect_notebook per concurrency level")
+    parser.add_argument("--output-lines", type=int, default=2000, help="Lines printed by the large-output cell")
+    parser.add_argument("--images", type=int, default=3, help="Images displayed by the image cell")
+    parser.add_argument("--tools", type=lambda value: set(value.split(",")), default=None, help="Only benchmark these tools (comma-separated)")
+    parser.add_argument("--output", help="Write the JSON results to this file (stdout by default)")
+    parser.add_argument("--baseline", help="Compare with the JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if a regression is found")
+    parser.add_argument("--verbose", action="store_true", help="Print the errors of failed calls")
+    return parser.parse_args()
+
+async def run(args: argparse.Namespace, server_url: str, token: str) -> dict[str, Any]:
+    async with Client(mcp) as client:
+        benchmark = Benchmark(client, server_url, token, args)
+        for cells in args.sizes:
+            await benchmark.run_size(cells)
+        await benchmark.run_connect()
+    return {
+        "meta": {
+            "version": __version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "parameters": {
+                "sizes": args.sizes, "concurrency": args.concurrency, "iterations": args.iterations,
+                "output_lines": args.output_lines, "images": args.images,
+            },
+        },
+        "results": benchmark.results,
+    }
+
+def main() -> int:
+    args = parse_args()
+    if args.server_url:
+        report = asyncio.run(run(args, args.server_url, args.token))
+    else:
+        with LocalJupyterServer() as server:
+            report = asyncio.run(run(args, server.url, server.token))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        report["regressions"] = compare(report["results"], baseline["results"], args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 1 if args.fail_on_regression and report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+MCP服务启动基准测试
+Startup benchmark of the MCP server
+
+以stdio模式启动服务进程, 测量从启动到`initialize`与`tools/list`响应的耗时,
+并检查启动时没有导入只在工具调用时才需要的重量级依赖
+Spawn the server process over stdio, measure the time from spawn to the `initialize` and `tools/list` responses,
+and check that the heavy dependencies only needed by tool calls are not imported at startup
+
+Usage:
+    uv run python benchmarks/startup.py --runs 10 --output startup.json
+    uv run python benchmarks/startup.py --baseline startup.json --fail-on-regression
+"""
+
+import argparse, json, os, platform, statistics, subprocess, sys, time
+from pathlib import Path
+from typing import Any
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+
+# 启动时不应导入的模块, 它们在第一次需要它们的工具调用时才导入
+# Modules that must not be imported at startup, they are imported by the first tool call needing them
+LAZY_MODULES = ("jupyter_nbmodel_client", "jupyter_kernel_client", "jupyter_server_api", "pycrdt", "nbformat", "PIL")
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(SRC), env.get("PYTHONPATH")]))
+    env["PYTHONWARNINGS"] = "ignore"
+    return env
+
+def _request(process: subprocess.Popen, message: dict[str, Any]) -> None:
+    process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+    process.stdin.flush()
+
+def _response(process: subprocess.Popen, request_id: int) -> dict[str, Any]:
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Server exited before answering request {request_id}")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+def measure_once() -> dict[str, float]:
+    """
+    启动一次服务进程并测量响应耗时(毫秒)
+    Spawn the server once and measure the response times in milliseconds
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", "from better_jupyter_mcp_server.server import main; main()"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=_env(),
+    )
+    try:
+        _request(process, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {"protocolVersion": "2025-06-18", "capabilities": {}, "clientInfo": {"name": "startup-bench", "version": "0"}},
+        })
+        _response(process, 1)
+        initialize_ms = (time.perf_counter() - start) * 1000
+        _request(process, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        _request(process, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        tools = _response(process, 2)["result"]["tools"]
+        tools_list_ms = (time.perf_counter() - start) * 1000
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"initialize_ms": initialize_ms, "tools_list_ms": tools_list_ms, "tools": len(tools)}
+
+def eager_modules() -> list[str]:
+    """
+    返回导入服务模块时被提前导入的重量级依赖
+    Return the heavy dependencies imported eagerly by importing the server module
+    """
+    code = (
+        "import sys, json; import better_jupyter_mcp_server.server; "
+        f"print(json.dumps(sorted(name for name in {LAZY_MODULES!r} if name in sys.modules)))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, env=_env(), check=True).stdout
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the Jupyter MCP server")
+    parser.add_argument("--runs", type=int, default=10, help="Number of server processes spawned")
+    parser.add_argument("--output", help="Write the JSON results to this file (stdout by default)")
+    parser.add_argument("--baseline", help="Compare with the JSON results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if a regression is found or a heavy dependency is imported eagerly")
+    return parser.parse_args()
+
+def main() -> int:
+    args = parse_args()
+    # 第一次启动会写入字节码缓存, 不计入结果
+    # The first spawn writes the bytecode caches, it is not counted
+    measure_once()
+    runs = [measure_once() for _ in range(max(args.runs, 1))]
+    results = {
+        key: {
+            "median_ms": round(statistics.median(run[key] for run in runs), 1),
+            "min_ms": round(min(run[key] for run in runs), 1),
+            "max_ms": round(max(run[key] for run in runs), 1),
+        }
+        for key in ("initialize_ms", "tools_list_ms")
+    }
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "runs": len(runs),
+            "tools": runs[0]["tools"],
+        },
+        "results": results,
+        "eager_modules": eager_modules(),
+    }
+    for key, stats in results.items():
+        print(f"{key:<16} median {stats['median_ms']:>8.1f}  min {stats['min_ms']:>8.1f}  max {stats['max_ms']:>8.1f}", file=sys.stderr)
+    if report["eager_modules"]:
+        print(f"Imported eagerly: {', '.join(report['eager_modules'])}", file=sys.stderr)
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        for key, stats in results.items():
+            base = baseline["results"].get(key, {}).get("median_ms")
+            if base:
+                ratio = stats["median_ms"] / base
+                print(f"{key:<16} ratio {ratio:.2f}{'  REGRESSION' if ratio > 1 + args.threshold else ''}", file=sys.stderr)
+                if ratio > 1 + args.threshold:
+                    regressions.append({"metric": key, "ratio": round(ratio, 3)})
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 1 if args.fail_on_regression and (regressions or report["eager_modules"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
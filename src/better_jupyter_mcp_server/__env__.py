@@ -75,14 +75,95 @@ def _get_env_int(env_name: str, default_value: int) -> int:
         print(f"Warning: Invalid integer value '{env_value}' for {env_name}, using default: {default_value}")
         return default_value
 
+def _get_env_float(env_name: str, default_value: float) -> float:
+    """
+    从环境变量获取浮点数值
+    Get float value from environment variable
+    
+    Args:
+        env_name: 环境变量名 / Environment variable name
+        default_value: 默认值 / Default value
+        
+    Returns:
+        float: 浮点数值 / Float value
+    """
+    env_value = os.getenv(env_name)
+    if env_value is None:
+        return default_value
+    
+    try:
+        return float(env_value.strip())
+    except ValueError:
+        print(f"Warning: Invalid float value '{env_value}' for {env_name}, using default: {default_value}")
+        return default_value
+
+def _get_env_str(env_name: str, default_value: str) -> str:
+    """
+    从环境变量获取字符串值
+    Get string value from environment variable
+    
+    Args:
+        env_name: 环境变量名 / Environment variable name
+        default_value: 默认值 / Default value
+        
+    Returns:
+        str: 字符串值 / String value
+    """
+    env_value = os.getenv(env_name)
+    if env_value is None:
+        return default_value
+    return env_value
+
 # 基础配置 / Basic Configuration
 # 环境变量优先，如果没有环境变量则使用配置文件的值
 # Environment variables take priority, use config file values if no environment variables
 ALLOW_IMG: bool = _get_env_bool("ALLOW_IMG", _config["basic"]["ALLOW_IMG"])
 ALLOW_IMG_PREPROCESS: bool = _get_env_bool("ALLOW_IMG_PREPROCESS", _config["basic"]["ALLOW_IMG_PREPROCESS"])
 AUTO_SAVE_NOTEBOOK: bool = _get_env_bool("AUTO_SAVE_NOTEBOOK", _config["basic"]["AUTO_SAVE_NOTEBOOK"])
+MEMOIZE_EXECUTION: bool = _get_env_bool("MEMOIZE_EXECUTION", _config["basic"]["MEMOIZE_EXECUTION"])
+READ_SNAPSHOT: bool = _get_env_bool("READ_SNAPSHOT", _config["basic"]["READ_SNAPSHOT"])
 
 # 图片配置 / Image Configuration
 MAX_WIDTH: int = _get_env_int("MAX_WIDTH", _config["img"]["MAX_WIDTH"])
 MAX_HEIGHT: int = _get_env_int("MAX_HEIGHT", _config["img"]["MAX_HEIGHT"])
 IMAGE_TOKEN_SIZE: int = _get_env_int("IMAGE_TOKEN_SIZE", _config["img"]["IMAGE_TOKEN_SIZE"])
+IMAGE_CACHE_SIZE: int = _get_env_int("IMAGE_CACHE_SIZE", _config["img"]["IMAGE_CACHE_SIZE"])
+IMAGE_WORKERS: int = _get_env_int("IMAGE_WORKERS", _config["img"]["IMAGE_WORKERS"])
+IMAGE_MAX_BYTES: int = _get_env_int("IMAGE_MAX_BYTES", _config["img"]["IMAGE_MAX_BYTES"])
+IMAGE_RESPONSE_MAX_BYTES: int = _get_env_int("IMAGE_RESPONSE_MAX_BYTES", _config["img"]["IMAGE_RESPONSE_MAX_BYTES"])
+IMAGE_ENCODINGS: list[str] = [
+    encoding.strip().lower() for encoding in _get_env_str("IMAGE_ENCODINGS", _config["img"]["IMAGE_ENCODINGS"]).split(",")
+    if encoding.strip().lower() in ("png", "webp", "jpeg")
+] or ["png"]
+IMAGE_MIN_QUALITY: int = _get_env_int("IMAGE_MIN_QUALITY", _config["img"]["IMAGE_MIN_QUALITY"])
+
+# 自动保存配置 / Auto Save Configuration
+AUTO_SAVE_DEBOUNCE: float = _get_env_float("AUTO_SAVE_DEBOUNCE", _config["save"]["AUTO_SAVE_DEBOUNCE"])
+AUTO_SAVE_MAX_DELAY: float = _get_env_float("AUTO_SAVE_MAX_DELAY", _config["save"]["AUTO_SAVE_MAX_DELAY"])
+
+# 输出配置 / Output Configuration
+OUTPUT_MAX_BYTES: int = _get_env_int("OUTPUT_MAX_BYTES", _config["output"]["OUTPUT_MAX_BYTES"])
+OUTPUT_MAX_LINES: int = _get_env_int("OUTPUT_MAX_LINES", _config["output"]["OUTPUT_MAX_LINES"])
+OUTPUT_STORE_MAX_BYTES: int = _get_env_int("OUTPUT_STORE_MAX_BYTES", _config["output"]["OUTPUT_STORE_MAX_BYTES"])
+RENDER_CACHE_SIZE: int = _get_env_int("RENDER_CACHE_SIZE", _config["output"]["RENDER_CACHE_SIZE"])
+
+# 内核配置 / Kernel Configuration
+KERNEL_POOL_SIZE: int = _get_env_int("KERNEL_POOL_SIZE", _config["kernel"]["KERNEL_POOL_SIZE"])
+KERNEL_WARMUP_CODE: str = _get_env_str("KERNEL_WARMUP_CODE", _config["kernel"]["KERNEL_WARMUP_CODE"])
+KERNEL_WARMUP_TIMEOUT: float = _get_env_float("KERNEL_WARMUP_TIMEOUT", _config["kernel"]["KERNEL_WARMUP_TIMEOUT"])
+
+# 调度配置 / Scheduler Configuration
+SCHEDULER_WORKERS: int = _get_env_int("SCHEDULER_WORKERS", _config["scheduler"]["SCHEDULER_WORKERS"])
+
+# 监控配置 / Metrics Configuration
+METRICS_ENABLED: bool = _get_env_bool("METRICS_ENABLED", _config["metrics"]["METRICS_ENABLED"])
+METRICS_TRACE_SIZE: int = _get_env_int("METRICS_TRACE_SIZE", _config["metrics"]["METRICS_TRACE_SIZE"])
+METRICS_DUMP_PATH: str = _get_env_str("METRICS_DUMP_PATH", _config["metrics"]["METRICS_DUMP_PATH"])
+
+# 服务配置 / Server Configuration
+TRANSPORT: str = _get_env_str("TRANSPORT", _config["server"]["TRANSPORT"])
+HOST: str = _get_env_str("HOST", _config["server"]["HOST"])
+PORT: int = _get_env_int("PORT", _config["server"]["PORT"])
+MAX_SESSIONS: int = _get_env_int("MAX_SESSIONS", _config["server"]["MAX_SESSIONS"])
+MAX_CONCURRENT_CALLS: int = _get_env_int("MAX_CONCURRENT_CALLS", _config["server"]["MAX_CONCURRENT_CALLS"])
+SESSION_IDLE_TIMEOUT: float = _get_env_float("SESSION_IDLE_TIMEOUT", _config["server"]["SESSION_IDLE_TIMEOUT"])
@@ -1,28 +1,167 @@
-import asyncio, difflib, os
+import anyio, argparse, asyncio, difflib, os
+from contextlib import asynccontextmanager
 from fastmcp import FastMCP
 from pathlib import Path
 from typing import Annotated, Literal
 from mcp.types import ImageContent
+from fastmcp.server.dependencies import get_context
 
 # 设置环境变量以避免Jupyter平台目录警告
 # Set environment variable to avoid Jupyter platform directory warnings
 os.environ.setdefault("JUPYTER_PLATFORM_DIRS", "1")
 
-from jupyter_nbmodel_client import NbModelClient, get_jupyter_notebook_websocket_url
-from jupyter_kernel_client import KernelClient
-from jupyter_server_api import JupyterServerClient,NotFoundError
-from .utils import list_cell_basic, Cell, format_table, format_notebook, NotebookManager
+from .utils import list_cell_basic, get_cell_index, build_search_query, Cell, IMAGE_CACHE, RENDER_CACHE, select_renderers, format_table, format_notebook, SessionNotebookManager, SessionMiddleware, SESSIONS, KERNEL_POOL, METRICS, MetricsMiddleware, CellOperation, apply_cell_operations, set_cell_source, patch_text, run_cell, run_cells, execute_code, analyze_cell, build_dependencies, affected_cells, build_inspection_code, parse_inspection, format_variables, OutputBudget, OUTPUT_STORE, TEMPORARY_CELL_INDEX, page_output, LocalKernel, LocalNotebookSession, write_notebook_file
 from . import __version__
+from .__env__ import METRICS_DUMP_PATH, MEMOIZE_EXECUTION, TRANSPORT, HOST, PORT
 
-mcp = FastMCP(name="Jupyter-MCP-Server", version=__version__)
+# 用于管理不同notebook的kernel, 每个客户端会话拥有独立的命名空间
+# Used to manage different notebooks' kernels, each client session has its own namespace
+notebook_manager = SessionNotebookManager()
 
-# 用于管理不同notebook的kernel
-# Used to manage different notebooks' kernels
-notebook_manager = NotebookManager()
+# 新建Notebook的初始内容
+# Initial content of a new notebook
+NEW_NOTEBOOK_CONTENT = {
+    "cells": [{
+        "cell_type": "markdown",
+        "metadata": {},
+        "source": [
+            "Overwrite this cell with Notebook Metadata",
+        ]
+    }],
+    "metadata": {},
+    "nbformat": 4,
+    "nbformat_minor": 4
+}
+
+def dump_metrics(path: str) -> None:
+    """
+    将统计数据写入文件, 后缀为.prom时使用Prometheus文本格式, 否则使用JSON
+    Write the statistics to a file, in the Prometheus text format if the suffix is .prom, otherwise as JSON
+    """
+    try:
+        content = METRICS.to_prometheus() if path.endswith(".prom") else METRICS.to_json()
+        Path(path).write_text(content, encoding="utf-8")
+    except OSError:
+        pass
+
+async def shutdown() -> None:
+    """
+    保存未保存的修改并关闭所有连接与内核
+    Flush pending saves and close all connections and kernels
+    """
+    # 服务任务可能已被取消, 需要屏蔽取消以完成清理
+    # The server task may already be cancelled, shield the cleanup so it can complete
+    with anyio.CancelScope(shield=True):
+        await notebook_manager.close_all()
+        await KERNEL_POOL.close()
+        if METRICS.enabled and METRICS_DUMP_PATH:
+            dump_metrics(METRICS_DUMP_PATH)
+
+# 当前的客户端连接数, 以及是否以HTTP模式运行(此时由main负责关闭)
+# Number of client connections, and whether the server runs in HTTP mode (main shuts it down then)
+_connections = 0
+_http_mode = False
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """
+    每个客户端连接都会进入一次(FastMCP 2.12), 结束时关闭其间打开的会话的Notebook; stdio模式下最后一个连接结束即服务关闭,
+    此时保存未保存的修改并关闭所有连接
+    Entered once per client connection (FastMCP 2.12), the notebooks of the sessions opened during it are closed when it ends; in stdio mode
+    the server shuts down with its last connection, then pending saves are flushed and all connections are closed
+    """
+    global _connections
+    _connections += 1
+    try:
+        async with SESSIONS.lifespan():
+            yield {}
+    finally:
+        _connections -= 1
+        if _connections == 0 and not _http_mode:
+            await shutdown()
+
+async def serve_http(host: str, port: int) -> None:
+    """
+    以HTTP模式运行, 一个进程服务多个客户端会话, 应用关闭时关闭所有会话
+    Run in HTTP mode, one process serving many client sessions, all sessions are closed when the application shuts down
+    """
+    import uvicorn
+    global _http_mode
+    _http_mode = True
+    app = mcp.http_app(transport="http")
+    session_lifespan = app.router.lifespan_context
+    
+    # uvicorn在收到信号退出前会重新抛出信号, 因此清理必须在应用的生命周期中完成
+    # uvicorn re-raises the exit signal once stopped, so the cleanup must happen in the application lifespan
+    @asynccontextmanager
+    async def app_lifespan(app):
+        async with session_lifespan(app):
+            try:
+                yield
+            finally:
+                await shutdown()
+    
+    app.router.lifespan_context = app_lifespan
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, timeout_graceful_shutdown=0, lifespan="on"))
+    await server.serve()
+
+mcp = FastMCP(name="Jupyter-MCP-Server", version=__version__, lifespan=lifespan)
+mcp.add_middleware(MetricsMiddleware())
+mcp.add_middleware(SessionMiddleware())
+
+def stream_outputs_as_progress():
+    """
+    创建一个将Cell输出作为MCP进度通知发送的回调
+    Create a callback sending each cell output as an MCP progress notification
+    """
+    ctx = get_context()
+    count = 0
+    
+    async def report(output: dict) -> None:
+        nonlocal count
+        count += 1
+        renderers = select_renderers(output.get("data", {}))
+        if renderers and renderers[0].image_format is not None:
+            message = "[Image output]"
+        else:
+            message = Cell({"outputs": [output]}).get_outputs()[0]
+        await ctx.report_progress(progress=count, message=message)
+    
+    return report
+
+async def summarize_results(notebook, notebook_name: str, results: list[dict], return_outputs: bool) -> list[str | ImageContent]:
+    """
+    汇总多个Cell的执行结果: 状态表以及失败Cell(或全部Cell)的输出
+    Summarize the results of several cell executions: the status table and the outputs of the failed cells (or of all cells)
+    """
+    counts = {}
+    rows = []
+    outputs = []
+    budget = OutputBudget()
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        rows.append([result["index"], result["status"], result["execution_count"], f"{result['duration']:.2f}"])
+        if result["status"] == "skipped":
+            continue
+        if return_outputs or result["status"] not in ("ok", "cached"):
+            cell_outputs = budget.apply(
+                await Cell(notebook[result["index"]]).get_outputs_async(), notebook_manager.output_key(notebook_name),
+                result["index"], get_cell_index(notebook).cell_id(result["index"])
+            )
+            if "error" in result:
+                cell_outputs = [f"[EXECUTION FAILED: {result['error']}]"] + cell_outputs
+            if cell_outputs:
+                outputs.append(f"=====Index: {result['index']}, Status: {result['status']}=====")
+                outputs.extend(cell_outputs)
+    
+    total_duration = sum(result["duration"] for result in results)
+    summary = ", ".join(f"{status}: {count}" for status, count in counts.items())
+    table = format_table(["Index", "Status", "Count", "Duration(s)"], rows)
+    return [f"Executed {len(results)} code cells in {total_duration:.2f}s ({summary})\n{table}"] + outputs
 
 #===========================================
-# Notebook管理模块(4个)
-# Notebook management module (4)
+# Notebook管理模块(5个)
+# Notebook management module (5)
 #===========================================
 @mcp.tool(tags={"core","notebook","connect_notebook"})
 async def connect_notebook(
@@ -43,7 +182,7 @@ async def connect_notebook(
     if notebook_name in notebook_manager:
         if mode == "reconnect":
             if notebook_manager.get_notebook_path(notebook_name) == notebook_path:
-                notebook_manager.remove_notebook(notebook_name)
+                await notebook_manager.remove_notebook(notebook_name)
             else:
                 return f"{notebook_name} should be connected to {notebook_manager.get_notebook_path(notebook_name)} not {notebook_path}!"
         elif notebook_manager.get_notebook_path(notebook_name) == notebook_path:
@@ -51,98 +190,174 @@ async def connect_notebook(
         else:
             return f"{notebook_name} is already connected to {notebook_manager.get_notebook_path(notebook_name)}, please rename it"
     
-    # Check if Jupyter are running normally
+    # 状态检查、目录列举与内核启动互不依赖, 在线程中并发执行, 避免阻塞事件循环
+    # Status check, directory listing and kernel start are independent,
+    # run them concurrently in threads so that the event loop is never blocked
+    from jupyter_server_api import JupyterServerClient, NotFoundError
     server_client = JupyterServerClient(base_url=server_url, token=token)
-    try:
-        server_client.get_status()
-    except Exception as e:
-        return f"""Jupyter environment connection failed! 
+    path = Path(notebook_path)
+    # For relative paths starting with just filename, assume current directory (root directory of Jupyter server)
+    parent_path = path.parent.as_posix() if path.parent.as_posix() != "." else ""
+    # 内核池开启时直接使用已就绪的内核
+    # Adopt a ready kernel when the kernel pool is enabled
+    async with METRICS.span("connect"):
+        status_result, dir_contents, kernel = await asyncio.gather(
+            asyncio.to_thread(server_client.get_status),
+            asyncio.to_thread(server_client.contents.list_directory, parent_path),
+            KERNEL_POOL.acquire(server_url, token, parent_path),
+            return_exceptions=True
+        )
+    
+    async def abort(message: str) -> str:
+        if not isinstance(kernel, BaseException):
+            await asyncio.to_thread(kernel.stop)
+        await asyncio.to_thread(server_client.close)
+        return message
+    
+    # Check if Jupyter are running normally
+    if isinstance(status_result, BaseException):
+        return await abort(f"""Jupyter environment connection failed! 
         Error as below: 
         ```
-        {str(e)}
+        {str(status_result)}
         ```
         
         Please check: 
         1. Jupyter environment is successfully started 
         2. URL address is correct and can be accessed normally
         3. Token is correct
-        """
+        """)
     
     # Check if notebook path exists
-    path = Path(notebook_path)
-    try:
-        # For relative paths starting with just filename, assume current directory
-        parent_path = path.parent.as_posix() if path.parent.as_posix() != "." else ""
-        
-        if parent_path:
-            dir_contents = server_client.contents.list_directory(parent_path)
-        else:
-            # Check in the root directory of Jupyter server
-            dir_contents = server_client.contents.list_directory("")
-            
-        if mode == "connect":
-            file_exists = any(file.name == path.name for file in dir_contents)
-            if not file_exists:
-                return f"'{notebook_path}' not found in jupyter server, please check the notebook already exists."
-    except NotFoundError:
-        parent_dir = path.parent.as_posix() if path.parent.as_posix() != "." else "root directory"
-        return f"'{parent_dir}' not found in jupyter server, please check the directory path already exists."
-    except Exception as e:
-        return f"Failed to check the path '{notebook_path}': {e}"
+    if isinstance(dir_contents, NotFoundError):
+        parent_dir = parent_path or "root directory"
+        return await abort(f"'{parent_dir}' not found in jupyter server, please check the directory path already exists.")
+    if isinstance(dir_contents, BaseException):
+        return await abort(f"Failed to check the path '{notebook_path}': {dir_contents}")
+    if mode == "connect":
+        file_exists = any(file.name == path.name for file in dir_contents)
+        if not file_exists:
+            return await abort(f"'{notebook_path}' not found in jupyter server, please check the notebook already exists.")
+    
+    if isinstance(kernel, BaseException):
+        return await abort(f"Kernel start failed! Error: {kernel}")
     
     # Create notebook
     if mode == "create":
-        content = {
-            "cells": [{
-                "cell_type": "markdown",
-                "metadata": {},
-                "source": [
-                    "Overwrite this cell with Notebook Metadata",
-                ]
-            }],
-            "metadata": {},
-            "nbformat": 4,
-            "nbformat_minor": 4
-        }
-        server_client.contents.create_notebook(notebook_path, content)
-    
-    # Create kernel client
-    kernel = KernelClient(
-        server_url=server_url,
-        token=token,
-    )
-    kernel.start(path=parent_path)
-
-    # Try to connect to the notebook
+        try:
+            await asyncio.to_thread(server_client.contents.create_notebook, notebook_path, NEW_NOTEBOOK_CONTENT)
+        except Exception as e:
+            return await abort(f"Failed to create the notebook '{notebook_path}': {e}")
+    
+    # 等待期间可能有同名的连接请求已经完成
+    # A concurrent request with the same name may have completed while waiting
+    if notebook_name in notebook_manager:
+        return await abort(f"{notebook_name} is already connected to {notebook_manager.get_notebook_path(notebook_name)}, please rename it")
+
+    # Save the kernel and notebook information to notebook_manager, then open the shared notebook session
+    notebook_manager.add_notebook(notebook_name, kernel, server_client, server_url, token, notebook_path)
     try:
-        ws_url = get_jupyter_notebook_websocket_url(server_url=server_url, token=token, path=notebook_path)
-        async with NbModelClient(ws_url) as notebook:
+        async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
             list_info = list_cell_basic(notebook, limit=20)
     except Exception as e:
-        kernel.stop()
+        await notebook_manager.remove_notebook(notebook_name)
         return f"Notebook connection failed! Error: {e}"
     
-    # Connection successful, save the kernel and notebook information to notebook_manager
-    notebook_manager.add_notebook(notebook_name, kernel, server_client, server_url, token, notebook_path)
     return_info = f"{notebook_name} connection successful!\n{list_info}"
     return return_info
 
+@mcp.tool(tags={"core","notebook","open_local_notebook"})
+async def open_local_notebook(
+    notebook_name: Annotated[str, "Unique identifier, used to reference this notebook in subsequent operations"],
+    notebook_path: Annotated[str, "Path to the notebook file on the machine running this MCP server (absolute, or relative to its working directory)"],
+    mode: Annotated[
+        Literal["connect", "create", "reconnect"], 
+        "`connect`: open an existing notebook; `create`: create a new notebook (not exist) and open it; `reconnect`: open an existing notebook again"
+        ] = "connect") -> str:
+    """
+    Open a notebook file directly from the local disk, with a locally spawned kernel, without any Jupyter server.
+    Alternative FIRST STEP to `connect_notebook`, all subsequent operations work the same way.
+    Reading large notebooks is fast, modifications are written back to the file automatically.
+    """
+    path = os.path.abspath(os.path.expanduser(notebook_path))
+    # 检查notebook是否已经连接
+    # Check if the notebook is already connected
+    if notebook_name in notebook_manager:
+        if mode == "reconnect":
+            if notebook_manager.get_notebook_path(notebook_name) == path:
+                await notebook_manager.remove_notebook(notebook_name)
+            else:
+                return f"{notebook_name} should be connected to {notebook_manager.get_notebook_path(notebook_name)} not {path}!"
+        elif notebook_manager.get_notebook_path(notebook_name) == path:
+            return f"{notebook_name} is already connected, please do not connect again"
+        else:
+            return f"{notebook_name} is already connected to {notebook_manager.get_notebook_path(notebook_name)}, please rename it"
+    
+    if not os.path.isdir(os.path.dirname(path)):
+        return f"'{os.path.dirname(path)}' not found, please check the directory path already exists."
+    if mode == "create":
+        if os.path.exists(path):
+            return f"'{path}' already exists, please use `connect` mode to open it."
+        try:
+            await asyncio.to_thread(write_notebook_file, path, NEW_NOTEBOOK_CONTENT)
+        except OSError as e:
+            return f"Failed to create the notebook '{path}': {e}"
+    elif not os.path.isfile(path):
+        return f"'{path}' not found, please check the notebook already exists."
+    
+    # 内核启动与文件索引互不依赖, 并发执行
+    # Kernel start and file indexing are independent, run them concurrently
+    session = LocalNotebookSession(path)
+    kernel = LocalKernel(cwd=os.path.dirname(path))
+    async with METRICS.span("connect"):
+        kernel_result, notebook = await asyncio.gather(
+            asyncio.to_thread(kernel.start),
+            session.acquire(),
+            return_exceptions=True
+        )
+    
+    async def abort(message: str) -> str:
+        if not isinstance(kernel_result, BaseException):
+            await asyncio.to_thread(kernel.stop)
+        await session.close()
+        return message
+    
+    if isinstance(kernel_result, BaseException):
+        return await abort(f"Kernel start failed! Error: {kernel_result}")
+    if isinstance(notebook, BaseException):
+        return await abort(f"Failed to read the notebook '{path}'! Error: {notebook}")
+    
+    # 等待期间可能有同名的连接请求已经完成
+    # A concurrent request with the same name may have completed while waiting
+    if notebook_name in notebook_manager:
+        return await abort(f"{notebook_name} is already connected to {notebook_manager.get_notebook_path(notebook_name)}, please rename it")
+    
+    list_info = list_cell_basic(notebook, limit=20)
+    
+    notebook_manager.add_local_notebook(notebook_name, kernel, session)
+    return f"{notebook_name} connection successful!\n{list_info}"
+
 @mcp.tool(tags={"core","notebook","list_notebook"})
 async def list_notebook() -> str:
     """
     List all currently connected Notebooks.
-    It will return unique name, Jupyter URL and Path of all connected Notebooks
+    It will return unique name, Jupyter URL (`local` for local notebook files), Path and execution queue status of all connected Notebooks
     """
     if notebook_manager.is_empty():
         return "No notebook is currently connected"
     
-    headers = ["Name", "Jupyter URL", "Path"]
+    headers = ["Name", "Jupyter URL", "Path", "Running", "Queued", "Avg Wait(s)", "Max Wait(s)"]
     
     rows = []
     for notebook_name, notebook_info in notebook_manager:
         notebook_path = notebook_info["notebook"]["path"]
         server_url = notebook_info["notebook"]["server_url"]
-        rows.append([notebook_name, server_url, notebook_path])
+        scheduler = notebook_info["scheduler"]
+        rows.append([
+            notebook_name, server_url, notebook_path,
+            scheduler.running or "-", scheduler.queued,
+            f"{scheduler.average_wait:.2f}", f"{scheduler.max_wait:.2f}"
+        ])
     
     table = format_table(headers, rows)
     
@@ -157,7 +372,7 @@ async def restart_notebook(
     if notebook_name not in notebook_manager:
         return "Notebook does not exist, please check if the notebook name is correct"
     
-    if notebook_manager.restart_notebook(notebook_name):
+    if await notebook_manager.restart_notebook(notebook_name):
         return f"{notebook_name} restart successful"
     else:
         return f"Failed to restart {notebook_name}"
@@ -182,14 +397,14 @@ async def read_notebook(
         
         end_index = min(start_index + limit, total_cells) if limit > 0 else total_cells
         
-        cells = [Cell(notebook[i]) for i in range(start_index, end_index)]
+        cells = get_cell_index(notebook).cells(start_index, end_index)
         formatted_content = format_notebook(cells, start_index, total_cells)
     
     return formatted_content
 
 #===========================================
-# Cell基本功能模块(6个)
-# Basic Cell Function Module (6)
+# Cell基本功能模块(8个)
+# Basic Cell Function Module (8)
 #===========================================
 
 @mcp.tool(tags={"core","cell","list_cell"})
@@ -235,24 +450,62 @@ async def read_cell(
                 f"Current execution count: {cell.execution_count}"
             ]
             if return_output:
-                result.extend(cell.get_outputs())
+                outputs = await cell.get_outputs_async()
+                result.extend(OutputBudget().apply(outputs, notebook_manager.output_key(notebook_name), cell_index, get_cell_index(notebook).cell_id(cell_index)))
         else:
             result = cell.source
             
     return result
 
+@mcp.tool(tags={"core","cell","read_output"})
+async def read_output(
+    notebook_name: str,
+    cell_index: Annotated[int, "Cell index(0-based), -1 for the last `execute_temporary_code` output"],
+    output_index: Annotated[int, "Output index(0-based) of the cell, as shown in the truncation marker"],
+    offset: Annotated[int, "Starting line (0-based) for pagination"] = 0,
+    limit: Annotated[int, "Maximum number of lines to return (0 means no limit)"] = 200) -> str:
+    """
+    Read the full content of a truncated text output page by page.
+    ONLY used when an output contains an `OUTPUT TRUNCATED` marker and the omitted part is really needed.
+    """
+    if notebook_name not in notebook_manager:
+        return "Notebook does not exist, please check if the notebook name is correct"
+    
+    if cell_index == TEMPORARY_CELL_INDEX:
+        text = OUTPUT_STORE.get(notebook_manager.output_key(notebook_name), TEMPORARY_CELL_INDEX, output_index)
+        if text is None:
+            return f"Output {output_index} of the temporary code is not available, please execute the code again"
+        return page_output(text, offset, limit)
+    
+    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+        if cell_index < 0 or cell_index >= len(notebook):
+            return f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"
+        # 按Cell的id查找, 插入或删除Cell后不会返回其他Cell的输出
+        # Looked up by cell id, so that inserting or deleting cells never returns the output of another cell
+        cell_key = OUTPUT_STORE.cell_key(cell_index, get_cell_index(notebook).cell_id(cell_index))
+        text = OUTPUT_STORE.get(notebook_manager.output_key(notebook_name), cell_key, output_index)
+        if text is None:
+            raw_outputs = notebook[cell_index].get("outputs", [])
+            if output_index < 0 or output_index >= len(raw_outputs):
+                return f"Output index {output_index} out of range, Cell {cell_index} has {len(raw_outputs)} outputs"
+            text = Cell({"outputs": [raw_outputs[output_index]]}).get_outputs()[0]
+        if not isinstance(text, str):
+            return f"Output {output_index} of cell {cell_index} is not a text output, please use `read_cell` instead"
+    
+    return page_output(text, offset, limit)
+
 @mcp.tool(tags={"core","cell","delete_cell"})
 async def delete_cell(
     notebook_name: str,
     cell_index: Annotated[int, "Cell index(0-based)"]) -> str:
     """
     Delete a specific cell.
-    When deleting many cells, MUST delete them in descending order of their index.
+    When deleting many cells, use `batch_edit_cells` instead.
     """
     if notebook_name not in notebook_manager:
         return "Notebook does not exist, please check if the notebook name is correct"
     
-    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+    async with notebook_manager.get_notebook_connection(notebook_name, "delete_cell") as notebook:
         if cell_index < 0 or cell_index >= len(notebook):
             return f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"
         
@@ -279,12 +532,12 @@ async def insert_cell(
     cell_content: str) -> str:
     """
     Insert a cell at the specified index.
-    When inserting many cells, MUST insert them in ascending order of their index.
+    When inserting many cells, use `batch_edit_cells` instead.
     """
     if notebook_name not in notebook_manager:
         return "Notebook does not exist, please check if the notebook name is correct"
     
-    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+    async with notebook_manager.get_notebook_connection(notebook_name, "insert_cell") as notebook:
         if cell_index < 0 or cell_index > len(notebook):
             return f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"
         
@@ -304,7 +557,9 @@ async def insert_cell(
 async def execute_cell(
     notebook_name: str,
     cell_index: Annotated[int, "Cell index(0-based)"],
-    timeout: Annotated[int, "seconds"] = 60) -> list[str | ImageContent]:
+    timeout: Annotated[int, "seconds"] = 60,
+    stream: Annotated[bool, "Whether to stream outputs as progress notifications while the cell is running"] = False,
+    force: Annotated[bool, "Whether to execute the cell even if its code and upstream state are unchanged since its last execution"] = False) -> list[str | ImageContent]:
     """
     Execute a specific cell with a timeout.
     It will return the output of the cell.
@@ -312,7 +567,7 @@ async def execute_cell(
     if notebook_name not in notebook_manager:
         return ["Notebook does not exist, please check if the notebook name is correct"]
     
-    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+    async with notebook_manager.get_notebook_connection(notebook_name, "execute_cell") as notebook:
         if cell_index < 0 or cell_index >= len(notebook):
             return [f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"]
         
@@ -320,22 +575,21 @@ async def execute_cell(
             return [f"Cell index {cell_index} is not code, need to execute a code cell"]
         
         kernel = notebook_manager.get_kernel(notebook_name)
-        execution_task = asyncio.create_task(
-            asyncio.to_thread(notebook.execute_cell, cell_index, kernel)
+        result = await run_cell(
+            notebook, kernel, cell_index, timeout, stream_outputs_as_progress() if stream else None,
+            notebook_manager.get_memo(notebook_name), MEMOIZE_EXECUTION and not force
         )
         
-        try:
-            await asyncio.wait_for(execution_task, timeout=timeout)
-        except asyncio.TimeoutError:
-            execution_task.cancel()
-            if kernel and hasattr(kernel, 'interrupt'):
-                kernel.interrupt()
-            return [f"[TIMEOUT ERROR: Cell execution exceeded {timeout} seconds]"]
-        
         # Get cell outputs within the context manager while notebook is still connected
         cell = Cell(notebook[cell_index])
-        outputs = cell.get_outputs()
+        outputs = OutputBudget().apply(await cell.get_outputs_async(), notebook_manager.output_key(notebook_name), cell_index, get_cell_index(notebook).cell_id(cell_index))
     
+    if result["status"] == "timeout":
+        return [f"[TIMEOUT ERROR: Cell execution exceeded {timeout} seconds]"] + outputs
+    if "error" in result:
+        return [f"[EXECUTION FAILED ({result['status']}): {result['error']}]"] + outputs
+    if result["status"] == "cached":
+        return [f"[CACHED: Cell index {cell_index} and the cells executed before it are unchanged, returning the outputs of its last execution (use `force` to re-execute)]"] + outputs
     return outputs
 
 @mcp.tool(tags={"core","cell","overwrite_cell"})
@@ -350,28 +604,61 @@ async def overwrite_cell(
     if notebook_name not in notebook_manager:
         return "Notebook does not exist, please check if the notebook name is correct"
     
-    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+    async with notebook_manager.get_notebook_connection(notebook_name, "overwrite_cell") as notebook:
         if cell_index < 0 or cell_index >= len(notebook):
             return f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"
         
-        raw_content = Cell(notebook[cell_index]).source
-        notebook.set_cell_source(cell_index, cell_content)
+        # 只发送变化的部分, 而不是替换整个源码
+        # Only the changed ranges are sent instead of replacing the whole source
+        raw_content = set_cell_source(notebook, cell_index, cell_content)
         
         diff = difflib.unified_diff(raw_content.splitlines(keepends=False), cell_content.splitlines(keepends=False))
         diff = "\n".join(list(diff)[3:])
 
     return f"Overwrite successful!\n\n```diff\n{diff}\n```"
 
+@mcp.tool(tags={"core","cell","patch_cell"})
+async def patch_cell(
+    notebook_name: str,
+    cell_index: Annotated[int, "Cell index(0-based)"],
+    old_text: Annotated[str, "Exact text to replace, must match the cell source verbatim (including whitespace and indentation)"],
+    new_text: Annotated[str, "Replacement text"],
+    replace_all: Annotated[bool, "Replace every occurrence, otherwise `old_text` must occur exactly once"] = False) -> str:
+    """
+    Replace a snippet of a specific cell's source with new text, without resending the whole cell.
+    It is highly recommended for small fixes in large cells instead of `overwrite_cell`.
+    It will return a comparison (diff style, `+` for new lines, `-` for deleted lines) of the cell's content.
+    """
+    if notebook_name not in notebook_manager:
+        return "Notebook does not exist, please check if the notebook name is correct"
+    
+    async with notebook_manager.get_notebook_connection(notebook_name, "patch_cell") as notebook:
+        if cell_index < 0 or cell_index >= len(notebook):
+            return f"Cell index {cell_index} out of range, Notebook has {len(notebook)} cells"
+        
+        raw_content = get_cell_index(notebook).cells(cell_index, cell_index + 1)[0].source
+        try:
+            cell_content = patch_text(raw_content, old_text, new_text, replace_all)
+        except ValueError as e:
+            return f"Patch failed! Error: {e}"
+        set_cell_source(notebook, cell_index, cell_content)
+        
+        diff = difflib.unified_diff(raw_content.splitlines(keepends=False), cell_content.splitlines(keepends=False))
+        diff = "\n".join(list(diff)[3:])
+
+    return f"Patch successful!\n\n```diff\n{diff}\n```"
+
 #===========================================
-# Cell高级集成功能模块(2个)
-# Advanced Integrated Cell Function Module (2)
+# Cell高级集成功能模块(7个)
+# Advanced Integrated Cell Function Module (7)
 #===========================================
 
 @mcp.tool(tags={"advanced","cell","append_execute_code_cell"})
 async def append_execute_code_cell(
     notebook_name: str,
     cell_content: str,
-    timeout: Annotated[int, "seconds"] = 60) -> list[str | ImageContent]:
+    timeout: Annotated[int, "seconds"] = 60,
+    stream: Annotated[bool, "Whether to stream outputs as progress notifications while the cell is running"] = False) -> list[str | ImageContent]:
     """
     Add a new code cell to the end of a Notebook and immediately execute it.
     It is highly recommended for replacing the combination of `insert_cell` and `execute_cell` for a code cell at the end of the Notebook.
@@ -380,29 +667,159 @@ async def append_execute_code_cell(
     if notebook_name not in notebook_manager:
         return ["Notebook does not exist, please check if the notebook name is correct"]
     
-    async with notebook_manager.get_notebook_connection(notebook_name) as notebook:
+    async with notebook_manager.get_notebook_connection(notebook_name, "append_execute_code_cell") as notebook:
         cell_index = notebook.add_code_cell(cell_content)
         kernel = notebook_manager.get_kernel(notebook_name)
-        execution_task = asyncio.create_task(
-            asyncio.to_thread(notebook.execute_cell, cell_index, kernel)
+        result = await run_cell(
+            notebook, kernel, cell_index, timeout, stream_outputs_as_progress() if stream else None,
+            notebook_manager.get_memo(notebook_name)
         )
         
-        try:
-            await asyncio.wait_for(execution_task, timeout=timeout)
-        except asyncio.TimeoutError:
-            execution_task.cancel()
-            if kernel and hasattr(kernel, 'interrupt'):
-                kernel.interrupt()
-            return [f"[TIMEOUT ERROR: Cell execution exceeded {timeout} seconds]"]
-        
         cell = Cell(notebook[cell_index])
         
-        return [f"Cell index {cell_index} execution successful!"] + cell.get_outputs()
+        outputs = OutputBudget().apply(await cell.get_outputs_async(), notebook_manager.output_key(notebook_name), cell_index, get_cell_index(notebook).cell_id(cell_index))
+        
+        if result["status"] == "timeout":
+            return [f"[TIMEOUT ERROR: Cell index {cell_index} execution exceeded {timeout} seconds]"] + outputs
+        if "error" in result:
+            return [f"[EXECUTION FAILED ({result['status']}): Cell index {cell_index}, {result['error']}]"] + outputs
+        return [f"Cell index {cell_index} execution successful!"] + outputs
+
+@mcp.tool(tags={"advanced","cell","execute_cells"})
+async def execute_cells(
+    notebook_name: str,
+    mode: Annotated[
+        Literal["all", "range", "from"],
+        "`all`: execute all code cells; `range`: execute code cells from `start_index` to `end_index` (inclusive); `from`: execute code cells from `start_index` to the end"
+        ] = "all",
+    start_index: Annotated[int, "First cell index (0-based), used by `range` and `from`"] = 0,
+    end_index: Annotated[int, "Last cell index (0-based, inclusive), used by `range`"] = 0,
+    stop_on_error: Annotated[bool, "Whether to skip the remaining cells after an error or timeout"] = True,
+    return_outputs: Annotated[bool, "Whether to return the outputs of all cells, otherwise only the outputs of failed cells are returned"] = False,
+    cell_timeout: Annotated[int, "seconds, timeout of each cell"] = 60,
+    total_timeout: Annotated[int, "seconds, timeout of all cells"] = 600,
+    stream: Annotated[bool, "Whether to stream outputs as progress notifications while the cells are running"] = False,
+    force: Annotated[bool, "Whether to execute all cells even if their code and upstream state are unchanged since their last execution"] = False) -> list[str | ImageContent]:
+    """
+    Execute many code cells back-to-back in one call (markdown cells are ignored).
+    It is highly recommended for re-running a part of or the whole Notebook instead of calling `execute_cell` many times.
+    It will return the status, execution count and duration of each cell, and the outputs of failed cells.
+    """
+    if notebook_name not in notebook_manager:
+        return ["Notebook does not exist, please check if the notebook name is correct"]
+    
+    async with notebook_manager.get_notebook_connection(notebook_name, "execute_cells") as notebook:
+        total_cells = len(notebook)
+        if mode == "all":
+            start_index, end_index = 0, total_cells - 1
+        elif mode == "from":
+            end_index = total_cells - 1
+        if start_index < 0 or start_index >= total_cells:
+            return [f"Start index {start_index} out of range, Notebook has {total_cells} cells"]
+        if end_index < start_index or end_index >= total_cells:
+            return [f"End index {end_index} out of range, it should be between {start_index} and {total_cells - 1}"]
+        
+        summaries = get_cell_index(notebook).summaries(start_index, end_index + 1)
+        cell_indices = [i for i, summary in enumerate(summaries, start_index) if summary.type == "code"]
+        if not cell_indices:
+            return [f"No code cell between index {start_index} and {end_index}"]
+        
+        kernel = notebook_manager.get_kernel(notebook_name)
+        results = await run_cells(
+            notebook, kernel, cell_indices, cell_timeout, total_timeout, stop_on_error,
+            stream_outputs_as_progress() if stream else None,
+            notebook_manager.get_memo(notebook_name), MEMOIZE_EXECUTION and not force
+        )
+        
+        return await summarize_results(notebook, notebook_name, results, return_outputs)
+
+@mcp.tool(tags={"advanced","cell","execute_affected"})
+async def execute_affected(
+    notebook_name: str,
+    cell_index: Annotated[int, "Index (0-based) of the edited code cell"],
+    dry_run: Annotated[bool, "Only return the affected cells and their dependencies without executing them"] = False,
+    stop_on_error: Annotated[bool, "Whether to skip the remaining cells after an error or timeout"] = True,
+    return_outputs: Annotated[bool, "Whether to return the outputs of all cells, otherwise only the outputs of failed cells are returned"] = False,
+    cell_timeout: Annotated[int, "seconds, timeout of each cell"] = 60,
+    total_timeout: Annotated[int, "seconds, timeout of all cells"] = 600,
+    stream: Annotated[bool, "Whether to stream outputs as progress notifications while the cells are running"] = False) -> list[str | ImageContent]:
+    """
+    Re-execute an edited code cell and only the code cells below it that depend on it, directly or indirectly, in notebook order.
+    Dependencies are found by static analysis of the names each cell defines and uses.
+    It is highly recommended after editing a cell in the middle of a Notebook instead of re-running everything with `execute_cells`.
+    It will return the affected cells, then the status, execution count and duration of each cell and the outputs of failed cells.
+    """
+    if notebook_name not in notebook_manager:
+        return ["Notebook does not exist, please check if the notebook name is correct"]
+    
+    async with notebook_manager.get_notebook_connection(notebook_name, "execute_affected") as notebook:
+        total_cells = len(notebook)
+        if cell_index < 0 or cell_index >= total_cells:
+            return [f"Cell index {cell_index} out of range, Notebook has {total_cells} cells"]
+        
+        cells = get_cell_index(notebook).cells(0, total_cells)
+        if cells[cell_index].type != "code":
+            return [f"Cell index {cell_index} is not code, need to execute a code cell"]
+        
+        code_indices = [i for i, cell in enumerate(cells) if cell.type == "code"]
+        flows = [analyze_cell(cells[i].source) for i in code_indices]
+        dependencies = build_dependencies(flows)
+        affected = affected_cells(dependencies, code_indices.index(cell_index))
+        cell_indices = [code_indices[position] for position in affected]
+        
+        rows = []
+        for position in affected:
+            flow = flows[position]
+            depends_on = ",".join(str(code_indices[dependency]) for dependency in sorted(dependencies[position])) or "-"
+            defines = "(unknown)" if flow.opaque else ",".join(sorted(flow.defines)) or "-"
+            rows.append([code_indices[position], depends_on, defines])
+        plan = f"{len(cell_indices)} of {len(code_indices)} code cells affected by cell {cell_index}\n{format_table(['Index', 'Depends On', 'Defines'], rows)}"
+        if dry_run:
+            return [plan]
+        
+        kernel = notebook_manager.get_kernel(notebook_name)
+        results = await run_cells(
+            notebook, kernel, cell_indices, cell_timeout, total_timeout, stop_on_error,
+            stream_outputs_as_progress() if stream else None,
+            notebook_manager.get_memo(notebook_name)
+        )
+        return [plan] + await summarize_results(notebook, notebook_name, results, return_outputs)
+
+@mcp.tool(tags={"advanced","cell","batch_edit_cells"})
+async def batch_edit_cells(
+    notebook_name: str,
+    operations: Annotated[list[CellOperation], "Ordered list of insert/delete/overwrite operations"]) -> str:
+    """
+    Apply many insert/delete/overwrite operations to a Notebook at once.
+    ALL indices refer to the ORIGINAL Notebook before the batch, so NO index shifting or ordering is needed:
+    e.g. delete 3 and insert at 5 means the new cell goes before the original cell 5.
+    Several inserts at the same index are inserted in the given order.
+    The batch is applied entirely or not at all.
+    It is highly recommended for replacing many calls of `insert_cell`, `delete_cell` and `overwrite_cell`.
+    It will return the new index of each operation.
+    """
+    if notebook_name not in notebook_manager:
+        return "Notebook does not exist, please check if the notebook name is correct"
+    
+    if not operations:
+        return "No operation to apply"
+    
+    async with notebook_manager.get_notebook_connection(notebook_name, "batch_edit_cells") as notebook:
+        try:
+            results = apply_cell_operations(notebook, operations)
+        except ValueError as e:
+            return f"Batch edit failed, no operation applied! Error: {e}"
+        total_cells = len(notebook)
+    
+    counts = {op: sum(1 for row in results if row[1] == op) for op in ("insert", "delete", "overwrite")}
+    table = format_table(["No.", "Op", "Original Index", "New Index"], results)
+    return f"Batch edit successful! {counts['insert']} inserted, {counts['delete']} deleted, {counts['overwrite']} overwritten, Notebook now has {total_cells} cells\n{table}"
 
 @mcp.tool(tags={"advanced","cell","execute_temporary_code"})
 async def execute_temporary_code(
     notebook_name: str,
-    cell_content: str) -> list[str | ImageContent]:
+    cell_content: str,
+    timeout: Annotated[int, "seconds"] = 60) -> list[str | ImageContent]:
     """
     Execute a temporary code block (not saved to the Notebook) and will return the output.
     
@@ -419,13 +836,166 @@ async def execute_temporary_code(
     if notebook_name not in notebook_manager:
         return ["Notebook does not exist, please check if the notebook name is correct"]
     
-    kernel = notebook_manager.get_kernel(notebook_name)
-    cell = Cell(kernel.execute(cell_content))
-    return cell.get_outputs()
+    async with notebook_manager.get_scheduler(notebook_name).slot("execute_temporary_code"):
+        kernel = notebook_manager.get_kernel(notebook_name)
+        async with METRICS.span("execute"):
+            result = await execute_code(kernel, cell_content, timeout)
+        # 临时代码可能改变内核状态, 之后执行的Cell都依赖于它
+        # The temporary code may change the kernel state, the cells executed after it depend on it
+        notebook_manager.get_memo(notebook_name).record_temporary(cell_content)
+    outputs = OutputBudget().apply(await Cell(result).get_outputs_async(), notebook_manager.output_key(notebook_name), TEMPORARY_CELL_INDEX)
+    
+    if result["status"] == "timeout":
+        return [f"[TIMEOUT ERROR: Temporary code execution exceeded {timeout} seconds]"] + outputs
+    return outputs
+
+@mcp.tool(tags={"advanced","cell","inspect_variables"})
+async def inspect_variables(
+    notebook_name: str,
+    names: Annotated[list[str] | None, "Only inspect these variables (None means all user variables)"] = None,
+    pattern: Annotated[str | None, "Only inspect the variables whose name matches this glob pattern (e.g. `df_*`)"] = None,
+    include_callables: Annotated[bool, "Whether to also list modules, functions and classes"] = False,
+    preview_chars: Annotated[int, "Maximum characters of the value preview"] = 80,
+    limit: Annotated[int, "Maximum number of variables to return (0 means no limit)"] = 50,
+    timeout: Annotated[int, "seconds"] = 30) -> str:
+    """
+    Inspect the variables of the kernel in a single call.
+    It will return the name, type, shape or length, dtype, approximate memory size and a truncated preview of each variable.
+    Use it instead of a series of `execute_temporary_code` calls (e.g. `df.shape`, `df.dtypes`, `type(x)`), it does not modify the kernel namespace.
+    """
+    if notebook_name not in notebook_manager:
+        return "Notebook does not exist, please check if the notebook name is correct"
+    
+    code = build_inspection_code(names, pattern, include_callables, preview_chars, limit)
+    async with notebook_manager.get_scheduler(notebook_name).slot("inspect_variables"):
+        kernel = notebook_manager.get_kernel(notebook_name)
+        async with METRICS.span("execute"):
+            result = await execute_code(kernel, code, timeout, store_history=False)
+    
+    if result["status"] == "timeout":
+        return f"[TIMEOUT ERROR: Variable inspection exceeded {timeout} seconds]"
+    inspection = parse_inspection(result["outputs"])
+    if result["status"] != "ok" or inspection is None:
+        errors = [output for output in Cell(result).get_outputs() if isinstance(output, str)]
+        return "Failed to inspect the variables:\n" + "\n".join(errors)
+    return format_variables(inspection)
+
+@mcp.tool(tags={"advanced","cell","search_cells"})
+async def search_cells(
+    query: Annotated[str, "Words, phrase or regular expression to search"],
+    mode: Annotated[
+        Literal["term", "phrase", "regex"],
+        "`term`: cells containing all the words (case-insensitive); `phrase`: lines containing the exact phrase (case-insensitive); `regex`: lines matching the Python regular expression"
+        ] = "term",
+    notebook_name: Annotated[str | None, "Only search this notebook (None means all connected notebooks)"] = None,
+    include_outputs: Annotated[bool, "Whether to also search the text outputs of the cells"] = False,
+    limit: Annotated[int, "Maximum number of matching lines to return (0 means no limit)"] = 20) -> str:
+    """
+    Search the cell sources (and optionally the text outputs) of connected Notebooks.
+    It will return the Notebook name, Cell index, line number and content of each matching line.
+    Use it to locate code instead of paging through `list_cell` or `read_notebook`.
+    """
+    if notebook_name is not None and notebook_name not in notebook_manager:
+        return "Notebook does not exist, please check if the notebook name is correct"
+    if notebook_manager.is_empty():
+        return "No notebook is currently connected"
+    
+    try:
+        words, line_matcher = build_search_query(query, mode)
+    except ValueError as e:
+        return f"Search failed! Error: {e}"
+    
+    names = [notebook_name] if notebook_name is not None else [name for name, _ in notebook_manager]
+    rows = []
+    total = 0
+    for name in names:
+        remaining = max(limit - len(rows), 0) if limit > 0 else None
+        async with notebook_manager.get_notebook_connection(name) as notebook:
+            hits, count = get_cell_index(notebook).search(words, line_matcher, include_outputs, remaining)
+        total += count
+        for hit in hits:
+            line = hit.line.strip()
+            line = line[:120] + "..." if len(line) > 120 else line
+            rows.append([name, hit.cell_index, hit.where, hit.line_number, line])
+    
+    if total == 0:
+        return f"No match found for '{query}'"
+    header = f"Found {total} matching lines, showing {len(rows)}"
+    return f"{header}\n{format_table(['Notebook', 'Index', 'Where', 'Line', 'Content'], rows)}"
+
+#===========================================
+# 服务器监控模块(1个)
+# Server monitoring module (1)
+#===========================================
+
+@mcp.tool(tags={"monitor","server_metrics"})
+async def server_metrics(
+    format: Annotated[Literal["table", "json", "prometheus"], "Output format"] = "table",
+    traces: Annotated[int, "Number of recent tool call traces to include"] = 10,
+    reset: Annotated[bool, "Whether to clear the statistics after reading them"] = False) -> str:
+    """
+    Show the latency statistics of this MCP server for diagnosing slow calls.
+    It will return, per tool, the call count, errors, latency percentiles (ms), returned payload size and image count,
+    the latency of the backend phases (connect, sync, snapshot, revalidate, queue_wait, execute, render, image_preprocess, save, kernel_start),
+    the image cache counters and the phase breakdown of the most recent tool calls.
+    """
+    if not METRICS.enabled:
+        return "Metrics are disabled, set METRICS_ENABLED=true to enable them"
+    
+    if format == "prometheus":
+        result = METRICS.to_prometheus()
+    elif format == "json":
+        result = METRICS.to_json()
+    else:
+        snapshot = METRICS.snapshot(traces)
+        tool_rows = [
+            [name, stats["calls"], stats["errors"], stats["mean_ms"], stats["p50_ms"], stats["p95_ms"], stats["max_ms"],
+             round(stats["payload_bytes"] / 1024, 1), stats["images"]]
+            for name, stats in snapshot["tools"].items()
+        ]
+        phase_rows = [
+            [name, stats["count"], stats["mean_ms"], stats["p50_ms"], stats["p95_ms"], stats["max_ms"]]
+            for name, stats in snapshot["phases"].items()
+        ]
+        cache = IMAGE_CACHE.stats()
+        render_cache = RENDER_CACHE.stats()
+        image_rows = [
+            [image["kind"], image["format"], image["count"], round(image["original_bytes"] / 1024, 1), round(image["encoded_bytes"] / 1024, 1),
+             round(image["encoded_bytes"] / image["original_bytes"], 3) if image["original_bytes"] else 0]
+            for image in snapshot["images"]
+        ]
+        trace_rows = [
+            [trace["tool"], trace["duration_ms"], "error" if trace["error"] else "ok",
+             ", ".join(f"{name}={duration}" for name, duration in trace["phases"]) or "-"]
+            for trace in reversed(snapshot["traces"])
+        ]
+        result = "\n\n".join([
+            f"Uptime: {snapshot['uptime_s']}s",
+            "Tools:\n" + (format_table(["Tool", "Calls", "Errors", "Mean(ms)", "P50(ms)", "P95(ms)", "Max(ms)", "Payload(KB)", "Images"], tool_rows) if tool_rows else "No tool call recorded"),
+            "Phases:\n" + (format_table(["Phase", "Count", "Mean(ms)", "P50(ms)", "P95(ms)", "Max(ms)"], phase_rows) if phase_rows else "No phase recorded"),
+            "Images:\n" + (format_table(["Kind", "Format", "Count", "Original(KB)", "Encoded(KB)", "Ratio"], image_rows) if image_rows else "No image recorded"),
+            "Image cache: " + ", ".join(f"{key}={value}" for key, value in cache.items()),
+            "Render cache: " + ", ".join(f"{key}={value}" for key, value in render_cache.items()),
+            "Sessions: " + ", ".join(f"{key}={value}" for key, value in SESSIONS.stats().items()),
+            "Recent calls (newest first):\n" + (format_table(["Tool", "Duration(ms)", "Status", "Phases(ms)"], trace_rows) if trace_rows else "No call recorded"),
+        ])
+    
+    if reset:
+        METRICS.reset()
+    return result
     
 def main():
     """Main entry point for the better-jupyter-mcp-server command."""
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser(description="Jupyter MCP Server")
+    parser.add_argument("--transport", choices=["stdio", "http"], default=TRANSPORT, help="`stdio`: one process per client; `http`: one long-running process serving many clients")
+    parser.add_argument("--host", default=HOST, help="Address listened on in HTTP mode")
+    parser.add_argument("--port", type=int, default=PORT, help="Port listened on in HTTP mode")
+    args = parser.parse_args()
+    
+    if args.transport == "http":
+        anyio.run(serve_http, args.host, args.port)
+    else:
+        mcp.run(transport="stdio")
 
 if __name__ == "__main__":
     main()
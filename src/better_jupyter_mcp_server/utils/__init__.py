@@ -1,11 +1,58 @@
-from .cell import Cell
+from .cell import Cell, IMAGE_CACHE, RENDER_CACHE
+from .render import MimeRenderer, MIME_RENDERERS, register_renderer, select_renderers
 from .notebook import NotebookManager
+from .session import SESSIONS, SessionNotebookManager, SessionMiddleware
+from .kernel import KERNEL_POOL
+from .scheduler import run_blocking
+from .metrics import METRICS, MetricsMiddleware
+from .index import get_cell_index, build_search_query
 from .formatter import format_table, format_notebook, list_cell_basic
+from .edit import CellOperation, apply_cell_operations, set_cell_source, patch_text
+from .execution import run_cell, run_cells, execute_code
+from .dataflow import analyze_cell, build_dependencies, affected_cells
+from .variables import build_inspection_code, parse_inspection, format_variables
+from .local import LocalKernel, LocalNotebookSession, write_notebook_file
+from .output import OutputBudget, OUTPUT_STORE, TEMPORARY_CELL_INDEX, page_output
 
 __all__ = [
     "NotebookManager",
+    "SESSIONS",
+    "SessionNotebookManager",
+    "SessionMiddleware",
+    "KERNEL_POOL",
+    "run_blocking",
+    "METRICS",
+    "MetricsMiddleware",
     "Cell", 
+    "IMAGE_CACHE",
+    "RENDER_CACHE",
+    "MimeRenderer",
+    "MIME_RENDERERS",
+    "register_renderer",
+    "select_renderers",
+    "get_cell_index",
+    "build_search_query",
     "list_cell_basic", 
     "format_table",
-    "format_notebook"
+    "format_notebook",
+    "CellOperation",
+    "apply_cell_operations",
+    "set_cell_source",
+    "patch_text",
+    "run_cell",
+    "run_cells",
+    "execute_code",
+    "analyze_cell",
+    "build_dependencies",
+    "affected_cells",
+    "build_inspection_code",
+    "parse_inspection",
+    "format_variables",
+    "LocalKernel",
+    "LocalNotebookSession",
+    "write_notebook_file",
+    "OutputBudget",
+    "OUTPUT_STORE",
+    "TEMPORARY_CELL_INDEX",
+    "page_output"
 ]
\ No newline at end of file
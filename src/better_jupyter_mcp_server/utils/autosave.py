@@ -0,0 +1,151 @@
+import asyncio, hashlib, json, logging, weakref
+from typing import Any, Optional, TYPE_CHECKING
+
+from .metrics import METRICS
+from ..__env__ import AUTO_SAVE_DEBOUNCE, AUTO_SAVE_MAX_DELAY
+
+if TYPE_CHECKING:
+    from jupyter_server_api import JupyterServerClient
+    from .notebook import NotebookSession
+
+logger = logging.getLogger(__name__)
+
+def _digest(content: dict[str, Any]) -> str:
+    """
+    计算Notebook内容的摘要, 用于判断内容是否发生变化
+    Compute a digest of the notebook content, used to detect whether it has changed
+    """
+    serialized = json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(serialized, digest_size=16).hexdigest()
+
+class AutoSaver:
+    """
+    Background debounced save scheduler of a Notebook
+
+    Save requests are coalesced: the notebook is saved once no request arrived for
+    `debounce` seconds, or at the latest `max_delay` seconds after the first unsaved request.
+    The save itself runs off the event loop and is skipped if the content did not change; the content is
+    not even serialized when the Y document had no transaction since the last save.
+    A request made while the document is re-syncing is kept and retried after another debounce window.
+    """
+
+    # 是否无论AUTO_SAVE_NOTEBOOK如何设置都需要保存 / Whether saving is needed whatever AUTO_SAVE_NOTEBOOK is
+    required = False
+
+    def __init__(
+        self, session: 'NotebookSession', server_client: 'JupyterServerClient',
+        debounce: float = AUTO_SAVE_DEBOUNCE, max_delay: float = AUTO_SAVE_MAX_DELAY):
+        self.session = session
+        self.server_client = server_client
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._first_request: Optional[float] = None
+        self._last_request: Optional[float] = None
+        self._last_digest: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._save_lock = asyncio.Lock()
+        # 被监听的Y文档与其自上次保存以来是否有变更
+        # The watched Y document and whether it changed since the last save
+        self._watched: Optional[weakref.ref] = None
+        self._subscription: Any = None
+        self._changed = True
+        self.save_count = 0
+        self.skip_count = 0
+
+    @property
+    def pending(self) -> bool:
+        """Whether there is an unsaved request"""
+        return self._first_request is not None
+
+    def schedule(self) -> None:
+        """
+        Request a save, it will be performed in background after the debounce window
+        """
+        now = asyncio.get_running_loop().time()
+        if self._first_request is None:
+            self._first_request = now
+        self._last_request = now
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Wait for the debounce window to close, then save"""
+        loop = asyncio.get_running_loop()
+        while self.pending:
+            deadline = min(self._last_request + self.debounce, self._first_request + self.max_delay)
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            try:
+                # 保护正在进行的保存不被flush取消
+                # Shield the ongoing save from being cancelled by flush
+                await asyncio.shield(self._save())
+            except Exception as e:
+                logger.warning("Failed to auto save notebook '%s': %s", self.session.notebook_info["path"], e)
+
+    async def _save(self) -> None:
+        """Save the notebook if its content changed since the last save"""
+        async with self._save_lock:
+            if not self.pending:
+                return
+
+            notebook = self.session.notebook
+            if notebook is None:
+                self._first_request = self._last_request = None
+                return
+            # 未同步的文档是空模型, 保存它会覆盖服务器上的内容, 重新计时等待同步完成
+            # An unsynced document is an empty model, saving it would overwrite the content on the server,
+            # the request is re-armed until the document is synced
+            if not notebook.synced:
+                self._first_request = self._last_request = asyncio.get_running_loop().time()
+                return
+            self._first_request = self._last_request = None
+
+            if not self._watch(notebook):
+                self.skip_count += 1
+                return
+            self._changed = False
+            content = notebook.as_dict()
+            digest = await asyncio.to_thread(_digest, content)
+            if digest == self._last_digest:
+                self.skip_count += 1
+                return
+            try:
+                async with METRICS.span("save"):
+                    await asyncio.to_thread(self._write, content)
+            except BaseException:
+                self._changed = True
+                raise
+            self._last_digest = digest
+            self.save_count += 1
+
+    def _watch(self, notebook: Any) -> bool:
+        """Whether the Y document of the notebook may have changed since the last save, watching it on first use"""
+        ydoc = notebook._doc.ydoc
+        if self._watched is None or self._watched() is not ydoc:
+            self._watched = weakref.ref(ydoc)
+            self._subscription = ydoc.observe(self._on_change)
+            self._changed = True
+        return self._changed
+
+    def _on_change(self, event: Any) -> None:
+        """Mark the document as changed (called in the thread committing the transaction)"""
+        self._changed = True
+
+    def _write(self, content: dict[str, Any]) -> None:
+        """Write the notebook content (called in a worker thread)"""
+        self.server_client.contents.save_notebook(self.session.notebook_info["path"], content)
+
+    async def flush(self) -> None:
+        """
+        Save immediately if there is an unsaved request and stop the background task
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        await self._save()
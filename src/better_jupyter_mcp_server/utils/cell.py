@@ -1,9 +1,168 @@
-import re, base64, io
-from typing import Any
+import re, io, asyncio, hashlib, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
 from fastmcp.utilities.types import Image
-from PIL import Image as PILImage
 
-from ..__env__ import ALLOW_IMG, ALLOW_IMG_PREPROCESS, MAX_WIDTH, MAX_HEIGHT, IMAGE_TOKEN_SIZE
+from .metrics import METRICS
+from .render import MimeRenderer, mime_data, select_renderers
+from ..__env__ import (
+    ALLOW_IMG_PREPROCESS, MAX_WIDTH, MAX_HEIGHT, IMAGE_TOKEN_SIZE, IMAGE_CACHE_SIZE, IMAGE_WORKERS, RENDER_CACHE_SIZE,
+    IMAGE_MAX_BYTES, IMAGE_ENCODINGS, IMAGE_MIN_QUALITY
+)
+
+# 渲染器拒绝渲染的缓存标记 / Cache marker of an output the renderer declined
+_DECLINED = object()
+
+# 有损编码质量搜索的上限 / Upper bound of the quality search of the lossy encodings
+_MAX_QUALITY = 90
+# 超出预算时每次缩小尺寸的比例 / Ratio applied to the size at each downscaling step when over budget
+_DOWNSCALE_RATIO = 0.75
+
+class RenderCache:
+    """
+    基于内容寻址的输出渲染结果LRU缓存(线程安全)
+    Content-addressed, thread-safe LRU cache of rendered outputs
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._cache: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(data: str, mime: str = "image/png") -> str:
+        """
+        缓存键由MIME类型、输出内容与影响图片预处理结果的配置共同决定
+        The cache key depends on the MIME type, the output content and the settings affecting the image preprocessing
+        """
+        digest = hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{mime}:{digest}:{MAX_WIDTH}:{MAX_HEIGHT}:{IMAGE_TOKEN_SIZE}:{IMAGE_MAX_BYTES}:{','.join(IMAGE_ENCODINGS)}:{IMAGE_MIN_QUALITY}"
+    
+    def get(self, key: str) -> Any:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+    
+    def stats(self) -> dict[str, int]:
+        """
+        Get the hit/miss counters and the current size of the cache
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), "max_size": self.max_size}
+
+# 所有Cell共享的图片缓存、文本渲染缓存与图片预处理线程池
+# Image cache, rendered text cache and image preprocessing thread pool shared by all cells
+IMAGE_CACHE = RenderCache(IMAGE_CACHE_SIZE)
+RENDER_CACHE = RenderCache(RENDER_CACHE_SIZE)
+_image_executor = ThreadPoolExecutor(max_workers=max(IMAGE_WORKERS, 1), thread_name_prefix="image-preprocess")
+
+def _save_image(img: Any, encoding: str, quality: int = _MAX_QUALITY) -> bytes:
+    """Encode a Pillow image, PNG losslessly optimized, WebP and JPEG at the given quality"""
+    from PIL import Image as PILImage
+    buffer = io.BytesIO()
+    if encoding == "png":
+        img.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    if encoding == "jpeg" and has_alpha:
+        # JPEG不支持透明度, 合成到白色背景上 / JPEG has no transparency, composite onto a white background
+        rgba = img.convert("RGBA")
+        img = PILImage.new("RGB", rgba.size, "white")
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    elif img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if has_alpha and encoding == "webp" else "RGB")
+    img.save(buffer, format=encoding.upper(), quality=quality)
+    return buffer.getvalue()
+
+def _encode_within(img: Any, max_bytes: int) -> tuple[bytes, str]:
+    """
+    在字节预算内以尽可能高的质量编码图片
+    Encode an image at the best possible quality within the byte budget
+
+    Lossless PNG is kept if it fits, otherwise the lossy encoding fitting at the highest quality is chosen
+    (binary search between IMAGE_MIN_QUALITY and _MAX_QUALITY). When nothing fits, the image is downscaled
+    (in multiples of IMAGE_TOKEN_SIZE) and encoded again; the smallest encoding is returned if it still
+    exceeds the budget at the smallest size.
+
+    Returns:
+        (图片字节数据, 格式) / (image data in bytes, format)
+    """
+    from PIL import Image as PILImage
+    smallest: Optional[tuple[bytes, str]] = None
+    while True:
+        best: Optional[tuple[int, bytes, str]] = None
+        for encoding in IMAGE_ENCODINGS:
+            if encoding == "png":
+                data = _save_image(img, "png")
+                if len(data) <= max_bytes:
+                    return data, "png"
+            else:
+                data = _save_image(img, encoding, _MAX_QUALITY)
+                low, high = IMAGE_MIN_QUALITY, _MAX_QUALITY - 1
+                fitting = (_MAX_QUALITY, data) if len(data) <= max_bytes else None
+                if fitting is None:
+                    data = _save_image(img, encoding, low)
+                    fitting = (low, data) if len(data) <= max_bytes else None
+                    low += 1
+                    while fitting is not None and low <= high:
+                        quality = (low + high) // 2
+                        candidate = _save_image(img, encoding, quality)
+                        if len(candidate) <= max_bytes:
+                            fitting, low = (quality, candidate), quality + 1
+                        else:
+                            high = quality - 1
+                if fitting is not None and (best is None or (fitting[0], -len(fitting[1])) > (best[0], -len(best[1]))):
+                    best = (fitting[0], fitting[1], encoding)
+            if smallest is None or len(data) < len(smallest[0]):
+                smallest = (data, encoding)
+        if best is not None:
+            return best[1], best[2]
+        width, height = img.size
+        new_width = max(int(width * _DOWNSCALE_RATIO) // IMAGE_TOKEN_SIZE * IMAGE_TOKEN_SIZE, IMAGE_TOKEN_SIZE)
+        new_height = max(int(height * _DOWNSCALE_RATIO) // IMAGE_TOKEN_SIZE * IMAGE_TOKEN_SIZE, IMAGE_TOKEN_SIZE)
+        if (new_width, new_height) == (width, height):
+            return smallest
+        img = img.resize((new_width, new_height), PILImage.Resampling.LANCZOS)
+
+def shrink_image(image_data: bytes, max_bytes: int) -> Optional[tuple[bytes, str]]:
+    """
+    将图片缩小为不超过给定字节数的缩略图
+    Shrink an image into a thumbnail within the given number of bytes
+
+    Args:
+        image_data: 图片字节数据 / The image data in bytes
+        max_bytes: 最大字节数 / Maximum number of bytes
+
+    Returns:
+        (缩略图字节数据, 格式), 最小的缩略图仍超出时为None / (thumbnail data in bytes, format), None if even the smallest thumbnail exceeds it
+    """
+    from PIL import Image as PILImage
+    try:
+        with METRICS.span("image_preprocess"):
+            data, encoding = _encode_within(PILImage.open(io.BytesIO(image_data)), max_bytes)
+    except Exception:
+        return None
+    if len(data) > max_bytes:
+        return None
+    METRICS.record_image("thumbnail", encoding, len(image_data), len(data))
+    return data, encoding
 
 class Cell:
     def __init__(self, cell: dict | Any):
@@ -19,21 +178,26 @@ class Cell:
             text = "\n".join(text)
         return ansi_escape.sub('', text)
     
-    def _preprocess_image(self, image_data: bytes) -> bytes:
+    def _preprocess_image(self, image_data: bytes, image_format: str = "png") -> tuple[bytes, str]:
         """
-        对图片进行预处理，包括等比例缩放和基于IMAGE_TOKEN_SIZE的进一步缩放
-        Process the image, including proportional scaling and further scaling based on IMAGE_TOKEN_SIZE
+        对图片进行预处理，包括等比例缩放、基于IMAGE_TOKEN_SIZE的进一步缩放，以及在IMAGE_MAX_BYTES预算内重新编码
+        Process the image, including proportional scaling, further scaling based on IMAGE_TOKEN_SIZE,
+        and re-encoding within the IMAGE_MAX_BYTES budget
         
         Args:
             image_data: 原始图片的字节数据
             image_data: The original image data in bytes
+            image_format: 原始图片的格式 / The format of the original image
             
         Returns:
-            处理后的图片字节数据
-            The processed image data in bytes
+            处理后的图片字节数据及其格式
+            The processed image data in bytes and its format
         """
         if not ALLOW_IMG_PREPROCESS:
-            return image_data
+            return image_data, image_format
+        # Pillow只在真正处理图片时导入, 以加快服务启动
+        # Pillow is only imported when an image is actually processed, to speed up the server startup
+        from PIL import Image as PILImage
             
         try:
             img = PILImage.open(io.BytesIO(image_data))
@@ -52,20 +216,85 @@ class Cell:
             final_width = max(final_width, IMAGE_TOKEN_SIZE)
             final_height = max(final_height, IMAGE_TOKEN_SIZE)
             
-            if final_width == original_width and final_height == original_height:
-                return image_data
+            within_budget = IMAGE_MAX_BYTES <= 0 or len(image_data) <= IMAGE_MAX_BYTES
+            if final_width == original_width and final_height == original_height and within_budget:
+                return image_data, image_format
             
-            resized_img = img.resize((final_width, final_height), PILImage.Resampling.LANCZOS)
-            output_buffer = io.BytesIO()
             img_format = img.format if img.format else 'PNG'
-            resized_img.save(output_buffer, format=img_format)
+            if final_width != original_width or final_height != original_height:
+                img = img.resize((final_width, final_height), PILImage.Resampling.LANCZOS)
+            if IMAGE_MAX_BYTES > 0:
+                return _encode_within(img, IMAGE_MAX_BYTES)
+            output_buffer = io.BytesIO()
+            img.save(output_buffer, format=img_format)
             
-            return output_buffer.getvalue()
+            return output_buffer.getvalue(), img_format.lower()
             
         except Exception as e:
-            return image_data
+            return image_data, image_format
+    
+    def _load_image(self, renderer: MimeRenderer, data: str, key: str) -> Optional[tuple[bytes, str]]:
+        """
+        渲染并预处理图片输出, 结果按内容缓存
+        Render and preprocess an image output, the result is cached by content
+        
+        Args:
+            renderer: 图片渲染器 / The image renderer
+            data: 输出的原始数据 / The raw data of the output
+            key: 缓存键 / The cache key
+            
+        Returns:
+            (处理后的图片字节数据, 格式), 渲染器拒绝时为None / (processed image data in bytes, format), None if the renderer declined
+        """
+        processed_image = IMAGE_CACHE.get(key)
+        if processed_image is None:
+            image_data = renderer.render(data)
+            if image_data is None:
+                return None
+            with METRICS.span("image_preprocess"):
+                processed_image = self._preprocess_image(image_data, renderer.image_format)
+            METRICS.record_image("encoded", processed_image[1], len(image_data), len(processed_image[0]))
+            IMAGE_CACHE.put(key, processed_image)
+        return processed_image
+    
+    def _render_text(self, renderer: MimeRenderer, data: str) -> Optional[str]:
+        """
+        渲染文本输出, 开销较大的渲染结果按内容缓存
+        Render a text output, the costly renderings are cached by content
+        """
+        if not renderer.cache:
+            text = renderer.render(data)
+            return None if text is None else self._strip_ansi_codes(text)
+        key = RenderCache.key(data, renderer.mime)
+        text = RENDER_CACHE.get(key)
+        if text is None:
+            text = renderer.render(data)
+            RENDER_CACHE.put(key, _DECLINED if text is None else text)
+        return None if text is None or text is _DECLINED else self._strip_ansi_codes(text)
+    
+    def _render_data(self, data: dict, processed_images: Optional[dict[str, tuple[bytes, str]]] = None) -> Any:
+        """
+        使用第一个可用且未拒绝的渲染器渲染展示数据, 即选择最紧凑的有用表示
+        Render display data with the first renderer that applies and does not decline,
+        i.e. choose the most compact useful representation
+        """
+        for renderer in select_renderers(data):
+            raw = mime_data(data[renderer.mime])
+            if renderer.image_format is None:
+                text = self._render_text(renderer, raw)
+                if text is not None:
+                    return text
+                continue
+            key = RenderCache.key(raw, renderer.mime)
+            if processed_images is not None and key in processed_images:
+                processed_image = processed_images[key]
+            else:
+                processed_image = self._load_image(renderer, raw, key)
+            if processed_image is not None:
+                return Image(data=processed_image[0], format=processed_image[1]).to_image_content()
+        return f"[Unknown display data type: {list(data.keys())}]"
 
-    def _process_output(self, output: dict) -> Any:
+    def _process_output(self, output: dict, processed_images: Optional[dict[str, tuple[bytes, str]]] = None) -> Any:
         # 标准流输出
         # Standard stream output
         if output['output_type'] == 'stream':
@@ -79,14 +308,7 @@ class Cell:
         # 可视化化输出
         # Visualization output:
         elif output['output_type'] in ['display_data', 'execute_result']:
-            if ("image/png" in output['data']) and ALLOW_IMG:
-                raw_image_data = base64.b64decode(output['data']['image/png'])
-                processed_image_data = self._preprocess_image(raw_image_data)
-                return Image(data=processed_image_data, format="image/png").to_image_content()
-            elif "text/plain" in output['data']:
-                return self._strip_ansi_codes(output['data']['text/plain'])
-            else:
-                return f"[Unknown display data type: {list(output['data'].keys())}]"
+            return self._render_data(output['data'], processed_images)
         else:
             return f"[Unknown output type: {output['output_type']}]"
     
@@ -108,4 +330,31 @@ class Cell:
     def get_outputs(self) -> list:
         outputs = self._cell.get('outputs', [])
         result = [self._process_output(output) for output in outputs]
-        return result
\ No newline at end of file
+        return result
+    
+    async def get_outputs_async(self) -> list:
+        """
+        与get_outputs相同, 但图片在线程池中并行预处理, 不阻塞事件循环
+        Same as get_outputs, but images are preprocessed in parallel in the thread pool without blocking the event loop
+        """
+        with METRICS.span("render"):
+            outputs = self._cell.get('outputs', [])
+            # 优先使用图片渲染器的输出在线程池中预处理
+            # The outputs preferring an image renderer are preprocessed in the thread pool
+            images = {}
+            for output in outputs:
+                if output['output_type'] not in ['display_data', 'execute_result']:
+                    continue
+                renderers = select_renderers(output['data'])
+                if renderers and renderers[0].image_format is not None:
+                    raw = mime_data(output['data'][renderers[0].mime])
+                    images[RenderCache.key(raw, renderers[0].mime)] = (renderers[0], raw)
+            processed_images = {}
+            if images:
+                loop = asyncio.get_running_loop()
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(_image_executor, self._load_image, renderer, raw, key)
+                    for key, (renderer, raw) in images.items()
+                ))
+                processed_images = {key: result for key, result in zip(images, results) if result is not None}
+            return [self._process_output(output, processed_images) for output in outputs]
\ No newline at end of file
@@ -0,0 +1,359 @@
+import ast, builtins, functools, re
+from typing import NamedTuple, Optional
+
+_BUILTINS = frozenset(dir(builtins)) | {"get_ipython", "display", "In", "Out", "_", "__", "___"}
+
+# IPython的魔法命令与Shell命令行, 以及把它们的结果赋值给变量的行
+# IPython magic and shell command lines, and the lines assigning their result to variables
+_MAGIC_LINE = re.compile(r"^(\s*)[%!]")
+_MAGIC_ASSIGN = re.compile(r"^(\s*)([\w\s,.\[\]()*]+?)=\s*[%!]")
+# 内容仍为Python代码的Cell魔法命令 / Cell magics whose body is still Python code
+_PYTHON_CELL_MAGICS = {"time", "timeit", "capture", "prun", "debug"}
+
+class CellDataflow(NamedTuple):
+    """
+    Cell的数据流: 定义的名称与使用的名称
+    Dataflow of a cell: the names it defines and the names it uses
+    """
+    defines: frozenset[str]
+    uses: frozenset[str]
+    # 无法解析的Cell(如其他语言的Cell魔法命令、通配符导入)视为依赖所有之前的Cell并被之后所有的Cell依赖
+    # A cell that cannot be analysed (e.g. a cell magic of another language, a wildcard import) is treated
+    # as depending on every earlier cell and as a dependency of every later cell
+    opaque: bool = False
+
+def _strip_magics(source: str) -> str:
+    """Replace the IPython magic and shell lines by Python statements keeping the assigned names"""
+    lines = []
+    for line in source.splitlines():
+        match = _MAGIC_ASSIGN.match(line)
+        if match:
+            lines.append(f"{match.group(1)}{match.group(2)}= None")
+        elif _MAGIC_LINE.match(line):
+            lines.append(f"{_MAGIC_LINE.match(line).group(1)}pass")
+        else:
+            lines.append(line)
+    return "\n".join(lines)
+
+def _stored_names(nodes: list[ast.AST]) -> set[str]:
+    """Names bound anywhere in the nodes (local names of a function body)"""
+    names = set()
+    for node in nodes:
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, (ast.Store, ast.Del)):
+                names.add(child.id)
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                names.add(child.name)
+            elif isinstance(child, ast.alias):
+                names.add((child.asname or child.name).split(".")[0])
+            elif isinstance(child, ast.arg):
+                names.add(child.arg)
+            elif isinstance(child, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and child.name:
+                names.add(child.name)
+            elif isinstance(child, ast.MatchMapping) and child.rest:
+                names.add(child.rest)
+    return names
+
+def _base_name(node: ast.AST) -> Optional[str]:
+    """Name at the root of an attribute or subscript chain (`df` for `df.a["b"]`)"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+class _Visitor(ast.NodeVisitor):
+    """
+    按执行顺序遍历模块级语句, 收集定义与使用的名称
+    Walk the module level statements in execution order, collecting the defined and used names
+
+    A name read before being defined in the cell is a use; names read inside function bodies are used when the
+    function is called, so they are uses unless the cell defines them. Mutating an object through an attribute,
+    a subscript, an augmented assignment or an `inplace=True` call counts as using and redefining it.
+    Alternative branches (if/else, try/except, match cases, loop bodies that may not run) are each visited from
+    the names bound before them; a name is bound after them only if every branch binds it.
+    """
+
+    def __init__(self):
+        self.defines: set[str] = set()
+        # 在当前位置一定已被绑定的名称, 读取它们不算使用
+        # Names certainly bound at the current position, reading them is not a use
+        self.bound: set[str] = set()
+        self.uses: set[str] = set()
+        self.deferred: set[str] = set()
+        self.opaque = False
+        # 嵌套作用域的局部名称 / Local names of the nested scopes
+        self.scopes: list[set[str]] = []
+
+    def _load(self, name: str) -> None:
+        if any(name in scope for scope in self.scopes):
+            return
+        if self.scopes:
+            self.deferred.add(name)
+        elif name not in self.bound:
+            self.uses.add(name)
+
+    def _store(self, name: str) -> None:
+        if not self.scopes:
+            self.defines.add(name)
+            self.bound.add(name)
+
+    def _mutate(self, node: ast.AST) -> None:
+        name = _base_name(node)
+        if name is not None and not any(name in scope for scope in self.scopes):
+            self._load(name)
+            self.defines.add(name)
+            self.bound.add(name)
+
+    def _visit_branches(self, branches: list[list[ast.AST]]) -> None:
+        """Visit alternative branches from the same bound names, keeping the names bound by all of them"""
+        before = self.bound
+        bound = []
+        for nodes in branches:
+            self.bound = set(before)
+            for node in nodes:
+                self.visit(node)
+            bound.append(self.bound)
+        self.bound = set.intersection(*bound) if bound else before
+
+    def visit_Name(self, node: ast.Name) -> None:
+        if isinstance(node.ctx, ast.Load):
+            self._load(node.id)
+        else:
+            self._store(node.id)
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._mutate(node)
+        self.visit(node.value)
+
+    def visit_Subscript(self, node: ast.Subscript) -> None:
+        if isinstance(node.ctx, (ast.Store, ast.Del)):
+            self._mutate(node)
+        self.visit(node.value)
+        self.visit(node.slice)
+
+    def visit_Assign(self, node: ast.Assign) -> None:
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AnnAssign(self, node: ast.AnnAssign) -> None:
+        self.visit(node.annotation)
+        if node.value is not None:
+            self.visit(node.value)
+            self.visit(node.target)
+
+    def visit_AugAssign(self, node: ast.AugAssign) -> None:
+        self.visit(node.value)
+        if isinstance(node.target, ast.Name):
+            self._load(node.target.id)
+            self._store(node.target.id)
+        else:
+            self.visit(node.target)
+
+    def visit_NamedExpr(self, node: ast.NamedExpr) -> None:
+        self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_If(self, node: ast.If) -> None:
+        self.visit(node.test)
+        self._visit_branches([node.body, node.orelse])
+
+    def visit_For(self, node: ast.For | ast.AsyncFor) -> None:
+        self.visit(node.iter)
+        # 循环体可能一次都不执行 / The loop body may not run at all
+        self._visit_branches([[node.target, *node.body], []])
+        for statement in node.orelse:
+            self.visit(statement)
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node: ast.While) -> None:
+        self.visit(node.test)
+        self._visit_branches([node.body, []])
+        for statement in node.orelse:
+            self.visit(statement)
+
+    def visit_Try(self, node: ast.Try | ast.TryStar) -> None:
+        self._visit_branches([node.body + node.orelse, *([handler] for handler in node.handlers)])
+        for statement in node.finalbody:
+            self.visit(statement)
+
+    visit_TryStar = visit_Try
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler) -> None:
+        if node.type is not None:
+            self.visit(node.type)
+        # 异常变量在处理块结束时被删除, 不是Cell定义的名称
+        # The exception variable is deleted at the end of the handler, it is not a name defined by the cell
+        if node.name and not self.scopes:
+            self.bound.add(node.name)
+        for statement in node.body:
+            self.visit(statement)
+        if node.name and not self.scopes:
+            self.bound.discard(node.name)
+
+    def visit_Match(self, node: ast.Match) -> None:
+        self.visit(node.subject)
+        branches = [[case.pattern, *([case.guard] if case.guard else []), *case.body] for case in node.cases]
+        last = node.cases[-1].pattern if node.cases else None
+        # 没有通配的case时可能没有任何case匹配 / Without a catch-all case no case may match
+        if not (isinstance(last, ast.MatchAs) and last.pattern is None):
+            branches.append([])
+        self._visit_branches(branches)
+
+    def visit_MatchAs(self, node: ast.MatchAs) -> None:
+        if node.pattern is not None:
+            self.visit(node.pattern)
+        if node.name:
+            self._store(node.name)
+
+    def visit_MatchStar(self, node: ast.MatchStar) -> None:
+        if node.name:
+            self._store(node.name)
+
+    def visit_MatchMapping(self, node: ast.MatchMapping) -> None:
+        for child in node.keys + node.patterns:
+            self.visit(child)
+        if node.rest:
+            self._store(node.rest)
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if isinstance(node.func, ast.Attribute) and any(
+            keyword.arg == "inplace" and isinstance(keyword.value, ast.Constant) and keyword.value.value is True
+            for keyword in node.keywords
+        ):
+            self._mutate(node.func.value)
+        self.generic_visit(node)
+
+    def visit_Import(self, node: ast.Import | ast.ImportFrom) -> None:
+        for alias in node.names:
+            if alias.name == "*":
+                self.opaque = True
+            else:
+                self._store((alias.asname or alias.name).split(".")[0])
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Global(self, node: ast.Global | ast.Nonlocal) -> None:
+        self.defines.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def _visit_scope(self, local_names: set[str], nodes: list[ast.AST]) -> None:
+        self.scopes.append(local_names)
+        try:
+            for node in nodes:
+                self.visit(node)
+        finally:
+            self.scopes.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for default in node.args.defaults + [default for default in node.args.kw_defaults if default is not None]:
+            self.visit(default)
+        self._store(node.name)
+        global_names = {name for child in ast.walk(node) if isinstance(child, (ast.Global, ast.Nonlocal)) for name in child.names}
+        self.defines.update(global_names)
+        self._visit_scope(_stored_names([node.args, *node.body]) - global_names, node.body)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node: ast.Lambda) -> None:
+        for default in node.args.defaults + [default for default in node.args.kw_defaults if default is not None]:
+            self.visit(default)
+        self._visit_scope(_stored_names([node.args]), [node.body])
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        for child in node.decorator_list + node.bases + node.keywords:
+            self.visit(child)
+        self._store(node.name)
+        self._visit_scope(_stored_names(node.body), node.body)
+
+    def _visit_comprehension(self, node: ast.ListComp | ast.SetComp | ast.GeneratorExp | ast.DictComp) -> None:
+        # 第一个迭代对象在外层作用域中求值 / The first iterable is evaluated in the enclosing scope
+        self.visit(node.generators[0].iter)
+        local_names = _stored_names([generator.target for generator in node.generators])
+        elements = [node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]
+        rest = [node.generators[0].target, *node.generators[0].ifs]
+        for generator in node.generators[1:]:
+            rest.extend([generator.iter, generator.target, *generator.ifs])
+        self._visit_scope(local_names, rest + elements)
+
+    visit_ListComp = visit_SetComp = visit_GeneratorExp = visit_DictComp = _visit_comprehension
+
+@functools.lru_cache(maxsize=4096)
+def analyze_cell(source: str) -> CellDataflow:
+    """
+    解析Cell源码, 获取其定义与使用的全局名称
+    Parse the source of a cell to get the global names it defines and uses
+
+    Args:
+        source: Cell源码 / Cell source
+
+    Returns:
+        Cell的数据流 / Dataflow of the cell
+    """
+    stripped = source.lstrip()
+    if stripped.startswith("%%"):
+        magic, _, body = stripped.partition("\n")
+        if magic[2:].split(" ", 1)[0] not in _PYTHON_CELL_MAGICS:
+            return CellDataflow(frozenset(), frozenset(), opaque=True)
+        source = body
+    try:
+        tree = ast.parse(_strip_magics(source))
+    except SyntaxError:
+        return CellDataflow(frozenset(), frozenset(), opaque=True)
+    visitor = _Visitor()
+    for statement in tree.body:
+        visitor.visit(statement)
+    uses = (visitor.uses | (visitor.deferred - visitor.defines)) - _BUILTINS
+    return CellDataflow(frozenset(visitor.defines), frozenset(uses), visitor.opaque)
+
+def build_dependencies(flows: list[CellDataflow]) -> list[set[int]]:
+    """
+    构建Cell之间的依赖关系: 每个Cell依赖于其使用或重新定义的名称在它之前最近一次被定义的Cell
+    Build the dependencies between cells: each cell depends on the cells that last defined, before it,
+    the names it uses or redefines
+
+    Redefinitions are dependencies too: when a cell is re-run, the cells below it redefining the same names
+    must run again, otherwise the kernel keeps the value of the re-run cell instead of the one of the notebook order.
+
+    Args:
+        flows: 按Notebook顺序排列的Cell数据流 / Dataflows of the cells in notebook order
+
+    Returns:
+        每个Cell所依赖的Cell位置 / Positions of the cells each cell depends on
+    """
+    last_definition: dict[str, int] = {}
+    opaque: list[int] = []
+    dependencies = []
+    for position, flow in enumerate(flows):
+        if flow.opaque:
+            dependencies.append(set(range(position)))
+            opaque.append(position)
+        else:
+            dependencies.append({last_definition[name] for name in flow.uses | flow.defines if name in last_definition} | set(opaque))
+        for name in flow.defines:
+            last_definition[name] = position
+    return dependencies
+
+def affected_cells(dependencies: list[set[int]], start: int) -> list[int]:
+    """
+    获取一个Cell及所有直接或间接依赖它的Cell, 按拓扑顺序(即Notebook顺序)排列
+    Get a cell and all the cells depending on it directly or indirectly, in topological order (i.e. notebook order)
+
+    Args:
+        dependencies: build_dependencies的结果 / Result of build_dependencies
+        start: 起始Cell的位置 / Position of the starting cell
+
+    Returns:
+        受影响的Cell位置 / Positions of the affected cells
+    """
+    affected = [start]
+    reached = {start}
+    for position in range(start + 1, len(dependencies)):
+        if dependencies[position] & reached:
+            affected.append(position)
+            reached.add(position)
+    return affected
@@ -0,0 +1,226 @@
+import difflib, os
+from typing import Annotated, Literal, TYPE_CHECKING
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    import pycrdt
+    from jupyter_nbmodel_client import NbModelClient
+
+def _trim_common(old: str, new: str) -> tuple[int, int, str]:
+    """Skip the common prefix and suffix, return the single edit (start, end, replacement) covering the rest"""
+    prefix = len(os.path.commonprefix([old, new]))
+    suffix = min(len(os.path.commonprefix([old[prefix:][::-1], new[prefix:][::-1]])), len(old) - prefix, len(new) - prefix)
+    return prefix, len(old) - suffix, new[prefix:len(new) - suffix]
+
+def diff_text(old: str, new: str) -> list[tuple[int, int, str]]:
+    """
+    计算将旧文本变为新文本的最小编辑脚本
+    Compute a minimal edit script turning the old text into the new one
+
+    The common prefix and suffix are skipped, the rest is matched line by line and each replaced
+    block is trimmed again character by character, so the script is proportional to the change.
+
+    Args:
+        old: 旧文本 / The old text
+        new: 新文本 / The new text
+
+    Returns:
+        按位置升序排列的(起始, 结束, 替换文本), 位置为旧文本中的字符偏移
+        (start, end, replacement) in ascending order, positions are character offsets in the old text
+    """
+    if old == new:
+        return []
+    start, end, new_middle = _trim_common(old, new)
+    old_middle = old[start:end]
+    if not old_middle or not new_middle or ("\n" not in old_middle and "\n" not in new_middle):
+        return [(start, end, new_middle)]
+
+    old_lines = old_middle.splitlines(keepends=True)
+    new_lines = new_middle.splitlines(keepends=True)
+    old_offsets = [0]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+    new_offsets = [0]
+    for line in new_lines:
+        new_offsets.append(new_offsets[-1] + len(line))
+
+    edits = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        block_start, block_end, replacement = _trim_common(old_middle[old_offsets[i1]:old_offsets[i2]], new_middle[new_offsets[j1]:new_offsets[j2]])
+        edits.append((start + old_offsets[i1] + block_start, start + old_offsets[i1] + block_end, replacement))
+    return edits
+
+def update_text(text: 'pycrdt.Text', new: str) -> str:
+    """
+    以最小的插入与删除操作将共享文本更新为新内容(需要在事务中调用)
+    Update a shared text to the new content with the minimal inserts and deletes (call it inside a transaction)
+
+    Only the changed ranges are sent to the collaborators, so the update scales with the size of
+    the change and the cursors of the other users outside the changed ranges are preserved.
+
+    Args:
+        text: 共享文本 / The shared text
+        new: 新内容 / The new content
+
+    Returns:
+        更新前的内容 / The content before the update
+    """
+    old = str(text)
+    # 共享文本的位置以UTF-8字节计算, 从后往前应用, 使前面的位置保持不变
+    # Positions in the shared text are UTF-8 byte offsets, apply from the end so that earlier positions stay valid
+    edits = []
+    char_offset = byte_offset = 0
+    for start, end, replacement in diff_text(old, new):
+        byte_start = byte_offset + len(old[char_offset:start].encode("utf-8"))
+        byte_end = byte_start + len(old[start:end].encode("utf-8"))
+        edits.append((byte_start, byte_end, replacement))
+        char_offset, byte_offset = end, byte_end
+    for byte_start, byte_end, replacement in reversed(edits):
+        if byte_end > byte_start:
+            del text[byte_start:byte_end]
+        if replacement:
+            text.insert(byte_start, replacement)
+    return old
+
+def set_cell_source(notebook: 'NbModelClient', index: int, source: str) -> str:
+    """
+    以最小编辑更新Cell的源码
+    Update the source of a cell with a minimal edit
+
+    Args:
+        notebook: Notebook对象 / The notebook object
+        index: Cell索引 / Cell index
+        source: 新的源码 / The new source
+
+    Returns:
+        更新前的源码 / The source before the update
+    """
+    with notebook._lock:
+        with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+            return update_text(notebook._doc.ycells[index]["source"], source)
+
+def patch_text(source: str, old_text: str, new_text: str, replace_all: bool = False) -> str:
+    """
+    将源码中的一段文本替换为新文本
+    Replace a snippet of a source with a new text
+
+    Args:
+        source: 源码 / The source
+        old_text: 要替换的文本, 必须原样出现在源码中 / The text to replace, must appear verbatim in the source
+        new_text: 新文本 / The new text
+        replace_all: 是否替换所有出现的位置, 否则要求只出现一次 / Whether to replace every occurrence, otherwise it must occur exactly once
+
+    Returns:
+        替换后的源码 / The patched source
+
+    Raises:
+        ValueError: 文本为空、未找到或出现多次时 / When the text is empty, not found or occurs several times
+    """
+    if not old_text:
+        raise ValueError("The text to replace is empty")
+    count = source.count(old_text)
+    if count == 0:
+        raise ValueError("The text to replace was not found in the cell, it must match exactly (including whitespace and indentation)")
+    if count > 1 and not replace_all:
+        raise ValueError(f"The text to replace occurs {count} times in the cell, include more context to make it unique or set `replace_all`")
+    return source.replace(old_text, new_text)
+
+class CellOperation(BaseModel):
+    """
+    单个Cell编辑操作, 索引均基于编辑前的Notebook
+    A single cell edit operation, all indices refer to the notebook before editing
+    """
+    op: Annotated[
+        Literal["insert", "delete", "overwrite"],
+        "`insert`: insert a new cell before the original cell at `cell_index` (use the cell count to append); `delete`: delete the original cell; `overwrite`: replace the source of the original cell"
+    ]
+    cell_index: Annotated[int, "Cell index (0-based) in the ORIGINAL notebook, before any operation of the batch"]
+    cell_type: Annotated[Literal["code", "markdown"], "Cell type, only used by `insert`"] = "code"
+    cell_content: Annotated[str, "Cell content, used by `insert` and `overwrite`"] = ""
+
+def apply_cell_operations(notebook: 'NbModelClient', operations: list[CellOperation]) -> list[list]:
+    """
+    在单个事务中应用一组Cell编辑操作
+    Apply a batch of cell edit operations in a single Y document transaction
+
+    所有索引都基于原始布局解析, 因此操作的顺序只影响同一位置上多个插入的先后顺序
+    All indices are resolved against the original layout, so the order of operations only
+    matters for several inserts at the same position (they are inserted in the given order)
+
+    Args:
+        notebook: Notebook对象 / The notebook object
+        operations: 编辑操作列表 / The list of edit operations
+
+    Returns:
+        每个操作的结果行 [序号, 操作, 原始索引, 新索引] / Result row of each operation [No., Op, Original Index, New Index]
+
+    Raises:
+        ValueError: 操作无效时(索引越界、重复删除、修改已删除的Cell) / When an operation is invalid
+    """
+    from nbformat.v4 import new_code_cell, new_markdown_cell
+
+    total_cells = len(notebook)
+    inserts: dict[int, list[int]] = {}
+    deleted: dict[int, int] = {}
+    overwritten: dict[int, int] = {}
+
+    # 先校验全部操作, 保证批量编辑要么全部生效要么全部不生效
+    # Validate all operations first, so the batch is applied either entirely or not at all
+    for no, operation in enumerate(operations):
+        index = operation.cell_index
+        if operation.op == "insert":
+            if index < 0 or index > total_cells:
+                raise ValueError(f"Operation {no}: insert index {index} out of range, Notebook has {total_cells} cells")
+            inserts.setdefault(index, []).append(no)
+            continue
+        if index < 0 or index >= total_cells:
+            raise ValueError(f"Operation {no}: cell index {index} out of range, Notebook has {total_cells} cells")
+        if index in deleted:
+            raise ValueError(f"Operation {no}: cell {index} is already deleted by operation {deleted[index]}")
+        if operation.op == "delete":
+            if index in overwritten:
+                raise ValueError(f"Operation {no}: cell {index} is overwritten by operation {overwritten[index]}, cannot delete it")
+            deleted[index] = no
+        else:
+            if index in overwritten:
+                raise ValueError(f"Operation {no}: cell {index} is already overwritten by operation {overwritten[index]}")
+            overwritten[index] = no
+
+    # 从后往前应用, 使前面的原始索引保持不变
+    # Apply from the end to the beginning, so that earlier original indices stay valid
+    ycells = notebook._doc.ycells
+    with notebook._lock:
+        with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+            for index in range(total_cells, -1, -1):
+                if index in deleted:
+                    ycells.pop(index)
+                elif index in overwritten:
+                    update_text(ycells[index]["source"], operations[overwritten[index]].cell_content)
+                for offset, no in enumerate(inserts.get(index, [])):
+                    operation = operations[no]
+                    if operation.cell_type == "code":
+                        cell = new_code_cell(operation.cell_content)
+                    else:
+                        cell = new_markdown_cell(operation.cell_content)
+                    ycells.insert(index + offset, notebook._doc.create_ycell(cell))
+
+    # 计算每个操作在编辑后的索引
+    # Compute the index of each operation after editing
+    results = [None] * len(operations)
+    new_index = 0
+    for index in range(total_cells + 1):
+        for no in inserts.get(index, []):
+            results[no] = [no, "insert", index, new_index]
+            new_index += 1
+        if index == total_cells:
+            break
+        if index in deleted:
+            results[deleted[index]] = [deleted[index], "delete", index, "-"]
+            continue
+        if index in overwritten:
+            results[overwritten[index]] = [overwritten[index], "overwrite", index, new_index]
+        new_index += 1
+    return results
@@ -0,0 +1,266 @@
+import anyio, asyncio, queue, time
+from typing import Any, Awaitable, Callable, Optional, TYPE_CHECKING
+
+from .index import get_cell_index
+from .memo import ExecutionMemo
+from .metrics import METRICS
+from .scheduler import run_blocking
+
+if TYPE_CHECKING:
+    from jupyter_nbmodel_client import NbModelClient
+    from jupyter_kernel_client import KernelClient
+
+# 中断内核后等待执行结束的最长时间(秒)
+# Maximum seconds to wait for the execution to end after interrupting the kernel
+INTERRUPT_GRACE_PERIOD = 10
+
+# 轮询内核消息队列的最短与最长间隔(秒), 收到消息后回到最短间隔
+# Shortest and longest interval in seconds between two polls of the kernel message queues, back to the shortest after each message
+_POLL_MIN = 0.001
+_POLL_MAX = 0.05
+
+class _KernelChannels:
+    """
+    在事件循环中读取内核的消息队列, 不占用任何线程
+    Read the message queues of a kernel from the event loop, without holding any thread
+
+    The websocket of the kernel client is read by its own long-lived thread, which puts the messages in
+    thread-safe queues; they are polled here with a short backoff instead of blocking a worker thread.
+    """
+
+    def __init__(self, kernel: 'KernelClient'):
+        self.client = kernel._manager.client
+
+    async def next(self, channel: Any, msg_id: str, deadline: float) -> Optional[dict[str, Any]]:
+        """Next message of the channel answering the request, None once the deadline is reached"""
+        delay = _POLL_MIN
+        while True:
+            try:
+                msg = channel.get_msg(timeout=0)
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    return None
+                # 本地内核的ZMQ通道没有连接状态 / The ZMQ channels of a local kernel have no connection state
+                ready = getattr(self.client, "connection_ready", None)
+                if ready is not None and not ready.is_set():
+                    raise ConnectionError("Connection to the kernel was lost")
+                await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+                delay = min(delay * 2, _POLL_MAX)
+                continue
+            if msg["parent_header"].get("msg_id") == msg_id:
+                return msg
+            delay = _POLL_MIN
+
+async def execute_code(
+    kernel: 'KernelClient', code: str, timeout: float,
+    on_update: Optional[Callable[[list[dict[str, Any]], set[int]], Awaitable[None]]] = None,
+    store_history: bool = True) -> dict[str, Any]:
+    """
+    在内核中执行代码, 直接在事件循环中等待内核消息, 超时或被取消时中断内核
+    Execute code in the kernel, waiting for the kernel messages directly on the event loop,
+    the kernel is interrupted on timeout or cancellation
+
+    After an interrupt the remaining messages are drained (at most INTERRUPT_GRACE_PERIOD seconds),
+    so that the execution never overlaps with the following ones and no thread is left blocked.
+    The execute reply is awaited until the execution deadline, and at least INTERRUPT_GRACE_PERIOD seconds;
+    when it never arrives, the status is inferred from the outputs (an error output means "error").
+
+    Args:
+        kernel: 内核客户端 / The kernel client
+        code: 代码 / The code
+        timeout: 超时时间(秒) / Timeout in seconds
+        on_update: 每次输出变化时的回调(输出列表, 变化的输出索引)(可选) / Optional callback called with (outputs, changed output indices) on each output change
+        store_history: 是否记录到内核历史中 / Whether to store the code in the kernel history
+
+    Returns:
+        {"status": "ok" | "error" | "aborted" | "timeout", "execution_count": int | None, "outputs": list[dict]}
+    """
+    from jupyter_kernel_client.client import output_hook as collect_output
+
+    channels = _KernelChannels(kernel)
+    client = channels.client
+    # 丢弃之前执行遗留的消息; 不使用get_msgs, jupyter_client的通道的get_msgs会无限等待
+    # Drop the messages left by previous executions; not with get_msgs, which blocks forever on the channels of jupyter_client
+    while True:
+        try:
+            client.iopub_channel.get_msg(timeout=0)
+        except queue.Empty:
+            break
+    msg_id = client.execute(code, store_history=store_history, allow_stdin=False, stop_on_error=True)
+
+    outputs: list[dict[str, Any]] = []
+    # 执行计数也由execute_input消息给出, 回复迟迟未到时使用
+    # The execution count is also given by the execute_input message, used when the reply does not arrive
+    execution_count = None
+    timed_out = False
+    deadline = time.monotonic() + max(timeout, 0)
+    try:
+        while True:
+            msg = await channels.next(client.iopub_channel, msg_id, deadline)
+            if msg is None:
+                if timed_out:
+                    break
+                # 超时后中断内核, 并继续接收消息直到内核空闲
+                # Interrupt the kernel on timeout, and keep receiving messages until it is idle
+                timed_out = True
+                await run_blocking(kernel.interrupt)
+                deadline = time.monotonic() + INTERRUPT_GRACE_PERIOD
+                continue
+            msg_type = msg["header"]["msg_type"]
+            if msg_type == "status" and msg["content"]["execution_state"] == "idle":
+                break
+            if msg_type == "execute_input":
+                execution_count = msg["content"].get("execution_count")
+            if msg_type in ("stream", "display_data", "update_display_data", "execute_result", "error", "clear_output"):
+                indexes = collect_output(outputs, msg)
+                if on_update is not None and (indexes or msg_type == "clear_output"):
+                    await on_update(outputs, indexes)
+        # 内核繁忙或远程服务器较慢时回复可能晚于空闲状态到达
+        # The reply may arrive well after the idle status when the kernel is busy or the remote server is slow
+        reply = await channels.next(client.shell_channel, msg_id, max(deadline, time.monotonic() + INTERRUPT_GRACE_PERIOD))
+    except BaseException:
+        # 请求被取消时同样中断内核并等待其空闲, 否则内核会放弃之后的执行请求; 需要屏蔽取消以完成清理
+        # Interrupt the kernel as well when the request is cancelled and wait until it is idle, otherwise
+        # the kernel aborts the following execution requests; shield the cancellation to complete the cleanup
+        with anyio.CancelScope(shield=True):
+            try:
+                await run_blocking(kernel.interrupt)
+                deadline = time.monotonic() + INTERRUPT_GRACE_PERIOD
+                while (msg := await channels.next(client.iopub_channel, msg_id, deadline)) is not None:
+                    if msg["header"]["msg_type"] == "status" and msg["content"]["execution_state"] == "idle":
+                        break
+            except Exception:
+                pass
+        raise
+
+    if reply is not None:
+        status, execution_count = reply["content"].get("status", "error"), reply["content"].get("execution_count", execution_count)
+    else:
+        status = "error" if any(output.get("output_type") == "error" for output in outputs) else "ok"
+    return {
+        "status": "timeout" if timed_out else status,
+        "execution_count": execution_count,
+        "outputs": outputs,
+    }
+
+def _write_outputs(notebook: 'NbModelClient', ycell: Any, outputs: list[dict[str, Any]], indexes: set[int]) -> None:
+    """Write the changed outputs into the cell of the Y document"""
+    cell_outputs = ycell["outputs"]
+    with notebook._lock:
+        with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+            if len(indexes) == len(outputs) or len(outputs) < len(cell_outputs):
+                cell_outputs.clear()
+                cell_outputs.extend(outputs)
+                return
+            for index in sorted(indexes):
+                if index >= len(cell_outputs):
+                    cell_outputs.append(outputs[index])
+                else:
+                    cell_outputs[index] = outputs[index]
+
+async def run_cell(
+    notebook: 'NbModelClient', kernel: 'KernelClient', cell_index: int, timeout: float,
+    on_output: Optional[Callable[[dict[str, Any]], Awaitable[None]]] = None,
+    memo: Optional[ExecutionMemo] = None, reuse: bool = False) -> dict[str, Any]:
+    """
+    执行单个Cell并将输出写入Notebook, 超时后中断内核并等待执行结束, 避免与后续执行重叠
+    Execute a single cell and write its outputs into the notebook, on timeout interrupt the kernel
+    and wait for the execution to end, so that it never overlaps with the following executions
+
+    Args:
+        notebook: Notebook对象 / The notebook object
+        kernel: 内核客户端 / The kernel client
+        cell_index: Cell索引 / Cell index
+        timeout: 超时时间(秒) / Timeout in seconds
+        on_output: 每产生一个输出时的回调(可选) / Optional callback called with each output as soon as it is produced
+        memo: 内核会话的执行记录(可选), 执行会被记录 / Optional execution records of the kernel session, the execution is recorded
+        reuse: 代码与上游状态都未改变时是否跳过执行(需要memo) / Whether to skip the execution when the code and the upstream state are unchanged (requires memo)
+
+    Returns:
+        {"index": int, "status": "ok" | "error" | "aborted" | "timeout" | "cached" | "disconnected", "execution_count": int | None, "duration": float},
+        with an additional "error" message when the execution failed outside of the user code (lost connection, runtime failure)
+    """
+    start = time.perf_counter()
+    summary = get_cell_index(notebook).summaries(cell_index, cell_index + 1)[0]
+    ycell = notebook._doc.ycells[cell_index]
+    if memo is not None:
+        key = ExecutionMemo.key(ycell, cell_index)
+        if reuse and memo.is_up_to_date(key, summary.source_hash, summary.execution_count):
+            return {"index": cell_index, "status": "cached", "execution_count": summary.execution_count, "duration": time.perf_counter() - start}
+
+    with notebook._lock:
+        source = str(ycell["source"])
+        with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+            del ycell["outputs"][:]
+            ycell["execution_count"] = None
+            ycell["execution_state"] = "running"
+
+    async def on_update(outputs: list[dict[str, Any]], indexes: set[int]) -> None:
+        _write_outputs(notebook, ycell, outputs, indexes)
+        if on_output is not None:
+            for index in sorted(index for index in indexes if index < len(outputs)):
+                try:
+                    await on_output(outputs[index])
+                except Exception:
+                    pass
+
+    reply = {"status": "error", "execution_count": None}
+    error = None
+    try:
+        async with METRICS.span("execute"):
+            reply = await execute_code(kernel, source, timeout, on_update)
+    except ConnectionError as e:
+        # 与内核的连接断开, 与用户代码中的异常区分开 / The connection to the kernel was lost, distinct from an exception in the user code
+        reply = {"status": "disconnected", "execution_count": None}
+        error = e
+    except RuntimeError as e:
+        error = e
+    finally:
+        with notebook._lock:
+            with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+                ycell["execution_count"] = reply["execution_count"]
+                ycell["execution_state"] = "idle"
+
+    result = {"index": cell_index, "status": reply["status"], "execution_count": reply["execution_count"], "duration": time.perf_counter() - start}
+    if error is not None:
+        result["error"] = f"{type(error).__name__}: {error}"
+    if memo is not None:
+        memo.record(key, summary.source_hash, result["execution_count"], result["status"])
+    return result
+
+async def run_cells(
+    notebook: 'NbModelClient', kernel: 'KernelClient', cell_indices: list[int],
+    cell_timeout: float, total_timeout: float, stop_on_error: bool = True,
+    on_output: Optional[Callable[[dict[str, Any]], Awaitable[None]]] = None,
+    memo: Optional[ExecutionMemo] = None, reuse: bool = False) -> list[dict[str, Any]]:
+    """
+    依次连续执行多个Cell, 支持单Cell超时、总超时与遇错停止
+    Execute several cells back-to-back, with per-cell timeout, total timeout and stop-on-error
+
+    Args:
+        notebook: Notebook对象 / The notebook object
+        kernel: 内核客户端 / The kernel client
+        cell_indices: 待执行的Cell索引 / Indices of the cells to execute
+        cell_timeout: 单个Cell的超时时间(秒) / Timeout of each cell in seconds
+        total_timeout: 全部Cell的超时时间(秒) / Timeout of all cells in seconds
+        stop_on_error: 出错或超时后是否跳过剩余Cell, 与内核断开后总是跳过 / Whether to skip the remaining cells after an error or timeout, they are always skipped once the kernel is disconnected
+        on_output: 每产生一个输出时的回调(可选) / Optional callback called with each output as soon as it is produced
+        memo: 内核会话的执行记录(可选) / Optional execution records of the kernel session
+        reuse: 是否跳过代码与上游状态都未改变的Cell(需要memo) / Whether to skip the cells whose code and upstream state are unchanged (requires memo)
+
+    Returns:
+        每个Cell的执行结果, 未执行的Cell状态为"skipped" / Result of each cell, cells not executed have the status "skipped"
+    """
+    deadline = time.perf_counter() + total_timeout
+    results = []
+    stopped = False
+    for cell_index in cell_indices:
+        remaining = deadline - time.perf_counter()
+        if stopped or remaining <= 0:
+            results.append({"index": cell_index, "status": "skipped", "execution_count": None, "duration": 0.0})
+            continue
+        result = await run_cell(notebook, kernel, cell_index, min(cell_timeout, remaining), on_output, memo, reuse)
+        results.append(result)
+        if (result["status"] not in ("ok", "cached") and stop_on_error) or result["status"] == "disconnected":
+            stopped = True
+    return results
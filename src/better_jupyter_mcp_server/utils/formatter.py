@@ -1,5 +1,9 @@
-from jupyter_nbmodel_client import NbModelClient
+from typing import TYPE_CHECKING
 from .cell import Cell
+from .index import get_cell_index
+
+if TYPE_CHECKING:
+    from jupyter_nbmodel_client import NbModelClient
 
 def format_table(headers: list[str], rows: list[list[str]]) -> str:
     """
@@ -59,7 +63,7 @@ def format_notebook(cells: list[Cell], start_index: int = 0, total_cells: int =
         result.append(cell_header+cell.source+"\n\n")
     return "\n".join(result)
 
-def list_cell_basic(notebook: NbModelClient, with_count: bool = False, start_index: int = 0, limit: int = 0) -> str:
+def list_cell_basic(notebook: 'NbModelClient', with_count: bool = False, start_index: int = 0, limit: int = 0) -> str:
     """
     列出Notebook中所有Cell的基本信息，支持分页功能
     List the basic information of all cells in the notebook with pagination support
@@ -93,11 +97,10 @@ def list_cell_basic(notebook: NbModelClient, with_count: bool = False, start_ind
     if limit > 0:
         pagination_info = f"Showing cells {start_index}-{end_index-1} of {total_cell} total cells\n\n"
     
-    for i in range(start_index, end_index):
-        cell = Cell(notebook[i])
-        content_list = cell.source.split("\n")
-        cell_content = content_list[0] + f"...({len(content_list)-1} lines hidden)" if len(content_list) > 1 else cell.source
-        row = [i, cell.type, cell.execution_count, cell_content] if with_count else [i, cell.type, cell_content]
+    summaries = get_cell_index(notebook).summaries(start_index, end_index)
+    for i, summary in enumerate(summaries, start_index):
+        cell_content = summary.first_line + f"...({summary.line_count-1} lines hidden)" if summary.line_count > 1 else summary.first_line
+        row = [i, summary.type, summary.execution_count, cell_content] if with_count else [i, summary.type, cell_content]
         rows.append(row)
     
     table = format_table(headers, rows)
@@ -0,0 +1,446 @@
+import hashlib, re, threading, weakref
+from typing import Any, Callable, NamedTuple, Optional, TYPE_CHECKING
+
+from .cell import Cell
+
+if TYPE_CHECKING:
+    from jupyter_nbmodel_client import NbModelClient
+
+class CellSummary(NamedTuple):
+    """
+    Cell摘要, 列出Cell时只需要这些信息
+    Summary of a cell, all that is needed to list it
+    """
+    type: str
+    first_line: str
+    line_count: int
+    execution_count: Any
+    source_hash: str
+
+class SearchHit(NamedTuple):
+    """
+    搜索命中的一行
+    A line matched by a search
+    """
+    cell_index: int
+    where: str
+    line_number: int
+    line: str
+
+def tokenize(text: str) -> set[str]:
+    """
+    将文本切分为小写的词(字母、数字与下划线)
+    Split a text into lowercase words (letters, digits and underscores)
+    """
+    return set(re.findall(r"\w+", text.lower()))
+
+def _output_text(outputs: list[dict[str, Any]]) -> str:
+    """Join the text of the outputs of a cell, images and other rich outputs are skipped"""
+    texts = []
+    for output in outputs:
+        if output.get("output_type") == "stream":
+            texts.append(output.get("text", ""))
+        elif output.get("output_type") == "error":
+            texts.append("\n".join(output.get("traceback", [])))
+        elif "text/plain" in output.get("data", {}):
+            texts.append(output["data"]["text/plain"])
+    texts = ["".join(text) if isinstance(text, list) else text for text in texts]
+    return Cell({})._strip_ansi_codes("\n".join(texts))
+
+def build_search_query(query: str, mode: str) -> tuple[Optional[set[str]], Callable[[str], bool]]:
+    """
+    将搜索语句转换为候选词集合与行匹配函数
+    Turn a search query into the set of candidate words and a line matcher
+
+    Args:
+        query: 搜索语句 / The search query
+        mode: "term"(所有词, 不区分大小写), "phrase"(连续短语, 不区分大小写)或"regex"(正则表达式)
+            "term" (all words, case-insensitive), "phrase" (exact phrase, case-insensitive) or "regex" (regular expression)
+
+    Returns:
+        (候选词集合(None表示无法使用索引), 行匹配函数) / (Candidate words (None if the index cannot be used), line matcher)
+
+    Raises:
+        ValueError: 搜索语句为空或正则表达式无效时 / When the query is empty or the regular expression is invalid
+    """
+    if not query.strip():
+        raise ValueError("Search query is empty")
+    if mode == "regex":
+        try:
+            pattern = re.compile(query)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+        return None, lambda line: pattern.search(line) is not None
+    words = tokenize(query)
+    if mode == "phrase":
+        phrase = query.lower()
+        return words or None, lambda line: phrase in line.lower()
+    if not words:
+        raise ValueError("Search query contains no word, use `phrase` or `regex` mode to search symbols")
+    pattern = re.compile("|".join(rf"\b{re.escape(word)}\b" for word in sorted(words)), re.IGNORECASE)
+    return words, lambda line: pattern.search(line) is not None
+
+class _CellEntry:
+    """
+    索引中的一个Cell, 内容变化时被新的条目替换, 因此条目的内容不会改变
+    A cell of the index, replaced by a new entry when its content changes, so the content of an entry never changes
+    """
+    __slots__ = ("source", "summary", "tokens", "output_text", "output_tokens")
+
+    def __init__(self):
+        self.source: Optional[str] = None
+        self.summary: Optional[CellSummary] = None
+        self.tokens: Optional[set[str]] = None
+        self.output_text: Optional[str] = None
+        self.output_tokens: Optional[set[str]] = None
+
+def _unpost(postings: dict[str, set[_CellEntry]], entry: _CellEntry, words: Optional[set[str]]) -> None:
+    """Remove an entry from an inverted index, dropping the words no cell contains anymore"""
+    for word in words or ():
+        entries = postings.get(word)
+        if entries is not None:
+            entries.discard(entry)
+            if not entries:
+                del postings[word]
+
+class CellIndex:
+    """
+    Notebook的Cell摘要与全文索引, 由Y文档的变更事件增量维护
+    Cell summary and full-text index of a notebook, maintained incrementally from the Y document change events
+
+    Inserted, deleted and moved cells are spliced into the index, modified cells are replaced by a fresh entry
+    and indexed again on next read, so listing a page of cells costs O(page size) and searching only
+    re-indexes the cells changed since the last search, never converting the whole notebook to Python.
+    """
+
+    def __init__(self, notebook: 'NbModelClient'):
+        # 不持有Notebook对象本身, 以便索引随Notebook一起被回收
+        # The notebook itself is not referenced, so that the index is collected with it
+        self._ycells = notebook._doc.ycells
+        self._doc_lock = notebook._lock
+        self._lock = threading.Lock()
+        # 倒排索引: 词 -> 包含该词的条目
+        # Inverted indices: word -> entries containing the word
+        self._postings: dict[str, set[_CellEntry]] = {}
+        self._output_postings: dict[str, set[_CellEntry]] = {}
+        # 已被替换或删除、尚未从倒排索引中移除的条目
+        # Entries replaced or deleted but not yet removed from the inverted indices
+        self._stale: list[_CellEntry] = []
+        with self._doc_lock:
+            self._entries: list[_CellEntry] = [_CellEntry() for _ in range(len(self._ycells))]
+            self._subscription = self._ycells.observe_deep(self._on_change)
+        self.summarized = 0
+        self.indexed = 0
+
+    def _on_change(self, events: list[Any]) -> None:
+        """
+        处理Y文档变更事件(在执行事务的线程中调用)
+        Handle the Y document change events (called in the thread committing the transaction)
+        """
+        with self._lock:
+            # 先应用Cell列表的结构变化, 嵌套事件的路径基于事务结束后的索引
+            # Apply the structural changes of the cell list first, the paths of nested events refer to the indices after the transaction
+            for event in events:
+                if event.path:
+                    continue
+                position = 0
+                for change in event.delta:
+                    if "retain" in change:
+                        position += change["retain"]
+                    elif "insert" in change:
+                        count = len(change["insert"])
+                        self._entries[position:position] = [_CellEntry() for _ in range(count)]
+                        position += count
+                    elif "delete" in change:
+                        self._discard(self._entries[position:position + change["delete"]])
+                        del self._entries[position:position + change["delete"]]
+            for event in events:
+                if event.path and 0 <= event.path[0] < len(self._entries):
+                    self._discard([self._entries[event.path[0]]])
+                    self._entries[event.path[0]] = _CellEntry()
+
+    def _discard(self, entries: list[_CellEntry]) -> None:
+        """Schedule the removal of entries from the inverted indices, if they were indexed"""
+        self._stale.extend(entry for entry in entries if entry.tokens is not None or entry.output_tokens is not None)
+
+    def _check_length(self) -> None:
+        """Rebuild the entries if they are out of sync with the document (should never happen)"""
+        if len(self._entries) != len(self._ycells):
+            self._discard(self._entries)
+            self._entries = [_CellEntry() for _ in range(len(self._ycells))]
+
+    def _source(self, index: int, entry: _CellEntry) -> str:
+        """Read the source of a cell from the Y document once"""
+        if entry.source is None:
+            source = self._ycells[index].get("source", "")
+            entry.source = "".join(source) if isinstance(source, list) else str(source)
+        return entry.source
+
+    def summaries(self, start_index: int, end_index: int) -> list[CellSummary]:
+        """
+        获取指定范围内Cell的摘要
+        Get the summaries of the cells in the given range
+
+        Args:
+            start_index: 起始索引(包含) / Start index (inclusive)
+            end_index: 结束索引(不包含) / End index (exclusive)
+
+        Returns:
+            Cell摘要列表 / List of cell summaries
+        """
+        # 与写入方保持相同的加锁顺序: 先文档锁, 后索引锁
+        # Same locking order as the writers: document lock first, then index lock
+        with self._doc_lock, self._lock:
+            self._check_length()
+            summaries = []
+            for index in range(start_index, end_index):
+                entry = self._entries[index]
+                if entry.summary is None:
+                    ycell = self._ycells[index]
+                    source = self._source(index, entry)
+                    entry.summary = CellSummary(
+                        type=ycell.get("cell_type"),
+                        first_line=source.split("\n", 1)[0],
+                        line_count=source.count("\n") + 1,
+                        execution_count=ycell["execution_count"] if "execution_count" in ycell else "N/A",
+                        source_hash=hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
+                    )
+                    self.summarized += 1
+                summaries.append(entry.summary)
+            return summaries
+
+    def cell_id(self, index: int) -> Optional[str]:
+        """Id of a cell, None for the cells of notebooks older than nbformat 4.5"""
+        with self._doc_lock:
+            return self._ycells[index].get("id")
+
+    def cells(self, start_index: int, end_index: int) -> list[Cell]:
+        """
+        获取指定范围内只包含类型、源码与执行计数的Cell(不转换输出)
+        Get the cells in the given range with only their type, source and execution count (outputs are not converted)
+
+        Args:
+            start_index: 起始索引(包含) / Start index (inclusive)
+            end_index: 结束索引(不包含) / End index (exclusive)
+
+        Returns:
+            Cell列表 / List of cells
+        """
+        cells = []
+        with self._doc_lock, self._lock:
+            self._check_length()
+            for index in range(start_index, end_index):
+                ycell = self._ycells[index]
+                cell = {"cell_type": ycell.get("cell_type"), "source": self._source(index, self._entries[index])}
+                if "execution_count" in ycell:
+                    cell["execution_count"] = ycell["execution_count"]
+                cells.append(Cell(cell))
+        return cells
+
+    def _refresh(self, include_outputs: bool) -> None:
+        """Remove the stale entries from the inverted indices and index the new ones"""
+        for entry in self._stale:
+            _unpost(self._postings, entry, entry.tokens)
+            _unpost(self._output_postings, entry, entry.output_tokens)
+        self._stale.clear()
+        for index, entry in enumerate(self._entries):
+            if entry.tokens is None:
+                entry.tokens = tokenize(self._source(index, entry))
+                for word in entry.tokens:
+                    self._postings.setdefault(word, set()).add(entry)
+                self.indexed += 1
+            if include_outputs and entry.output_tokens is None:
+                outputs = self._ycells[index].get("outputs")
+                entry.output_text = _output_text(outputs.to_py() if outputs is not None else [])
+                entry.output_tokens = tokenize(entry.output_text)
+                for word in entry.output_tokens:
+                    self._output_postings.setdefault(word, set()).add(entry)
+
+    def search(
+        self, words: Optional[set[str]], line_matcher: Callable[[str], bool],
+        include_outputs: bool = False, limit: Optional[int] = None) -> tuple[list[SearchHit], int]:
+        """
+        搜索Cell源码(以及可选的文本输出)中匹配的行
+        Search the matching lines in the cell sources (and optionally text outputs)
+
+        Args:
+            words: 匹配的Cell必须包含的全部词, 为None时检查所有Cell / Words a matching cell must all contain, None to check every cell
+            line_matcher: 判断一行是否匹配的函数 / Function telling whether a line matches
+            include_outputs: 是否搜索文本输出 / Whether to search the text outputs
+            limit: 最多返回的命中行数(None表示不限制) / Maximum number of hits to return (None means no limit)
+
+        Returns:
+            (命中的行, 命中的总行数) / (The hits, the total number of matching lines)
+        """
+        with self._doc_lock, self._lock:
+            self._check_length()
+            self._refresh(include_outputs)
+            candidates = None
+            if words is not None:
+                candidates = set.intersection(*(self._postings.get(word, set()) for word in words)) if words else set()
+                if include_outputs:
+                    candidates |= set.intersection(*(self._output_postings.get(word, set()) for word in words)) if words else set()
+
+            hits = []
+            total = 0
+            for index, entry in enumerate(self._entries):
+                if candidates is not None and entry not in candidates:
+                    continue
+                texts = [("source", entry.source)]
+                if include_outputs:
+                    texts.append(("output", entry.output_text))
+                for where, text in texts:
+                    for line_number, line in enumerate(text.split("\n"), 1):
+                        if line_matcher(line):
+                            total += 1
+                            if limit is None or len(hits) < limit:
+                                hits.append(SearchHit(index, where, line_number, line))
+            return hits, total
+
+class StaticCellIndex:
+    """
+    不会改变的只读Notebook视图(本地文件、REST快照)的Cell摘要与搜索, 与CellIndex接口相同
+    Cell summaries and search of a read-only notebook view that never changes (local file, REST snapshot),
+    with the same interface as CellIndex
+
+    The view provides `len()`, `field(index, name, default)` and `has_field(index, name)`. As it never
+    changes, summaries and search tokens are computed once per cell, and only the candidate cells are
+    read again to find the matching lines.
+    """
+
+    def __init__(self, notebook: Any):
+        self._notebook = notebook
+        self._lock = threading.Lock()
+        self._summaries: dict[int, CellSummary] = {}
+        self._tokens: dict[tuple[int, str], set[str]] = {}
+        self.summarized = 0
+        self.indexed = 0
+
+    def _source(self, index: int) -> str:
+        source = self._notebook.field(index, "source", "")
+        return "".join(source) if isinstance(source, list) else source
+
+    def cell_id(self, index: int) -> Optional[str]:
+        """Id of a cell, None for the cells of notebooks older than nbformat 4.5"""
+        return self._notebook.field(index, "id")
+
+    def _text(self, index: int, where: str) -> str:
+        """Source or text outputs of a cell"""
+        if where == "source":
+            return self._source(index)
+        return _output_text(self._notebook.field(index, "outputs", []))
+
+    def summaries(self, start_index: int, end_index: int) -> list[CellSummary]:
+        """
+        获取指定范围内Cell的摘要
+        Get the summaries of the cells in the given range
+
+        Args:
+            start_index: 起始索引(包含) / Start index (inclusive)
+            end_index: 结束索引(不包含) / End index (exclusive)
+
+        Returns:
+            Cell摘要列表 / List of cell summaries
+        """
+        summaries = []
+        with self._lock:
+            for index in range(start_index, end_index):
+                summary = self._summaries.get(index)
+                if summary is None:
+                    source = self._source(index)
+                    summary = self._summaries[index] = CellSummary(
+                        type=self._notebook.field(index, "cell_type"),
+                        first_line=source.split("\n", 1)[0],
+                        line_count=source.count("\n") + 1,
+                        execution_count=self._notebook.field(index, "execution_count") if self._notebook.has_field(index, "execution_count") else "N/A",
+                        source_hash=hashlib.blake2b(source.encode("utf-8"), digest_size=8).hexdigest()
+                    )
+                    self.summarized += 1
+                summaries.append(summary)
+        return summaries
+
+    def cells(self, start_index: int, end_index: int) -> list[Cell]:
+        """
+        获取指定范围内只包含类型、源码与执行计数的Cell(不解析输出)
+        Get the cells in the given range with only their type, source and execution count (outputs are not parsed)
+
+        Args:
+            start_index: 起始索引(包含) / Start index (inclusive)
+            end_index: 结束索引(不包含) / End index (exclusive)
+
+        Returns:
+            Cell列表 / List of cells
+        """
+        cells = []
+        for index in range(start_index, end_index):
+            cell = {"cell_type": self._notebook.field(index, "cell_type"), "source": self._source(index)}
+            if self._notebook.has_field(index, "execution_count"):
+                cell["execution_count"] = self._notebook.field(index, "execution_count")
+            cells.append(Cell(cell))
+        return cells
+
+    def search(
+        self, words: Optional[set[str]], line_matcher: Callable[[str], bool],
+        include_outputs: bool = False, limit: Optional[int] = None) -> tuple[list[SearchHit], int]:
+        """
+        搜索Cell源码(以及可选的文本输出)中匹配的行
+        Search the matching lines in the cell sources (and optionally text outputs)
+
+        Args:
+            words: 匹配的Cell必须包含的全部词, 为None时检查所有Cell / Words a matching cell must all contain, None to check every cell
+            line_matcher: 判断一行是否匹配的函数 / Function telling whether a line matches
+            include_outputs: 是否搜索文本输出 / Whether to search the text outputs
+            limit: 最多返回的命中行数(None表示不限制) / Maximum number of hits to return (None means no limit)
+
+        Returns:
+            (命中的行, 命中的总行数) / (The hits, the total number of matching lines)
+        """
+        places = ("source", "output") if include_outputs else ("source",)
+        hits = []
+        total = 0
+        with self._lock:
+            for index in range(len(self._notebook)):
+                texts = {}
+                if words is not None:
+                    for where in places:
+                        tokens = self._tokens.get((index, where))
+                        if tokens is None:
+                            texts[where] = self._text(index, where)
+                            tokens = self._tokens[(index, where)] = tokenize(texts[where])
+                            self.indexed += 1
+                        if words <= tokens:
+                            break
+                    else:
+                        continue
+                for where in places:
+                    text = texts[where] if where in texts else self._text(index, where)
+                    for line_number, line in enumerate(text.split("\n"), 1):
+                        if line_matcher(line):
+                            total += 1
+                            if limit is None or len(hits) < limit:
+                                hits.append(SearchHit(index, where, line_number, line))
+        return hits, total
+
+_indexes: "weakref.WeakKeyDictionary[NbModelClient, CellIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+def get_cell_index(notebook: 'NbModelClient') -> CellIndex:
+    """
+    获取Notebook的Cell索引, 首次调用时创建
+    Get the cell index of a notebook, created on first call
+
+    Args:
+        notebook: Notebook对象 / The notebook object
+
+    Returns:
+        Cell索引 / The cell index
+    """
+    # 只读视图(本地文件、REST快照)自带索引(接口相同) / Read-only views (local files, REST snapshots) carry their own index (same interface)
+    local_index = getattr(notebook, "cell_index", None)
+    if local_index is not None:
+        return local_index
+    with _indexes_lock:
+        index = _indexes.get(notebook)
+        if index is None:
+            index = _indexes[notebook] = CellIndex(notebook)
+        return index
@@ -0,0 +1,165 @@
+import asyncio, logging
+from typing import Optional, TYPE_CHECKING
+
+from .metrics import METRICS
+from ..__env__ import KERNEL_POOL_SIZE, KERNEL_WARMUP_CODE, KERNEL_WARMUP_TIMEOUT
+
+if TYPE_CHECKING:
+    from jupyter_kernel_client import KernelClient
+
+logger = logging.getLogger(__name__)
+
+class KernelPool:
+    """
+    预启动内核池, 按(服务器URL, Token, 内核名称, 工作目录)分组
+    Pool of pre-started kernels, grouped by (server URL, token, kernel name, working directory)
+
+    The first request of a group starts a kernel on demand, every request then refills the group
+    in background, so that the following connections and restarts can adopt a ready kernel at once.
+    The working directory is part of the group because it is fixed when the kernel starts.
+    """
+
+    def __init__(self, size: int = KERNEL_POOL_SIZE, warmup_code: str = KERNEL_WARMUP_CODE):
+        self.size = max(size, 0)
+        self.warmup_code = warmup_code
+        self._ready: dict[tuple[str, str, str, str], list['KernelClient']] = {}
+        self._starting: dict[tuple[str, str, str, str], int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._closed = False
+
+    def _warm_up(self, kernel: 'KernelClient') -> None:
+        """Run the warm-up code in the kernel (called in a worker thread)"""
+        if not self.warmup_code:
+            return
+        try:
+            # 不计入执行历史, 用户的第一个Cell执行计数仍从1开始
+            # Kept out of the history, so the first cell of the user still gets execution count 1
+            reply = kernel.execute(self.warmup_code, silent=True, store_history=False, timeout=KERNEL_WARMUP_TIMEOUT)
+            if reply.get("status") != "ok":
+                logger.warning("Kernel warm-up code failed with status '%s'", reply.get("status"))
+        except Exception as e:
+            logger.warning("Failed to run kernel warm-up code: %s", e)
+
+    def _start_kernel(self, server_url: str, token: str, name: str, path: str) -> 'KernelClient':
+        """Start a kernel and run the warm-up code (called in a worker thread)"""
+        from jupyter_kernel_client import KernelClient
+        with METRICS.span("kernel_start"):
+            kernel = KernelClient(server_url=server_url, token=token)
+            kernel.start(name=name, path=path)
+            self._warm_up(kernel)
+        return kernel
+
+    def restart(self, kernel: 'KernelClient') -> None:
+        """
+        原地重启内核并重新执行预热代码, 用于池中没有就绪内核时(在工作线程中调用)
+        Restart the kernel in place and run the warm-up code again, used when no pooled kernel is ready
+        (called in a worker thread)
+        """
+        kernel.restart()
+        self._warm_up(kernel)
+
+    def _spawn(self, coroutine) -> None:
+        """Run a background task, keeping a reference until it is done"""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fill_one(self, key: tuple[str, str, str, str]) -> None:
+        """Start one kernel for the pool"""
+        try:
+            kernel = await asyncio.to_thread(self._start_kernel, *key)
+        except Exception as e:
+            logger.warning("Failed to pre-start a kernel on '%s': %s", key[0], e)
+            return
+        finally:
+            self._starting[key] -= 1
+        if self._closed:
+            await asyncio.to_thread(kernel.stop)
+            return
+        self._ready.setdefault(key, []).append(kernel)
+
+    def _refill(self, key: tuple[str, str, str, str]) -> None:
+        """Start kernels in background until the group is full"""
+        if self._closed:
+            return
+        missing = self.size - len(self._ready.get(key, [])) - self._starting.get(key, 0)
+        for _ in range(missing):
+            self._starting[key] = self._starting.get(key, 0) + 1
+            self._spawn(self._fill_one(key))
+
+    async def take(self, server_url: str, token: str, path: str = "", name: str = "python3") -> Optional['KernelClient']:
+        """
+        取出一个已就绪的内核, 没有可用内核时返回None
+        Take a ready kernel out of the pool, or None if none is available
+
+        Args:
+            server_url: Jupyter服务器URL / Jupyter server URL
+            token: 认证Token / Authentication token
+            path: 内核工作目录(相对服务器根目录) / Kernel working directory relative to the server root
+            name: 内核名称 / Kernel specification name
+
+        Returns:
+            已就绪的内核或None / The ready kernel or None
+        """
+        key = (server_url, token, name, path)
+        ready = self._ready.get(key, [])
+        while ready:
+            kernel = ready.pop(0)
+            try:
+                alive = await asyncio.to_thread(kernel.is_alive)
+            except Exception:
+                alive = False
+            if alive:
+                self._refill(key)
+                return kernel
+            self.release(kernel)
+        self._refill(key)
+        return None
+
+    async def acquire(self, server_url: str, token: str, path: str = "", name: str = "python3") -> 'KernelClient':
+        """
+        获取一个内核, 优先使用池中已就绪的内核, 否则立即启动一个新内核
+        Get a kernel, adopting a ready one from the pool if possible, otherwise starting a new one
+
+        Args:
+            server_url: Jupyter服务器URL / Jupyter server URL
+            token: 认证Token / Authentication token
+            path: 内核工作目录(相对服务器根目录) / Kernel working directory relative to the server root
+            name: 内核名称 / Kernel specification name
+
+        Returns:
+            已启动的内核 / The started kernel
+        """
+        if self.size > 0:
+            kernel = await self.take(server_url, token, path, name)
+            if kernel is not None:
+                return kernel
+        return await asyncio.to_thread(self._start_kernel, server_url, token, name, path)
+
+    def release(self, kernel: 'KernelClient') -> None:
+        """
+        在后台停止一个不再使用的内核
+        Stop a kernel that is no longer used in background
+        """
+        async def stop() -> None:
+            try:
+                await asyncio.to_thread(kernel.stop)
+            except Exception as e:
+                logger.warning("Failed to stop kernel: %s", e)
+        self._spawn(stop())
+
+    async def close(self) -> None:
+        """
+        停止所有池中的内核(用于服务关闭)
+        Stop all pooled kernels (used on server shutdown)
+        """
+        self._closed = True
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        kernels = [kernel for ready in self._ready.values() for kernel in ready]
+        self._ready.clear()
+        await asyncio.gather(*(asyncio.to_thread(kernel.stop) for kernel in kernels), return_exceptions=True)
+
+# 所有Notebook共享的内核池
+# Kernel pool shared by all notebooks
+KERNEL_POOL = KernelPool()
@@ -0,0 +1,358 @@
+import asyncio, json, mmap, os, re, shutil, tempfile, threading
+from types import SimpleNamespace
+from typing import Any, NamedTuple, Optional, TYPE_CHECKING
+
+from .autosave import AutoSaver, _digest
+from .index import StaticCellIndex
+from .metrics import METRICS
+from ..__env__ import KERNEL_WARMUP_CODE, KERNEL_WARMUP_TIMEOUT
+
+if TYPE_CHECKING:
+    from jupyter_nbmodel_client import NotebookModel
+
+# JSON的结构字符与字符串的开头; 字符串的剩余部分(含转义)由一次正则匹配跳过
+# Structural characters of JSON and the start of strings; the rest of a string (with escapes) is skipped by one regex match
+_TOKEN = re.compile(rb'["{}\[\],:]')
+_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_QUOTE, _COMMA, _COLON = ord('"'), ord(","), ord(":")
+_OPENING, _CLOSING = frozenset(b"{["), frozenset(b"}]")
+
+class _CellSpan(NamedTuple):
+    """
+    Cell在文件中的字节范围, 以及其各个字段的值的字节范围
+    Byte range of a cell in the file, and the byte ranges of the values of its fields
+    """
+    start: int
+    end: int
+    fields: dict[str, tuple[int, int]]
+
+def scan_cells(buffer: bytes | mmap.mmap) -> list[_CellSpan]:
+    """
+    流式扫描Notebook的JSON, 记录每个Cell及其字段的字节范围, 不构造任何Python对象
+    Scan the JSON of a notebook as a stream, recording the byte ranges of each cell and of its fields,
+    without building any Python object
+
+    Only the structure is followed: strings are skipped with one regex match each, so embedded outputs
+    (e.g. base64 images) cost a single C-level scan and nothing is kept in memory but the offsets.
+
+    Args:
+        buffer: Notebook文件的内容 / Content of the notebook file
+
+    Returns:
+        Cell的字节范围 / Byte ranges of the cells
+
+    Raises:
+        ValueError: 文件不是有效的Notebook JSON时 / When the file is not a valid notebook JSON
+    """
+    cells: list[_CellSpan] = []
+    depth = 0
+    # 顶层对象深度为1, cells数组深度为2, Cell对象深度为3
+    # The top level object is at depth 1, the cells array at depth 2, the cell objects at depth 3
+    in_cells = False
+    top_key: Optional[bytes] = None
+    last_string: Optional[bytes] = None
+    key: Optional[str] = None
+    cell_start = value_start = 0
+    fields: dict[str, tuple[int, int]] = {}
+    position = 0
+    while (match := _TOKEN.search(buffer, position)) is not None:
+        at = match.start()
+        char = buffer[at]
+        position = at + 1
+        if char == _QUOTE:
+            rest = _STRING_REST.match(buffer, position)
+            if rest is None:
+                raise ValueError(f"Unterminated string at byte {at}")
+            if depth == 1 or (in_cells and depth == 3):
+                last_string = bytes(buffer[position:rest.end() - 1])
+            position = rest.end()
+        elif char in _OPENING:
+            if depth == 1 and top_key == b"cells" and char == ord("["):
+                in_cells = True
+            elif in_cells and depth == 2:
+                cell_start, fields, key = at, {}, None
+            depth += 1
+        elif char in _CLOSING:
+            if in_cells and depth == 3:
+                if key is not None:
+                    fields[key] = (value_start, at)
+                cells.append(_CellSpan(cell_start, position, fields))
+            depth -= 1
+            if in_cells and depth == 1:
+                in_cells = False
+            if depth < 0:
+                raise ValueError(f"Unbalanced bracket at byte {at}")
+        elif char == _COLON:
+            if depth == 1:
+                top_key = last_string
+            elif in_cells and depth == 3:
+                key, value_start = last_string.decode("utf-8"), position
+        elif char == _COMMA and in_cells and depth == 3 and key is not None:
+            fields[key] = (value_start, at)
+            key = None
+    if depth != 0 or top_key is None:
+        raise ValueError("Not a notebook JSON document")
+    return cells
+
+class LocalNotebook:
+    """
+    本地Notebook文件的只读视图, 按需解析单个Cell
+    Read-only view of a local notebook file, parsing single cells on demand
+
+    Opening the view only scans the file for the cell offsets; `notebook[i]` then reads and parses
+    the bytes of one cell, so listing and reading cells of a huge notebook never loads it whole.
+    It offers the same reading interface as the Y document (`len`, indexing and `get_cell_index`).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self.signature = self._signature(os.fstat(file.fileno()))
+            if self.signature[1] == 0:
+                raise ValueError(f"'{path}' is empty")
+            with METRICS.span("local_index"), mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self._cells = scan_cells(buffer)
+        # 不保留内存映射, 其他程序原地截断文件时访问映射会导致进程崩溃
+        # The memory map is not kept, accessing it after another program truncated the file in place would crash the process
+        self._file = open(path, "rb")
+        self._file_lock = threading.Lock()
+        self.cell_index = StaticCellIndex(self)
+
+    @staticmethod
+    def _signature(stat: os.stat_result) -> tuple[int, int]:
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the file changed since it was scanned"""
+        try:
+            return self._signature(os.stat(self.path)) != self.signature
+        except OSError:
+            return True
+
+    def _read(self, start: int, end: int) -> Any:
+        """Parse the JSON value between two byte offsets"""
+        with self._file_lock:
+            self._file.seek(start)
+            data = self._file.read(end - start)
+        return json.loads(data)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        span = self._cells[index]
+        return self._read(span.start, span.end)
+
+    def field(self, index: int, name: str, default: Any = None) -> Any:
+        """
+        只解析Cell的一个字段
+        Parse only one field of a cell
+
+        Args:
+            index: Cell索引 / Cell index
+            name: 字段名 / Field name
+            default: 字段不存在时的值 / Value when the field does not exist
+
+        Returns:
+            字段的值 / Value of the field
+        """
+        span = self._cells[index].fields.get(name)
+        return default if span is None else self._read(*span)
+
+    def has_field(self, index: int, name: str) -> bool:
+        """Whether a cell has a field"""
+        return name in self._cells[index].fields
+
+    def close(self) -> None:
+        """Close the file"""
+        self._file.close()
+
+def write_notebook_file(path: str, content: dict[str, Any]) -> None:
+    """
+    原子地写入Notebook文件: 先写入同目录下的临时文件并落盘, 再替换原文件
+    Write a notebook file atomically: write a temporary file in the same directory and flush it to disk,
+    then replace the original file
+
+    A crash or a concurrent reader never sees a partially written notebook, and the permissions of an
+    existing file are kept. The JSON layout is the one of nbformat (sorted keys, indent of 1).
+
+    Args:
+        path: Notebook文件路径 / Path of the notebook file
+        content: Notebook内容 / Notebook content
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(prefix=".~", suffix=".ipynb", dir=directory)
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as file:
+            json.dump(content, file, sort_keys=True, indent=1, ensure_ascii=False)
+            file.write("\n")
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, temporary_path)
+        else:
+            os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    except BaseException:
+        try:
+            os.unlink(temporary_path)
+        except OSError:
+            pass
+        raise
+
+def _read_file(path: str) -> dict[str, Any]:
+    """Parse a notebook file (called in a worker thread)"""
+    with open(path, "rb") as file:
+        return json.load(file)
+
+def _create_model(content: dict[str, Any]) -> 'NotebookModel':
+    """
+    Create a standalone Y document model holding the notebook content
+
+    The Y objects can only be used and dropped by the thread creating them, so this runs on the event loop.
+    """
+    from jupyter_nbmodel_client import NotebookModel
+    model = NotebookModel()
+    model._doc.set(content)
+    # 本地模型不经过websocket同步, 加载完成即为完整内容
+    # A local model is not synced through a websocket, it holds the whole content once loaded
+    model.synced = True
+    return model
+
+class LocalNotebookSession:
+    """
+    Session of a local notebook file, used without any Jupyter server
+
+    Read-only connections get a LocalNotebook view indexing the file, re-scanned when the file changes.
+    The first connection modifying the notebook or using its kernel loads the file into a standalone
+    Y document model, which then serves all connections and is written back by the LocalAutoSaver.
+    """
+
+    def __init__(self, path: str):
+        self.notebook_info = {"server_url": "local", "token": "", "path": path}
+        self._view: Optional[LocalNotebook] = None
+        self._model: Optional['NotebookModel'] = None
+        # 加载时文件内容的摘要, 未修改的模型不会被写回
+        # Digest of the file content when loaded, an unmodified model is not written back
+        self.loaded_digest: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def notebook(self) -> Optional['NotebookModel']:
+        """Loaded Y document model, None while the notebook has only been read"""
+        return self._model
+
+    @property
+    def is_healthy(self) -> bool:
+        """Whether the notebook can be used without (re)loading it"""
+        return self._model is not None or (self._view is not None and not self._view.is_stale)
+
+    async def acquire(self, writable: bool = False) -> 'LocalNotebook | NotebookModel':
+        """
+        Get the loaded model, or a read-only view of the file if the notebook has not been modified
+
+        Args:
+            writable: Whether the connection modifies the notebook or uses its kernel
+
+        Returns:
+            Y document model or read-only view
+        """
+        async with self._lock:
+            if self._model is not None:
+                return self._model
+            if writable:
+                self._close_view()
+                async with METRICS.span("sync"):
+                    self._model = _create_model(await asyncio.to_thread(_read_file, self.notebook_info["path"]))
+                    self.loaded_digest = await asyncio.to_thread(_digest, self._model.as_dict())
+                return self._model
+            if self._view is None or self._view.is_stale:
+                self._close_view()
+                async with METRICS.span("sync"):
+                    self._view = await asyncio.to_thread(LocalNotebook, self.notebook_info["path"])
+            return self._view
+
+    def _close_view(self) -> None:
+        """Close the current view if any"""
+        if self._view is not None:
+            view, self._view = self._view, None
+            view.close()
+
+    async def close(self) -> None:
+        """Close the session"""
+        async with self._lock:
+            self._close_view()
+            self._model = None
+
+class LocalAutoSaver(AutoSaver):
+    """
+    AutoSaver writing the notebook back to its local file atomically
+    """
+
+    # 本地Notebook没有其他保存途径, 无论AUTO_SAVE_NOTEBOOK如何设置, 修改都会被保存
+    # A local notebook has no other way to be saved, modifications are saved whatever AUTO_SAVE_NOTEBOOK is
+    required = True
+
+    async def _save(self) -> None:
+        if self._last_digest is None:
+            self._last_digest = self.session.loaded_digest
+        await super()._save()
+
+    def _write(self, content: dict[str, Any]) -> None:
+        write_notebook_file(self.session.notebook_info["path"], content)
+
+class LocalKernel:
+    """
+    本地启动的内核, 提供服务端使用的KernelClient接口
+    Locally spawned kernel, providing the KernelClient interface used by the server
+
+    The kernel is managed by jupyter_client, with the notebook directory as working directory.
+    All methods except `is_alive` block and are called in worker threads.
+    """
+
+    def __init__(self, kernel_name: str = "python3", cwd: Optional[str] = None):
+        from jupyter_client import KernelManager
+        self._kernel_manager = KernelManager(kernel_name=kernel_name)
+        self._cwd = cwd
+        # execute_code直接读取客户端的消息通道 / execute_code reads the message channels of the client directly
+        self._manager = SimpleNamespace(client=None)
+
+    def start(self, timeout: float = 60) -> None:
+        """Start the kernel and run the warm-up code"""
+        with METRICS.span("kernel_start"):
+            self._kernel_manager.start_kernel(cwd=self._cwd)
+            client = self._kernel_manager.blocking_client()
+            client.start_channels()
+            try:
+                client.wait_for_ready(timeout=timeout)
+            except BaseException:
+                client.stop_channels()
+                self._kernel_manager.shutdown_kernel(now=True)
+                raise
+            self._manager.client = client
+            if KERNEL_WARMUP_CODE:
+                self.execute(KERNEL_WARMUP_CODE, silent=True, store_history=False, timeout=KERNEL_WARMUP_TIMEOUT)
+
+    def execute(self, code: str, silent: bool = False, store_history: bool = True, timeout: Optional[float] = None) -> dict[str, Any]:
+        """Execute code and wait for the reply, outputs are discarded"""
+        reply = self._manager.client.execute_interactive(
+            code, silent=silent, store_history=store_history, allow_stdin=False, timeout=timeout,
+            output_hook=lambda msg: None
+        )
+        return reply["content"]
+
+    def interrupt(self) -> None:
+        self._kernel_manager.interrupt_kernel()
+
+    def restart(self) -> None:
+        self._kernel_manager.restart_kernel(now=True)
+        self._manager.client.wait_for_ready(timeout=60)
+
+    def is_alive(self) -> bool:
+        return self._kernel_manager.is_alive()
+
+    def stop(self) -> None:
+        if self._manager.client is not None:
+            self._manager.client.stop_channels()
+        self._kernel_manager.shutdown_kernel(now=True)
@@ -0,0 +1,92 @@
+import hashlib
+from typing import Any, NamedTuple
+
+# 临时代码在执行记录中的键
+# Key of the temporary code in the execution records
+TEMPORARY_KEY = "<temporary>"
+
+class _Execution(NamedTuple):
+    """An execution recorded in the kernel session"""
+    fingerprint: str
+    source_hash: str
+    upstream: tuple[tuple[str, str], ...]
+    execution_count: Any
+    status: str
+
+class ExecutionMemo:
+    """
+    内核会话的执行记录, 用于跳过代码与上游状态都未改变的Cell
+    Execution records of a kernel session, used to skip the cells whose code and upstream state are unchanged
+
+    The fingerprint of an execution hashes the source of the cell together with the fingerprints of the
+    cells executed before it in the kernel session. A cell is up to date while its source, its execution
+    count and the fingerprints of all these upstream cells are unchanged: re-running an upstream cell
+    with a different source (or a temporary code) invalidates every cell executed after it.
+    """
+
+    def __init__(self):
+        # 按最后一次执行的顺序排列 / Ordered by last execution
+        self._executions: dict[str, _Execution] = {}
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._executions)
+
+    @staticmethod
+    def key(cell: Any, cell_index: int) -> str:
+        """Key of a cell, its id when the notebook has cell ids (nbformat >= 4.5), its index otherwise"""
+        cell_id = cell.get("id") if hasattr(cell, "get") else None
+        return str(cell_id) if cell_id else f"#{cell_index}"
+
+    def is_up_to_date(self, key: str, source_hash: str, execution_count: Any) -> bool:
+        """
+        检查Cell自上次成功执行后代码与上游状态是否都未改变
+        Check whether the code and the upstream state of a cell are unchanged since its last successful execution
+
+        Args:
+            key: Cell的键 / Key of the cell
+            source_hash: 当前源码的哈希 / Hash of the current source
+            execution_count: Notebook中当前的执行计数 / Current execution count in the notebook
+
+        Returns:
+            是否可以直接复用Notebook中的输出 / Whether the outputs in the notebook can be reused
+        """
+        execution = self._executions.get(key)
+        if execution is None or execution.status != "ok" or execution.source_hash != source_hash:
+            return False
+        # 输出被清除或被其他客户端重新执行后执行计数会改变
+        # The execution count changes when the outputs are cleared or re-executed by another client
+        if execution.execution_count is None or execution.execution_count != execution_count:
+            return False
+        for upstream_key, fingerprint in execution.upstream:
+            upstream = self._executions.get(upstream_key)
+            if upstream is None or upstream.fingerprint != fingerprint:
+                return False
+        self.hits += 1
+        return True
+
+    def record(self, key: str, source_hash: str, execution_count: Any, status: str) -> None:
+        """
+        记录一次执行
+        Record an execution
+
+        Args:
+            key: Cell的键 / Key of the cell
+            source_hash: 执行的源码的哈希 / Hash of the executed source
+            execution_count: 执行计数 / Execution count
+            status: 执行状态 / Execution status
+        """
+        self._executions.pop(key, None)
+        upstream = tuple((upstream_key, execution.fingerprint) for upstream_key, execution in self._executions.items())
+        digest = hashlib.blake2b(source_hash.encode("utf-8"), digest_size=16)
+        for upstream_key, fingerprint in upstream:
+            digest.update(f"\0{upstream_key}:{fingerprint}".encode("utf-8"))
+        self._executions[key] = _Execution(digest.hexdigest(), source_hash, upstream, execution_count, status)
+
+    def record_temporary(self, code: str) -> None:
+        """Record a temporary code, it changes the kernel state seen by the cells executed after it"""
+        self.record(TEMPORARY_KEY, hashlib.blake2b(code.encode("utf-8"), digest_size=8).hexdigest(), None, "temporary")
+
+    def clear(self) -> None:
+        """Forget all executions (the kernel was restarted or replaced)"""
+        self._executions.clear()
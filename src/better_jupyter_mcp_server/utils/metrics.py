@@ -0,0 +1,279 @@
+import bisect, contextvars, json, threading, time
+from collections import deque
+from typing import Any, Optional
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from fastmcp.tools.tool import ToolResult
+from mcp.types import CallToolRequestParams, ImageContent, TextContent
+
+from ..__env__ import METRICS_ENABLED, METRICS_TRACE_SIZE
+
+# 直方图的桶上界(毫秒)
+# Upper bounds of the histogram buckets in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, float("inf"))
+
+class Histogram:
+    """
+    固定桶的耗时直方图
+    Duration histogram with fixed buckets
+    """
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing the quantile (the maximum for the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return round(min(bound, self.max_ms), 3)
+        return round(self.max_ms, 3)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+class _NullSpan:
+    """Span doing nothing, used when metrics are disabled"""
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    async def __aenter__(self) -> "_NullSpan":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    """
+    记录一个阶段耗时的上下文管理器(同步与异步均可使用)
+    Context manager recording the duration of a phase (usable both sync and async)
+    """
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+        self._start = 0.0
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.metrics.observe(self.name, (time.perf_counter() - self._start) * 1000)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.__exit__(exc_type, exc_val, exc_tb)
+
+# 当前工具调用的追踪记录, 各阶段的耗时会附加到其中
+# Trace of the current tool call, the phase durations are appended to it
+_current_trace: contextvars.ContextVar[Optional[dict[str, Any]]] = contextvars.ContextVar("current_trace", default=None)
+
+class Metrics:
+    """
+    工具与各阶段(connect、sync、execute、render、save等)的耗时直方图、计数器与最近的调用追踪
+    Duration histograms, counters and recent call traces of the tools and their phases
+    (connect, sync, execute, render, save...)
+
+    When disabled, spans are a shared no-op object and nothing is recorded.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, trace_size: int = METRICS_TRACE_SIZE):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._tools: dict[str, Histogram] = {}
+        self._phases: dict[str, Histogram] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+        # 按(类别, 格式)统计的图片数量与编码前后字节数 / Image count and bytes before and after encoding by (kind, format)
+        self._images: dict[tuple[str, str], dict[str, int]] = {}
+        self._traces: deque[dict[str, Any]] = deque(maxlen=max(trace_size, 1))
+        self._started = time.time()
+
+    def span(self, name: str) -> Span | _NullSpan:
+        """
+        记录一个阶段的耗时
+        Record the duration of a phase
+
+        Args:
+            name: 阶段名称 / Phase name
+
+        Returns:
+            上下文管理器 / Context manager
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name)
+
+    def observe(self, name: str, duration_ms: float) -> None:
+        """Record a phase duration, and attach it to the trace of the current tool call if any"""
+        with self._lock:
+            self._phases.setdefault(name, Histogram()).observe(duration_ms)
+        trace = _current_trace.get()
+        if trace is not None and not trace["done"]:
+            trace["phases"].append([name, round(duration_ms, 3)])
+
+    def start_tool(self, tool: str) -> Optional[contextvars.Token]:
+        """Start the trace of a tool call"""
+        if not self.enabled:
+            return None
+        return _current_trace.set({"tool": tool, "start": time.time(), "phases": [], "done": False})
+
+    def finish_tool(self, token: Optional[contextvars.Token], duration_ms: float, payload_bytes: int, images: int, error: bool) -> None:
+        """Finish the trace of a tool call, recording its duration and payload"""
+        if token is None:
+            return
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        trace.update({"done": True, "duration_ms": round(duration_ms, 3), "payload_bytes": payload_bytes, "images": images, "error": error})
+        tool = trace["tool"]
+        with self._lock:
+            self._tools.setdefault(tool, Histogram()).observe(duration_ms)
+            counters = self._counters.setdefault(tool, {"calls": 0, "errors": 0, "payload_bytes": 0, "images": 0})
+            counters["calls"] += 1
+            counters["errors"] += int(error)
+            counters["payload_bytes"] += payload_bytes
+            counters["images"] += images
+            self._traces.append(trace)
+
+    def record_image(self, kind: str, encoding: str, original_bytes: int, encoded_bytes: int) -> None:
+        """
+        记录一张图片编码前后的大小
+        Record the size of an image before and after encoding
+
+        Args:
+            kind: 类别("encoded"为预处理, "thumbnail"为超出响应预算后的缩略图, "omitted"为被省略) /
+                Kind ("encoded" for preprocessing, "thumbnail" for a thumbnail beyond the response budget, "omitted" when left out)
+            encoding: 编码后的格式 / Format after encoding
+            original_bytes: 编码前的字节数 / Bytes before encoding
+            encoded_bytes: 编码后的字节数 / Bytes after encoding
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._images.setdefault((kind, encoding), {"count": 0, "original_bytes": 0, "encoded_bytes": 0})
+            stats["count"] += 1
+            stats["original_bytes"] += original_bytes
+            stats["encoded_bytes"] += encoded_bytes
+
+    def reset(self) -> None:
+        """Clear all recorded data"""
+        with self._lock:
+            self._tools.clear()
+            self._phases.clear()
+            self._counters.clear()
+            self._images.clear()
+            self._traces.clear()
+            self._started = time.time()
+
+    def snapshot(self, traces: int = 0) -> dict[str, Any]:
+        """
+        获取当前的统计数据
+        Get the current statistics
+
+        Args:
+            traces: 返回最近多少条调用追踪 / Number of recent call traces to return
+
+        Returns:
+            统计数据 / The statistics
+        """
+        with self._lock:
+            recent = list(self._traces)[-traces:] if traces > 0 else []
+            return {
+                "enabled": self.enabled,
+                "uptime_s": round(time.time() - self._started, 1),
+                "tools": {name: {**histogram.to_dict(), **self._counters.get(name, {})} for name, histogram in sorted(self._tools.items())},
+                "phases": {name: histogram.to_dict() for name, histogram in sorted(self._phases.items())},
+                "images": [{"kind": kind, "format": encoding, **stats} for (kind, encoding), stats in sorted(self._images.items())],
+                "traces": [{key: value for key, value in trace.items() if key != "done"} for trace in recent],
+            }
+
+    def to_json(self) -> str:
+        """Dump the statistics as JSON"""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        以Prometheus文本格式导出统计数据
+        Dump the statistics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for metric, histograms in (("jupyter_mcp_tool_duration_ms", self._tools), ("jupyter_mcp_phase_duration_ms", self._phases)):
+                label = "tool" if metric == "jupyter_mcp_tool_duration_ms" else "phase"
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS_MS, histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.total_ms:.3f}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+            for counter in ("calls", "errors", "payload_bytes", "images"):
+                metric = f"jupyter_mcp_tool_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for name, counters in sorted(self._counters.items()):
+                    lines.append(f'{metric}{{tool="{name}"}} {counters[counter]}')
+            for counter in ("count", "original_bytes", "encoded_bytes"):
+                metric = f"jupyter_mcp_image_{counter}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (kind, encoding), stats in sorted(self._images.items()):
+                    lines.append(f'{metric}{{kind="{kind}",format="{encoding}"}} {stats[counter]}')
+        return "\n".join(lines) + "\n"
+
+# 全局指标记录器
+# Global metrics recorder
+METRICS = Metrics()
+
+class MetricsMiddleware(Middleware):
+    """
+    记录每次工具调用的耗时、返回的字节数与图片数量
+    Record the duration, returned bytes and images of every tool call
+    """
+
+    async def on_call_tool(self, context: MiddlewareContext[CallToolRequestParams], call_next) -> ToolResult:
+        if not METRICS.enabled:
+            return await call_next(context)
+        token = METRICS.start_tool(context.message.name)
+        start = time.perf_counter()
+        payload_bytes = images = 0
+        error = True
+        try:
+            result = await call_next(context)
+            error = False
+            for block in result.content:
+                if isinstance(block, TextContent):
+                    payload_bytes += len(block.text.encode("utf-8"))
+                elif isinstance(block, ImageContent):
+                    payload_bytes += len(block.data)
+                    images += 1
+            return result
+        finally:
+            METRICS.finish_tool(token, (time.perf_counter() - start) * 1000, payload_bytes, images, error)
@@ -1,19 +1,33 @@
-from typing import Dict, Any, Optional
+import asyncio
+from pathlib import Path
+from typing import Dict, Any, Optional, TYPE_CHECKING
 from types import TracebackType
 
-from jupyter_nbmodel_client import NbModelClient, get_jupyter_notebook_websocket_url
-from jupyter_kernel_client import KernelClient
-from jupyter_server_api import JupyterServerClient
+from .autosave import AutoSaver
+from .kernel import KERNEL_POOL
+from .local import LocalAutoSaver, LocalKernel, LocalNotebookSession
+from .memo import ExecutionMemo
+from .metrics import METRICS
+from .output import OUTPUT_STORE
+from .scheduler import NotebookScheduler, SchedulerSlot, run_blocking
+from .snapshot import NotebookSnapshot, snapshot_validator
+from ..__env__ import AUTO_SAVE_NOTEBOOK, READ_SNAPSHOT
 
-from ..__env__ import AUTO_SAVE_NOTEBOOK
+if TYPE_CHECKING:
+    from jupyter_nbmodel_client import NbModelClient
+    from jupyter_kernel_client import KernelClient
+    from jupyter_server_api import JupyterServerClient
 
 class NotebookManager:
     """
     Class for managing multiple Notebooks and their corresponding Kernels
     """
     
-    def __init__(self):
+    def __init__(self, namespace: str = ""):
         self._notebooks: Dict[str, Dict[str, Any]] = {}
+        # 会话的命名空间, 用于区分共享缓存中不同会话的同名Notebook
+        # Namespace of the session, separating notebooks with the same name of different sessions in shared caches
+        self.namespace = namespace
     
     def __contains__(self, name: str) -> bool:
         """
@@ -38,7 +52,7 @@ class NotebookManager:
     
     def add_notebook(self, 
         name: str, 
-        kernel: KernelClient, server_client: JupyterServerClient,
+        kernel: 'KernelClient', server_client: 'JupyterServerClient',
         server_url: str, token: str, path: str) -> None:
         """
         Add a new notebook
@@ -50,19 +64,44 @@ class NotebookManager:
             token: Authentication token
             path: Notebook file path
         """
+        notebook_info = {
+            "server_url": server_url,
+            "token": token,
+            "path": path
+        }
+        session = NotebookSession(notebook_info, server_client)
         self._notebooks[name] = {
             "kernel": kernel,
             "server_client": server_client,
-            "notebook": {
-                "server_url": server_url,
-                "token": token,
-                "path": path
-            }
+            "notebook": notebook_info,
+            "session": session,
+            "saver": AutoSaver(session, server_client),
+            "scheduler": NotebookScheduler(),
+            "memo": ExecutionMemo()
         }
     
-    def remove_notebook(self, name: str) -> bool:
+    def add_local_notebook(self, name: str, kernel: LocalKernel, session: LocalNotebookSession) -> None:
         """
-        Remove a notebook
+        Add a notebook opened directly from a local file, without Jupyter server
+        
+        Args:
+            name: Unique identifier for the notebook
+            kernel: Locally spawned kernel
+            session: Session of the local notebook file
+        """
+        self._notebooks[name] = {
+            "kernel": kernel,
+            "server_client": None,
+            "notebook": session.notebook_info,
+            "session": session,
+            "saver": LocalAutoSaver(session, None),
+            "scheduler": NotebookScheduler(),
+            "memo": ExecutionMemo()
+        }
+    
+    async def remove_notebook(self, name: str) -> bool:
+        """
+        Remove a notebook, closing its notebook session and kernel
         
         Args:
             Notebook name
@@ -72,16 +111,33 @@ class NotebookManager:
         """
         if name in self._notebooks:
             try:
-                self._notebooks[name]["kernel"].stop()
-                self._notebooks[name]["server_client"].close()
+                await self._notebooks[name]["saver"].flush()
+            except Exception:
+                pass
+            try:
+                await self._notebooks[name]["session"].close()
+            except Exception:
+                pass
+            try:
+                await run_blocking(self._notebooks[name]["kernel"].stop)
+                if self._notebooks[name]["server_client"] is not None:
+                    await asyncio.to_thread(self._notebooks[name]["server_client"].close)
             except Exception:
                 pass
             finally:
                 del self._notebooks[name]
+                OUTPUT_STORE.discard(self.output_key(name))
             return True
         return False
     
-    def get_kernel(self, name: str) -> Optional[KernelClient]:
+    async def close_all(self) -> None:
+        """
+        Remove all notebooks, flushing pending saves first (used on server shutdown)
+        """
+        for name in list(self._notebooks):
+            await self.remove_notebook(name)
+    
+    def get_kernel(self, name: str) -> Optional['KernelClient']:
         """
         Get the kernel of specified notebook
         
@@ -109,10 +165,14 @@ class NotebookManager:
             return self._notebooks[name]["notebook"]["path"]
         return None
     
-    def restart_notebook(self, name: str) -> bool:
+    async def restart_notebook(self, name: str) -> bool:
         """
         Restart the kernel of specified notebook
         
+        If the kernel pool has a ready kernel, it replaces the current kernel at once
+        and the old one is stopped in background, otherwise the kernel is restarted in place
+        (always the case for the locally spawned kernel of a local notebook)
+        
         Args:
             Notebook name
             
@@ -120,10 +180,38 @@ class NotebookManager:
             Whether successfully restarted
         """
         if name in self._notebooks:
-            self._notebooks[name]["kernel"].restart()
+            notebook_info = self._notebooks[name]["notebook"]
+            parent_path = Path(notebook_info["path"]).parent.as_posix()
+            async with self._notebooks[name]["scheduler"].slot("restart_notebook"):
+                kernel = None
+                if not isinstance(self._notebooks[name]["kernel"], LocalKernel):
+                    kernel = await KERNEL_POOL.take(
+                        notebook_info["server_url"], notebook_info["token"],
+                        parent_path if parent_path != "." else ""
+                    )
+                if kernel is None:
+                    await run_blocking(KERNEL_POOL.restart, self._notebooks[name]["kernel"])
+                else:
+                    old_kernel, self._notebooks[name]["kernel"] = self._notebooks[name]["kernel"], kernel
+                    KERNEL_POOL.release(old_kernel)
+                # 新的内核中没有任何状态, 之前的执行记录全部失效
+                # The new kernel has no state, all previous executions are invalidated
+                self._notebooks[name]["memo"].clear()
             return True
         return False
     
+    def output_key(self, name: str) -> str:
+        """
+        Get the key of a notebook in the shared output store
+        
+        Args:
+            Notebook name
+            
+        Returns:
+            The key, unique across sessions
+        """
+        return f"{self.namespace}/{name}" if self.namespace else name
+    
     def is_empty(self) -> bool:
         """
         Check if empty
@@ -133,36 +221,187 @@ class NotebookManager:
         """
         return len(self._notebooks) == 0
     
-    def get_notebook_connection(self, name: str) -> 'NotebookConnection':
+    def get_memo(self, name: str) -> Optional[ExecutionMemo]:
         """
-        Get notebook connection context manager
+        Get the execution records of the kernel of specified notebook
+        
+        Args:
+            Notebook name
+            
+        Returns:
+            Execution records or None
+        """
+        if name in self._notebooks:
+            return self._notebooks[name]["memo"]
+        return None
+    
+    def get_scheduler(self, name: str) -> Optional[NotebookScheduler]:
+        """
+        Get the execution scheduler of specified notebook
         
         Args:
             Notebook name
             
+        Returns:
+            Notebook scheduler or None
+        """
+        if name in self._notebooks:
+            return self._notebooks[name]["scheduler"]
+        return None
+    
+    def get_notebook_connection(self, name: str, operation: Optional[str] = None) -> 'NotebookConnection':
+        """
+        Get notebook connection context manager
+        
+        Args:
+            name: Notebook name
+            operation: Name of the operation modifying the notebook or using its kernel,
+                it then waits for its turn in the notebook scheduler (None for read-only access)
+            
         Returns:
             Context manager
         """
         if name not in self._notebooks:
             raise ValueError(f"Notebook '{name}' does not exist")
         
-        return NotebookConnection(self._notebooks[name]["notebook"], self._notebooks[name]["server_client"])
+        slot = self._notebooks[name]["scheduler"].slot(operation) if operation else None
+        return NotebookConnection(
+            self._notebooks[name]["notebook"],
+            self._notebooks[name]["session"],
+            self._notebooks[name]["saver"],
+            slot
+        )
 
-class NotebookConnection:
+class NotebookSession:
     """
-    Context manager for Notebook connections
+    Long-lived NbModelClient session of a Notebook, shared by all tool calls
+    
+    The Y document is synced once and then kept up to date through the websocket,
+    so reading the Notebook is a local in-memory operation.
+    If the websocket drops, the session is transparently reconnected on next acquire.
+    
+    Until the first connection modifying the notebook or using its kernel, read-only connections are
+    served from a snapshot of the contents API instead (see READ_SNAPSHOT), revalidated by one
+    request without content, so reading an unchanged notebook never joins the collaboration session.
+    Once joined, the Y document holds changes that may not be saved yet and serves every connection.
     """
     
-    def __init__(self, notebook_info: Dict[str, str], server_client: JupyterServerClient):
+    def __init__(self, notebook_info: Dict[str, str], server_client: Optional['JupyterServerClient'] = None):
         self.notebook_info = notebook_info
         self.server_client = server_client
-        self._notebook: Optional[NbModelClient] = None
+        self._notebook: Optional['NbModelClient'] = None
+        self._snapshot: Optional[NotebookSnapshot] = None
+        # 是否已加入实时协作会话 / Whether the real-time collaboration session has been joined
+        self._collaborating = False
+        self._lock = asyncio.Lock()
+    
+    @property
+    def notebook(self) -> Optional['NbModelClient']:
+        """Current notebook client, may be None or unsynced"""
+        return self._notebook
+    
+    @property
+    def is_healthy(self) -> bool:
+        """
+        Check if the session is connected and the document is synced
+        
+        Returns:
+            Whether healthy
+        """
+        return self._notebook is not None and self._notebook.synced
+    
+    async def acquire(self, writable: bool = False) -> 'NbModelClient | NotebookSnapshot':
+        """
+        Get the shared notebook client, (re)connecting it if necessary
+        
+        Args:
+            writable: Whether the connection modifies the notebook or uses its kernel,
+                otherwise a snapshot may be returned before the collaboration session is joined
+        
+        Returns:
+            Synced notebook client, or read-only snapshot
+        """
+        if self.is_healthy:
+            return self._notebook
+        
+        async with self._lock:
+            if self.is_healthy:
+                return self._notebook
+            if not writable and not self._collaborating and READ_SNAPSHOT and self.server_client is not None:
+                try:
+                    return await self._read_snapshot()
+                except Exception:
+                    # 服务器不支持时回退到协作会话 / Fall back to the collaboration session when the server does not support it
+                    pass
+            await self._disconnect()
+            
+            from jupyter_nbmodel_client import NbModelClient, get_jupyter_notebook_websocket_url
+            # 每次重连都需要重新获取协作会话ID
+            # A new collaboration session ID is required for every reconnection
+            async with METRICS.span("sync"):
+                ws_url = await asyncio.to_thread(get_jupyter_notebook_websocket_url, **self.notebook_info)
+                notebook = NbModelClient(ws_url, path=self.notebook_info["path"])
+                await notebook.start()
+            if not notebook.synced:
+                await notebook.stop()
+                raise ConnectionError(f"Failed to sync notebook '{self.notebook_info['path']}'")
+            self._notebook = notebook
+            self._collaborating = True
+            self._snapshot = None
+        return self._notebook
+    
+    async def _read_snapshot(self) -> NotebookSnapshot:
+        """Get the snapshot, fetching it again only if the file changed on the server"""
+        path = self.notebook_info["path"]
+        if self._snapshot is not None:
+            async with METRICS.span("revalidate"):
+                model = await asyncio.to_thread(self.server_client.contents.get, path, content=False)
+            if snapshot_validator(model) == self._snapshot.validator:
+                return self._snapshot
+        async with METRICS.span("snapshot"):
+            model = await asyncio.to_thread(self.server_client.contents.get, path, type="notebook", content=True)
+        self._snapshot = NotebookSnapshot(model.content, snapshot_validator(model))
+        return self._snapshot
+    
+    async def _disconnect(self) -> None:
+        """Stop the current notebook client if any"""
+        if self._notebook is not None:
+            notebook, self._notebook = self._notebook, None
+            try:
+                await notebook.stop()
+            except Exception:
+                pass
+    
+    async def close(self) -> None:
+        """Close the session"""
+        async with self._lock:
+            await self._disconnect()
+            self._snapshot = None
+
+class NotebookConnection:
+    """
+    Context manager for Notebook connections, backed by the shared NotebookSession
+    """
+    
+    def __init__(
+        self, notebook_info: Dict[str, str], session: NotebookSession | LocalNotebookSession, saver: AutoSaver,
+        slot: Optional[SchedulerSlot] = None):
+        self.notebook_info = notebook_info
+        self.session = session
+        self.saver = saver
+        self.slot = slot
+        self._notebook: Optional['NbModelClient'] = None
     
-    async def __aenter__(self) -> NbModelClient:
-        """Enter context manager"""
-        ws_url = get_jupyter_notebook_websocket_url(**self.notebook_info)
-        self._notebook = NbModelClient(ws_url)
-        await self._notebook.__aenter__()
+    async def __aenter__(self) -> 'NbModelClient':
+        """Enter context manager, waiting for the turn of the operation first if any"""
+        if self.slot is not None:
+            await self.slot.__aenter__()
+        try:
+            self._notebook = await self.session.acquire(self.slot is not None)
+        except BaseException:
+            if self.slot is not None:
+                await self.slot.__aexit__(None, None, None)
+            raise
         return self._notebook
     
     async def __aexit__(
@@ -171,8 +410,12 @@ class NotebookConnection:
         exc_val: Optional[BaseException], 
         exc_tb: Optional[TracebackType]
     ) -> None:
-        """Exit context manager"""
-        if self._notebook:
-            if AUTO_SAVE_NOTEBOOK:
-                self.server_client.contents.save_notebook(self.notebook_info["path"], self._notebook.as_dict())
-            await self._notebook.__aexit__(exc_type, exc_val, exc_tb)
\ No newline at end of file
+        """Exit context manager, the shared session is kept open"""
+        try:
+            if self._notebook is not None:
+                if AUTO_SAVE_NOTEBOOK or (self.saver.required and self.slot is not None):
+                    self.saver.schedule()
+                self._notebook = None
+        finally:
+            if self.slot is not None:
+                await self.slot.__aexit__(exc_type, exc_val, exc_tb)
\ No newline at end of file
@@ -0,0 +1,249 @@
+import base64, threading
+from collections import OrderedDict
+from typing import Any, Optional
+from fastmcp.utilities.types import Image
+from mcp.types import ImageContent
+
+from .cell import shrink_image
+from .metrics import METRICS
+from ..__env__ import OUTPUT_MAX_BYTES, OUTPUT_MAX_LINES, OUTPUT_STORE_MAX_BYTES, IMAGE_RESPONSE_MAX_BYTES
+
+# 临时代码(execute_temporary_code)输出使用的Cell索引
+# Cell index used for the outputs of temporary code (execute_temporary_code)
+TEMPORARY_CELL_INDEX = -1
+
+# 剩余图片预算低于该字节数时不再生成缩略图 / No thumbnail is made once the remaining image budget is below these bytes
+_MIN_THUMBNAIL_BYTES = 4096
+
+class OutputStore:
+    """
+    被截断输出的完整内容存储, 按(Notebook名称, Cell的键, 输出索引)索引, 按总字节数LRU淘汰
+    Spill store of the full content of truncated outputs, keyed by (notebook name, cell key, output index)
+    and evicted in LRU order once the total size exceeds the limit
+
+    The cell key is the cell id, so that inserting, deleting or moving cells never makes a stored output
+    answer for another cell; only cells without id (nbformat < 4.5) and temporary code use their index.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._store: OrderedDict[tuple[str, int | str, int], str] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cell_key(cell_index: int, cell_id: Optional[str]) -> int | str:
+        """Key of a cell: its id, or its index when it has none"""
+        return cell_index if cell_id is None else cell_id
+
+    def put(self, notebook_name: str, cell_key: int | str, output_index: int, text: str) -> None:
+        key = (notebook_name, cell_key, output_index)
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            if key in self._store:
+                self._size -= len(self._store.pop(key).encode("utf-8"))
+            if size > self.max_bytes:
+                return
+            self._store[key] = text
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._store.popitem(last=False)
+                self._size -= len(evicted.encode("utf-8"))
+
+    def get(self, notebook_name: str, cell_key: int | str, output_index: int) -> Optional[str]:
+        key = (notebook_name, cell_key, output_index)
+        with self._lock:
+            text = self._store.get(key)
+            if text is not None:
+                self._store.move_to_end(key)
+            return text
+
+    def discard(self, notebook_name: str, cell_key: Optional[int | str] = None) -> None:
+        """
+        Remove the stored outputs of a notebook, or only of one of its cells
+        """
+        with self._lock:
+            for key in [key for key in self._store if key[0] == notebook_name and cell_key in (None, key[1])]:
+                self._size -= len(self._store.pop(key).encode("utf-8"))
+
+# 所有Notebook共享的输出存储
+# Output store shared by all notebooks
+OUTPUT_STORE = OutputStore(OUTPUT_STORE_MAX_BYTES)
+
+def _count_lines(text: str) -> int:
+    """Count the lines of a text, a trailing newline does not start a new line"""
+    return text.count("\n") + (0 if text.endswith("\n") else 1)
+
+def _truncate_text(text: str, max_bytes: int, max_lines: int) -> tuple[str, str]:
+    """
+    保留文本的头部与尾部, 使其不超过给定的字节数与行数
+    Keep the head and the tail of the text so that it fits in the given number of bytes and lines
+    """
+    lines = text.splitlines(keepends=True)
+    if len(lines) > max_lines:
+        head_lines = (max_lines + 1) // 2
+        tail_lines = max_lines - head_lines
+        head = "".join(lines[:head_lines])
+        tail = "".join(lines[len(lines) - tail_lines:]) if tail_lines > 0 else ""
+    else:
+        head, tail = text, ""
+
+    head_bytes = head.encode("utf-8")
+    tail_bytes = tail.encode("utf-8")
+    if len(head_bytes) + len(tail_bytes) > max_bytes:
+        if tail_bytes:
+            head_budget = (max_bytes + 1) // 2
+            tail_budget = max_bytes - head_budget
+        else:
+            head_budget, tail_budget = max_bytes, 0
+        head = head_bytes[:head_budget].decode("utf-8", errors="ignore")
+        tail = tail_bytes[len(tail_bytes) - tail_budget:].decode("utf-8", errors="ignore") if tail_budget > 0 else ""
+    return head, tail
+
+class OutputBudget:
+    """
+    单次工具调用的输出预算, 超出预算的文本输出会被截断(保留头尾)并完整存入OUTPUT_STORE,
+    超出图片预算的图片会被缩小为缩略图或省略
+    Output budget of one tool call, text outputs exceeding the budget are truncated (keeping head and tail)
+    and their full content is kept in OUTPUT_STORE, images exceeding the image budget are reduced to
+    thumbnails or omitted
+    """
+
+    def __init__(self, max_bytes: int = OUTPUT_MAX_BYTES, max_lines: int = OUTPUT_MAX_LINES, max_image_bytes: int = IMAGE_RESPONSE_MAX_BYTES):
+        self.remaining_bytes = max_bytes
+        self.remaining_lines = max_lines
+        self.max_image_bytes = max_image_bytes
+        self.remaining_image_bytes = max_image_bytes
+
+    def _fit_image(self, image: ImageContent, cell_index: int) -> list[Any]:
+        """
+        对一张图片应用图片预算, 超出时缩小为缩略图, 连缩略图也放不下时省略
+        Apply the image budget to an image, it is reduced to a thumbnail beyond the budget and omitted when even a thumbnail does not fit
+        """
+        if self.max_image_bytes <= 0:
+            return [image]
+        data = base64.b64decode(image.data)
+        if len(data) <= self.remaining_image_bytes:
+            self.remaining_image_bytes -= len(data)
+            return [image]
+
+        if cell_index == TEMPORARY_CELL_INDEX:
+            hint = "display fewer or smaller images to view them in full"
+        else:
+            hint = f"use `read_cell` with cell_index={cell_index} to view it in full"
+        thumbnail = shrink_image(data, self.remaining_image_bytes) if self.remaining_image_bytes >= _MIN_THUMBNAIL_BYTES else None
+        if thumbnail is None:
+            METRICS.record_image("omitted", image.mimeType.split("/")[-1], len(data), 0)
+            return [f"[IMAGE OMITTED: the images of this response exceed {self.max_image_bytes} bytes, {hint}]"]
+        self.remaining_image_bytes -= len(thumbnail[0])
+        return [
+            Image(data=thumbnail[0], format=thumbnail[1]).to_image_content(),
+            f"[IMAGE REDUCED TO A THUMBNAIL: the images of this response exceed {self.max_image_bytes} bytes, {hint}]"
+        ]
+
+    def apply(self, outputs: list[Any], notebook_name: str, cell_index: int, cell_id: Optional[str] = None) -> list[Any]:
+        """
+        对一个Cell的输出应用预算
+        Apply the budget to the outputs of a cell
+
+        Args:
+            outputs: Cell.get_outputs的结果 / The result of Cell.get_outputs
+            notebook_name: Notebook名称 / The notebook name
+            cell_index: Cell索引(临时代码为TEMPORARY_CELL_INDEX) / The cell index (TEMPORARY_CELL_INDEX for temporary code)
+            cell_id: Cell的id(可选) / The cell id (optional)
+
+        Returns:
+            应用预算后的输出 / The outputs within the budget
+        """
+        cell_key = OUTPUT_STORE.cell_key(cell_index, cell_id)
+        # 旧的完整输出已经过期
+        # The previously stored full outputs are outdated
+        OUTPUT_STORE.discard(notebook_name, cell_key)
+        result = []
+        for output_index, output in enumerate(outputs):
+            if isinstance(output, ImageContent):
+                result.extend(self._fit_image(output, cell_index))
+                continue
+            if not isinstance(output, str):
+                result.append(output)
+                continue
+            size = len(output.encode("utf-8"))
+            line_count = _count_lines(output)
+            if size <= self.remaining_bytes and line_count <= self.remaining_lines:
+                self.remaining_bytes -= size
+                self.remaining_lines -= line_count
+                result.append(output)
+                continue
+
+            OUTPUT_STORE.put(notebook_name, cell_key, output_index, output)
+            head, tail = _truncate_text(output, max(self.remaining_bytes, 0), max(self.remaining_lines, 0))
+            omitted_bytes = size - len(head.encode("utf-8")) - len(tail.encode("utf-8"))
+            marker = (
+                f"\n...[OUTPUT TRUNCATED: {omitted_bytes} of {size} bytes ({line_count} lines in total) omitted, "
+                f"use `read_output` with cell_index={cell_index}, output_index={output_index} to read the full output]...\n"
+            )
+            result.append(head + marker + tail)
+            self.remaining_bytes = 0
+            self.remaining_lines = 0
+        return result
+
+def _split_bytes(text: str, max_bytes: int) -> list[str]:
+    """Split a text into segments of at most max_bytes UTF-8 bytes, never inside a character"""
+    data = text.encode("utf-8")
+    if len(data) <= max_bytes:
+        return [text]
+    segments = []
+    start = 0
+    while start < len(data):
+        end = min(start + max(max_bytes, 1), len(data))
+        # 回退到字符边界(UTF-8后续字节为0b10xxxxxx) / Back off to a character boundary (UTF-8 continuation bytes are 0b10xxxxxx)
+        while start < end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        if end == start:
+            # 预算小于一个字符 / The budget is smaller than one character
+            end += 1
+            while end < len(data) and data[end] & 0xC0 == 0x80:
+                end += 1
+        segments.append(data[start:end].decode("utf-8"))
+        start = end
+    return segments
+
+def page_output(text: str, offset: int, limit: int, max_bytes: int = OUTPUT_MAX_BYTES) -> str:
+    """
+    按行分页读取输出, 每页同样不超过字节预算(超过max_bytes字节的行拆分为多行)
+    Read an output page by page (by lines), each page also stays within the byte budget
+    (lines longer than max_bytes bytes count as several lines)
+
+    Args:
+        text: 完整输出 / The full output
+        offset: 起始行(0-based) / The first line (0-based)
+        limit: 最大行数(0表示不限制) / Maximum number of lines (0 means no limit)
+        max_bytes: 每页最大字节数 / Maximum bytes of a page
+
+    Returns:
+        带分页信息的输出内容 / The output content with pagination information
+    """
+    # 超长的行被拆分为多段, 保证每一页都能有进展
+    # Overlong lines are split into segments, so that every page makes progress
+    lines = []
+    for line in text.splitlines(keepends=True):
+        lines.extend(_split_bytes(line, max_bytes))
+    total_lines = len(lines)
+    if offset < 0 or offset >= max(total_lines, 1):
+        return f"Offset {offset} out of range, output has {total_lines} lines"
+
+    end = min(offset + limit, total_lines) if limit > 0 else total_lines
+    page = []
+    size = 0
+    for line in lines[offset:end]:
+        line_size = len(line.encode("utf-8"))
+        if page and size + line_size > max_bytes:
+            break
+        page.append(line)
+        size += line_size
+    end = offset + len(page)
+
+    header = f"=====Showing lines {offset}-{end - 1} of {total_lines} total lines====="
+    if end < total_lines:
+        header += f"\n=====Use offset={end} to read the next page====="
+    return header + "\n" + "".join(page)
@@ -0,0 +1,220 @@
+import base64, functools
+from html.parser import HTMLParser
+from typing import Any, Callable, NamedTuple, Optional
+
+from ..__env__ import ALLOW_IMG
+
+class MimeRenderer(NamedTuple):
+    """
+    将一种MIME类型的展示数据转换为最紧凑的有用表示
+    Turns the display data of one MIME type into its most compact useful representation
+
+    `render` receives the raw data of the MIME type (joined into one string if it is a list of lines) and
+    returns the rendered text, or the image bytes when `image_format` is set; it returns None to decline,
+    in which case the next renderer is tried.
+    """
+    mime: str
+    render: Callable[[str], Optional[str | bytes]]
+    # 原始数据的最大字节数, 超出时跳过该渲染器(0表示不限制)
+    # Maximum bytes of the raw data, the renderer is skipped beyond it (0 means no limit)
+    max_bytes: int = 0
+    # 渲染结果的图片格式(如"png"), 图片会再经过预处理; None表示渲染结果为文本
+    # Image format of the rendered result (e.g. "png"), images are preprocessed afterwards; None for text results
+    image_format: Optional[str] = None
+    # 是否缓存文本渲染结果(图片总是缓存), 渲染开销可忽略时无需缓存
+    # Whether to cache the rendered text (images are always cached), not needed when rendering is trivial
+    cache: bool = True
+
+# 按优先级排列的渲染器, 一个输出使用第一个可用且未拒绝的渲染器
+# Renderers in priority order, an output uses the first one that applies and does not decline
+MIME_RENDERERS: list[MimeRenderer] = []
+
+def register_renderer(
+    mime: str, max_bytes: int = 0, image_format: Optional[str] = None, cache: bool = True,
+    before: Optional[str] = None) -> Callable[[Callable[[str], Optional[str | bytes]]], Callable[[str], Optional[str | bytes]]]:
+    """
+    注册MIME渲染器的装饰器, 同一MIME类型的渲染器会被替换(保持原有优先级)
+    Decorator registering a MIME renderer, a renderer of the same MIME type is replaced (keeping its priority)
+
+    Args:
+        mime: MIME类型 / The MIME type
+        max_bytes: 原始数据的最大字节数(0表示不限制) / Maximum bytes of the raw data (0 means no limit)
+        image_format: 渲染结果的图片格式, 文本结果为None / Image format of the rendered result, None for text results
+        cache: 是否缓存文本渲染结果 / Whether to cache the rendered text
+        before: 插入到该MIME类型的渲染器之前, 默认追加到末尾 / Insert before the renderer of this MIME type, appended by default
+
+    Returns:
+        装饰器 / The decorator
+    """
+    def decorator(render: Callable[[str], Optional[str | bytes]]) -> Callable[[str], Optional[str | bytes]]:
+        renderer = MimeRenderer(mime, render, max_bytes, image_format, cache)
+        positions = [index for index, existing in enumerate(MIME_RENDERERS) if existing.mime == mime]
+        if positions:
+            MIME_RENDERERS[positions[0]] = renderer
+            return render
+        anchors = [index for index, existing in enumerate(MIME_RENDERERS) if existing.mime == before]
+        MIME_RENDERERS.insert(anchors[0] if anchors else len(MIME_RENDERERS), renderer)
+        return render
+    return decorator
+
+def mime_data(value: str | list[str]) -> str:
+    """Raw data of a MIME type as one string (nbformat may split it into a list of lines)"""
+    return "".join(value) if isinstance(value, list) else value
+
+def select_renderers(data: dict[str, Any]) -> list[MimeRenderer]:
+    """
+    获取可用于该展示数据的渲染器, 按优先级排列
+    Get the renderers applicable to the display data, in priority order
+
+    Args:
+        data: 输出的data字段 / The data field of the output
+
+    Returns:
+        MIME类型存在、未超出大小限制且被允许的渲染器 / Renderers whose MIME type is present, within the size cap and allowed
+    """
+    return [
+        renderer for renderer in MIME_RENDERERS
+        if renderer.mime in data
+        and (ALLOW_IMG or renderer.image_format is None)
+        and (renderer.max_bytes <= 0 or len(mime_data(data[renderer.mime])) <= renderer.max_bytes)
+    ]
+
+@functools.cache
+def _svg_rasterizer() -> Optional[Callable[..., bytes]]:
+    """cairosvg.svg2png if the optional dependency is installed"""
+    try:
+        from cairosvg import svg2png
+    except (ImportError, OSError):
+        return None
+    return svg2png
+
+def _span(value: Optional[str]) -> int:
+    """Value of a colspan or rowspan attribute"""
+    return max(int(value), 1) if value and value.isdigit() else 1
+
+class _TableParser(HTMLParser):
+    """
+    将HTML中的表格转换为TSV, 表格之外的文本(如pandas的"5 rows × 3 columns")保留为单独的行
+    Convert the tables of an HTML document to TSV, the text outside the tables
+    (e.g. "5 rows × 3 columns" of pandas) is kept as separate lines
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self.tables = 0
+        self._depth = 0
+        self._skip = 0
+        self._row: Optional[list[str]] = None
+        self._cell: Optional[list[str]] = None
+        self._colspan = 1
+        self._rowspan = 1
+        # 跨行单元格占用的列: 列号 -> 剩余行数 / Columns taken by row-spanning cells: column -> remaining rows
+        self._spans: dict[int, int] = {}
+        self._text: list[str] = []
+
+    def _flush_text(self) -> None:
+        text = " ".join("".join(self._text).split())
+        if text:
+            self.lines.append(text)
+        self._text = []
+
+    def _place_cell(self, text: str, colspan: int, rowspan: int) -> None:
+        # 跳过被上方跨行单元格占用的列 / Skip the columns taken by row-spanning cells above
+        while self._spans.get(len(self._row), 0) > 0:
+            self._row.append("")
+        if rowspan > 1:
+            self._spans[len(self._row)] = rowspan
+        self._row.append(text)
+        self._row.extend([""] * (colspan - 1))
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        if tag in ("style", "script"):
+            self._skip += 1
+        elif tag == "table":
+            if self._depth == 0:
+                self._flush_text()
+                self.tables += 1
+            self._depth += 1
+        elif self._depth == 1 and tag == "tr":
+            self._row = []
+        elif self._depth == 1 and tag in ("td", "th") and self._row is not None:
+            attributes = dict(attrs)
+            self._cell = []
+            self._colspan = _span(attributes.get("colspan"))
+            self._rowspan = _span(attributes.get("rowspan"))
+        elif tag == "br" and self._cell is not None:
+            self._cell.append(" ")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in ("style", "script"):
+            self._skip = max(self._skip - 1, 0)
+        elif tag == "table" and self._depth > 0:
+            self._depth -= 1
+            if self._depth == 0:
+                self._row = self._cell = None
+                self._spans = {}
+        elif self._depth == 1 and tag in ("td", "th") and self._cell is not None:
+            self._place_cell(" ".join("".join(self._cell).split()), self._colspan, self._rowspan)
+            self._cell = None
+        elif self._depth == 1 and tag == "tr" and self._row is not None:
+            while self._spans.get(len(self._row), 0) > 0:
+                self._row.append("")
+            self._spans = {column: remaining - 1 for column, remaining in self._spans.items() if remaining > 1}
+            self.lines.append("\t".join(self._row).rstrip("\t"))
+            self._row = None
+        elif tag in ("p", "div", "li") and self._depth == 0:
+            self._flush_text()
+
+    def handle_data(self, data: str) -> None:
+        if self._skip:
+            return
+        if self._cell is not None:
+            self._cell.append(data)
+        elif self._depth == 0:
+            self._text.append(data)
+
+@register_renderer("image/png", max_bytes=64 * 1024 * 1024, image_format="png")
+def render_png(data: str) -> bytes:
+    """PNG图片 / PNG image"""
+    return base64.b64decode(data)
+
+@register_renderer("image/jpeg", max_bytes=64 * 1024 * 1024, image_format="jpeg")
+def render_jpeg(data: str) -> bytes:
+    """JPEG图片 / JPEG image"""
+    return base64.b64decode(data)
+
+@register_renderer("image/svg+xml", max_bytes=4 * 1024 * 1024, image_format="png")
+def render_svg(data: str) -> Optional[bytes]:
+    """SVG矢量图光栅化为PNG(需要可选依赖cairosvg) / SVG rasterized to PNG (requires the optional dependency cairosvg)"""
+    rasterizer = _svg_rasterizer()
+    if rasterizer is None:
+        return None
+    try:
+        return rasterizer(bytestring=data.encode("utf-8"))
+    except Exception:
+        return None
+
+@register_renderer("text/html", max_bytes=4 * 1024 * 1024)
+def render_html(data: str) -> Optional[str]:
+    """HTML表格(如pandas DataFrame)转换为TSV, 不含表格的HTML被拒绝 / HTML tables (e.g. pandas DataFrame) as TSV, HTML without table is declined"""
+    parser = _TableParser()
+    try:
+        parser.feed(data)
+        parser.close()
+    except Exception:
+        return None
+    if parser.tables == 0:
+        return None
+    parser._flush_text()
+    return "\n".join(parser.lines)
+
+@register_renderer("text/markdown", cache=False)
+def render_markdown(data: str) -> str:
+    """Markdown文本 / Markdown text"""
+    return data
+
+@register_renderer("text/plain", cache=False)
+def render_plain(data: str) -> str:
+    """纯文本 / Plain text"""
+    return data
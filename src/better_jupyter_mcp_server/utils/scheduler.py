@@ -0,0 +1,109 @@
+import asyncio, functools, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from .metrics import METRICS
+from ..__env__ import SCHEDULER_WORKERS
+
+# 执行阻塞的内核与服务器调用的专用线程池, 与默认线程池隔离, 避免不同Notebook相互抢占
+# Dedicated thread pool for blocking kernel and server calls, isolated from the default one
+# so that work on different notebooks never starves each other
+_executor = ThreadPoolExecutor(max_workers=SCHEDULER_WORKERS, thread_name_prefix="notebook-worker")
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在专用线程池中执行阻塞调用
+    Run a blocking call in the dedicated thread pool
+
+    Args:
+        func: 阻塞函数 / The blocking function
+        *args, **kwargs: 函数参数 / The function arguments
+
+    Returns:
+        函数返回值 / The return value of the function
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+class NotebookScheduler:
+    """
+    单个Notebook的调度器, 对同一内核的执行与编辑按到达顺序(FIFO)串行化
+    Scheduler of a single notebook, executions and edits against its kernel are serialized in arrival order (FIFO)
+
+    asyncio.Lock wakes up its waiters in FIFO order, so no operation can be starved.
+    The queue depth and the wait times are recorded to be shown by `list_notebook`.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+        self.queued = 0
+        self.running: Optional[str] = None
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def average_wait(self) -> float:
+        """Average wait time of the served operations in seconds"""
+        return self.total_wait / self.served if self.served else 0.0
+
+    async def acquire(self, operation: str) -> float:
+        """
+        排队等待执行权
+        Wait in the queue for the notebook
+
+        Args:
+            operation: 操作名称(通常为工具名) / Operation name (usually the tool name)
+
+        Returns:
+            等待时间(秒) / Wait time in seconds
+        """
+        start = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._lock.acquire()
+        finally:
+            self.queued -= 1
+        wait = time.perf_counter() - start
+        self.running = operation
+        self.served += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        if METRICS.enabled:
+            METRICS.observe("queue_wait", wait * 1000)
+        return wait
+
+    def release(self) -> None:
+        """Release the notebook to the next operation in the queue"""
+        self.running = None
+        self._lock.release()
+
+    def slot(self, operation: str) -> 'SchedulerSlot':
+        """
+        获取排队执行的上下文管理器
+        Get a context manager holding the notebook for the operation
+
+        Args:
+            operation: 操作名称(通常为工具名) / Operation name (usually the tool name)
+
+        Returns:
+            上下文管理器 / Context manager
+        """
+        return SchedulerSlot(self, operation)
+
+class SchedulerSlot:
+    """
+    Context manager holding a NotebookScheduler for one operation
+    """
+
+    def __init__(self, scheduler: NotebookScheduler, operation: str):
+        self.scheduler = scheduler
+        self.operation = operation
+
+    async def __aenter__(self) -> float:
+        """Enter context manager, returns the wait time in seconds"""
+        return await self.scheduler.acquire(self.operation)
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Exit context manager"""
+        self.scheduler.release()
@@ -0,0 +1,228 @@
+import anyio, asyncio, contextvars, itertools, logging, time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+from fastmcp.exceptions import ToolError
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from fastmcp.tools.tool import ToolResult
+from mcp.types import CallToolRequestParams
+
+from .notebook import NotebookManager
+from ..__env__ import MAX_SESSIONS, MAX_CONCURRENT_CALLS, SESSION_IDLE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 两次清理空闲会话之间的间隔(秒)
+# Interval between two sweeps of the idle sessions in seconds
+_SWEEP_INTERVAL = 60.0
+
+class _SessionEntry:
+    """A client session and its notebook namespace (created by its first tool call)"""
+    __slots__ = ("key", "id", "manager", "last_used", "calls", "running")
+
+    def __init__(self, key: str, session_id: str):
+        # MCP会话id / MCP session id
+        self.key = key
+        # 共享缓存中的命名空间 / Namespace in the shared caches
+        self.id = session_id
+        self.manager: Optional[NotebookManager] = None
+        self.last_used = time.monotonic()
+        # 累计的与正在执行的工具调用数 / Tool calls made so far and currently running
+        self.calls = 0
+        self.running = 0
+
+# 当前服务生命周期中打开的会话, 由生命周期设置, 并被其所有请求处理任务继承
+# Sessions opened in the current server lifespan, set by the lifespan and inherited by all its request handlers
+_lifespan_sessions: contextvars.ContextVar[Optional[set[str]]] = contextvars.ContextVar("lifespan_sessions", default=None)
+
+class SessionRegistry:
+    """
+    客户端会话注册表, 每个会话拥有独立的NotebookManager命名空间
+    Registry of the client sessions, each session has its own NotebookManager namespace
+
+    Sessions are keyed by the MCP session id of the request, which does not depend on how often the
+    transport enters the server lifespan. The kernel pool, thread pools, image cache and output store are
+    module globals shared by every session, only the notebook names are isolated. The notebooks of a session
+    are closed (flushing pending saves and stopping their kernels) when the lifespan it was opened in ends
+    (once per client connection with FastMCP 2.12), or once it stayed idle, with no running tool call,
+    longer than SESSION_IDLE_TIMEOUT.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        # MCP会话id -> 会话 / MCP session id -> session
+        self._active: dict[str, _SessionEntry] = {}
+        self._ids = itertools.count(1)
+        self._calls = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[None]:
+        """
+        在服务的生命周期中进入, 结束时关闭其间打开的会话
+        Entered in the server lifespan, the sessions opened during it are closed when it ends
+
+        The opened sessions are recorded in a context variable, which the request handlers started in the lifespan inherit.
+        """
+        opened: set[str] = set()
+        token = _lifespan_sessions.set(opened)
+        try:
+            yield
+        finally:
+            _lifespan_sessions.reset(token)
+            # 生命周期任务可能已被取消, 需要屏蔽取消以完成清理
+            # The lifespan task may already be cancelled, shield the cleanup so it can complete
+            with anyio.CancelScope(shield=True):
+                for key in opened:
+                    entry = self._active.get(key)
+                    if entry is not None:
+                        await self._deactivate(entry, "connection closed")
+
+    @asynccontextmanager
+    async def use(self, key: Optional[str]) -> AsyncIterator[Optional[NotebookManager]]:
+        """
+        在一次工具调用期间使用会话的NotebookManager, 首次调用时创建
+        Use the NotebookManager of a session during a tool call, created on first call
+
+        The session counts as busy until the call ends, so it is never closed as idle while a call is running.
+
+        Args:
+            key: MCP会话id, 为None时不使用会话 / MCP session id, None to use no session
+
+        Yields:
+            NotebookManager, 没有会话时为None / None without session
+
+        Raises:
+            ToolError: 会话数已达上限时 / When the maximum number of sessions is reached
+        """
+        if key is None:
+            yield None
+            return
+        if self._sweeper is None or self._sweeper.done():
+            # 使用空的上下文, 避免清理任务引用创建它的请求
+            # Use an empty context, so the sweeper does not keep the request that created it alive
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_periodically(), context=contextvars.Context())
+        entry = self._active.get(key)
+        if entry is None:
+            if self.max_sessions > 0 and len(self._active) >= self.max_sessions:
+                raise ToolError(f"Too many sessions ({len(self._active)}), please retry later or close other clients")
+            entry = self._active[key] = _SessionEntry(key, f"s{next(self._ids)}")
+            entry.manager = NotebookManager(entry.id)
+            opened = _lifespan_sessions.get()
+            if opened is not None:
+                opened.add(key)
+        entry.calls += 1
+        entry.running += 1
+        entry.last_used = time.monotonic()
+        self._calls += 1
+        try:
+            yield entry.manager
+        finally:
+            entry.running -= 1
+            entry.last_used = time.monotonic()
+
+    async def _deactivate(self, entry: _SessionEntry, reason: str) -> None:
+        """Close the notebooks of a session and free its slot"""
+        manager, entry.manager = entry.manager, None
+        if self._active.pop(entry.key, None) is None or manager is None:
+            return
+        logger.info("Closing session %s (%s)", entry.id, reason)
+        await manager.close_all()
+
+    async def _sweep_periodically(self) -> None:
+        """Close the notebooks of the sessions idle for too long, a later call of the session starts with an empty namespace"""
+        while True:
+            await asyncio.sleep(_SWEEP_INTERVAL)
+            await self._sweep()
+
+    async def _sweep(self) -> None:
+        """Close the notebooks of the sessions idle for too long"""
+        if self.idle_timeout <= 0:
+            return
+        now = time.monotonic()
+        for entry in list(self._active.values()):
+            # 正在执行工具调用的会话不是空闲的 / A session running a tool call is not idle
+            if entry.running == 0 and now - entry.last_used > self.idle_timeout:
+                await self._deactivate(entry, "idle")
+
+    def stats(self) -> dict[str, int]:
+        """
+        Get the number of sessions, notebooks and tool calls
+        """
+        return {
+            "sessions": len(self._active),
+            "notebooks": sum(len(list(entry.manager)) for entry in self._active.values() if entry.manager is not None),
+            "calls": self._calls,
+        }
+
+    async def close_all(self) -> None:
+        """
+        关闭所有会话(服务关闭时调用)
+        Close all sessions (used on server shutdown)
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for entry in list(self._active.values()):
+            await self._deactivate(entry, "shutdown")
+
+# 全局会话注册表
+# Global session registry
+SESSIONS = SessionRegistry()
+
+# 当前工具调用所属会话的NotebookManager
+# NotebookManager of the session of the current tool call
+_current_manager: contextvars.ContextVar[Optional[NotebookManager]] = contextvars.ContextVar("current_manager", default=None)
+
+class SessionNotebookManager:
+    """
+    指向当前会话NotebookManager的代理, 使工具代码可以像使用单个NotebookManager一样使用它
+    Proxy to the NotebookManager of the current session, so tools can use it like a single NotebookManager
+
+    Outside of a client connection (e.g. calling the tool functions directly) a default namespace is used.
+    """
+
+    def __init__(self):
+        self._default = NotebookManager()
+
+    @property
+    def current(self) -> NotebookManager:
+        return _current_manager.get() or self._default
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.current
+
+    def __iter__(self):
+        return iter(self.current)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.current, name)
+
+    async def close_all(self) -> None:
+        """Close the notebooks of every session"""
+        await self._default.close_all()
+        await SESSIONS.close_all()
+
+class SessionMiddleware(Middleware):
+    """
+    为每次工具调用选择其会话的NotebookManager, 并限制同时执行的工具调用数
+    Select the NotebookManager of the session of each tool call, and limit the number of tool calls running at the same time
+    """
+
+    def __init__(self, max_concurrent_calls: int = MAX_CONCURRENT_CALLS):
+        self._semaphore = asyncio.Semaphore(max_concurrent_calls) if max_concurrent_calls > 0 else None
+
+    async def on_call_tool(self, context: MiddlewareContext[CallToolRequestParams], call_next) -> ToolResult:
+        key = context.fastmcp_context.session_id if context.fastmcp_context is not None else None
+        async with SESSIONS.use(key) as manager:
+            token = _current_manager.set(manager)
+            try:
+                if self._semaphore is None:
+                    return await call_next(context)
+                async with self._semaphore:
+                    return await call_next(context)
+            finally:
+                _current_manager.reset(token)
@@ -0,0 +1,41 @@
+from typing import Any, Optional, TYPE_CHECKING
+
+from .index import StaticCellIndex
+
+if TYPE_CHECKING:
+    from jupyter_server_api.models import Contents
+
+def snapshot_validator(model: 'Contents') -> tuple[Any, Optional[int]]:
+    """
+    contents API模型的验证标识(修改时间与大小), 相同时文件内容未改变
+    Validator of a contents API model (modification time and size), the file content is unchanged while it is equal
+    """
+    return model.last_modified, model.size
+
+class NotebookSnapshot:
+    """
+    通过contents API获取的Notebook内容快照, 只读
+    Read-only snapshot of a notebook content fetched through the contents API
+
+    It offers the same reading interface as the Y document (`len`, indexing and `get_cell_index`),
+    and is served from memory as long as the validator of the file on the server does not change.
+    """
+
+    def __init__(self, content: dict[str, Any], validator: tuple[Any, Optional[int]]):
+        self._cells: list[dict[str, Any]] = content.get("cells") or []
+        self.validator = validator
+        self.cell_index = StaticCellIndex(self)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        return self._cells[index]
+
+    def field(self, index: int, name: str, default: Any = None) -> Any:
+        """Value of one field of a cell"""
+        return self._cells[index].get(name, default)
+
+    def has_field(self, index: int, name: str) -> bool:
+        """Whether a cell has a field"""
+        return name in self._cells[index]
@@ -0,0 +1,186 @@
+import json
+from typing import Any, Optional
+
+from .formatter import format_table
+
+# 在内核中运行的检查程序, 在独立的全局命名空间中执行, 不会向用户命名空间写入任何名称
+# Inspection routine run in the kernel, executed in its own global namespace so that no name is written to the user namespace
+_INSPECTOR_SOURCE = r'''
+import fnmatch, json, reprlib, sys, types
+
+_CALLABLES = (types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, type)
+_CONTAINERS = (list, tuple, set, frozenset, dict)
+
+_repr = reprlib.Repr()
+_repr.maxstring = _repr.maxother = _repr.maxlong = _options["preview_chars"] + 3
+_repr.maxlist = _repr.maxtuple = _repr.maxset = _repr.maxfrozenset = _repr.maxdict = 10
+
+def _type_name(value):
+    cls = type(value)
+    module = cls.__module__ or ""
+    return cls.__qualname__ if module == "builtins" else f"{module.split('.')[0]}.{cls.__qualname__}"
+
+def _attribute(value, name):
+    attribute = getattr(value, name, None)
+    return None if attribute is None or isinstance(value, type) else attribute
+
+def _shape(value):
+    shape = _attribute(value, "shape")
+    if isinstance(shape, tuple):
+        return "x".join(str(dim) for dim in shape) or "()"
+    if isinstance(value, _CALLABLES):
+        return ""
+    try:
+        return str(len(value))
+    except Exception:
+        return ""
+
+def _dtype(value):
+    dtype = _attribute(value, "dtype")
+    if dtype is not None and not callable(dtype):
+        return str(dtype)
+    dtypes = _attribute(value, "dtypes")
+    if dtypes is None or callable(dtypes):
+        return ""
+    counts = {}
+    for item in dtypes:
+        counts[str(item)] = counts.get(str(item), 0) + 1
+    kinds = [f"{name}({count})" for name, count in sorted(counts.items(), key=lambda entry: -entry[1])]
+    return ", ".join(kinds[:5]) + (", ..." if len(kinds) > 5 else "")
+
+def _size(value):
+    nbytes = _attribute(value, "nbytes")
+    if nbytes is not None and not callable(nbytes):
+        return int(nbytes)
+    for method, kwargs in (("memory_usage", {"deep": False}), ("estimated_size", {})):
+        function = _attribute(value, method)
+        if callable(function):
+            try:
+                total = function(**kwargs)
+                return int(total.sum() if hasattr(total, "sum") else total)
+            except Exception:
+                pass
+    size = sys.getsizeof(value)
+    if isinstance(value, _CONTAINERS) and len(value) <= 10000:
+        items = value.items() if isinstance(value, dict) else ((item,) for item in value)
+        size += sum(sys.getsizeof(part) for item in items for part in item)
+    return size
+
+def _preview(value):
+    columns = _attribute(value, "columns")
+    if columns is not None and not callable(columns):
+        text = "columns: " + ", ".join(str(column) for column in list(columns)[:30])
+    else:
+        text = _repr.repr(value)
+    text = " ".join(text.split())
+    limit = _options["preview_chars"]
+    return text if len(text) <= limit else text[:max(limit - 3, 0)] + "..."
+
+def _inspect():
+    shell = get_ipython()
+    hidden = set(getattr(shell, "user_ns_hidden", ()))
+    names, pattern = _options["names"], _options["pattern"]
+    variables, total = [], 0
+    for name, value in list(_user_ns.items()):
+        if names is not None:
+            if name not in names:
+                continue
+        elif name.startswith("_") or name in hidden or (not _options["include_callables"] and isinstance(value, _CALLABLES)):
+            continue
+        if pattern and not fnmatch.fnmatchcase(name, pattern):
+            continue
+        total += 1
+        if _options["limit"] > 0 and len(variables) >= _options["limit"]:
+            continue
+        row = {"name": name, "type": _type_name(value)}
+        for column, function in (("shape", _shape), ("dtype", _dtype), ("size", _size), ("preview", _preview)):
+            try:
+                row[column] = function(value)
+            except Exception:
+                row[column] = ""
+        variables.append(row)
+    missing = [name for name in names if name not in _user_ns] if names is not None else []
+    return {"total": total, "variables": variables, "missing": missing}
+
+print(json.dumps(_inspect(), default=str))
+'''
+
+def build_inspection_code(
+    names: Optional[list[str]] = None, pattern: Optional[str] = None, include_callables: bool = False,
+    preview_chars: int = 80, limit: int = 50) -> str:
+    """
+    生成在内核中检查用户变量的代码, 执行时不会修改用户命名空间
+    Build the code inspecting the user variables in the kernel, it does not modify the user namespace when executed
+
+    Args:
+        names: 只检查这些变量(None表示全部) / Only inspect these variables (None means all)
+        pattern: 只检查名称匹配该通配符模式的变量 / Only inspect the variables whose name matches this glob pattern
+        include_callables: 是否包含模块、函数与类 / Whether to include modules, functions and classes
+        preview_chars: 预览的最大字符数 / Maximum characters of the preview
+        limit: 最多返回的变量数(0表示不限制) / Maximum number of variables to return (0 means no limit)
+
+    Returns:
+        代码 / The code
+    """
+    options = {
+        "names": list(names) if names is not None else None, "pattern": pattern or None,
+        "include_callables": include_callables, "preview_chars": max(preview_chars, 0), "limit": max(limit, 0),
+    }
+    # exec的返回值为None, 不会进入Out历史; 检查程序的名称都在独立的全局命名空间中
+    # exec returns None, so nothing enters the Out history; the names of the routine live in their own global namespace
+    return (
+        f"exec(compile({_INSPECTOR_SOURCE!r}, '<inspect_variables>', 'exec'), "
+        f"{{'__builtins__': __builtins__, '__name__': '__inspect_variables__', "
+        f"'get_ipython': get_ipython, '_user_ns': get_ipython().user_ns, '_options': {options!r}}})"
+    )
+
+def _format_size(size: Any) -> str:
+    """Human readable size in bytes"""
+    if not isinstance(size, (int, float)):
+        return ""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def parse_inspection(outputs: list[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    """
+    从执行输出中解析检查结果
+    Parse the inspection result from the execution outputs
+
+    Args:
+        outputs: execute_code返回的输出 / The outputs returned by execute_code
+
+    Returns:
+        检查结果, 无法解析时为None / The inspection result, None if it cannot be parsed
+    """
+    text = "".join(output.get("text", "") for output in outputs if output.get("output_type") == "stream" and output.get("name") == "stdout")
+    lines = text.strip().splitlines()
+    if not lines:
+        return None
+    try:
+        return json.loads(lines[-1])
+    except json.JSONDecodeError:
+        return None
+
+def format_variables(result: dict[str, Any]) -> str:
+    """
+    将检查结果格式化为表格
+    Format the inspection result as a table
+
+    Args:
+        result: parse_inspection的结果 / The result of parse_inspection
+
+    Returns:
+        格式化后的结果 / The formatted result
+    """
+    variables = result["variables"]
+    lines = [f"Showing {len(variables)} of {result['total']} variables"]
+    if result.get("missing"):
+        lines.append("Not defined: " + ", ".join(result["missing"]))
+    if variables:
+        lines.append(format_table(
+            ["Name", "Type", "Shape/Len", "Dtype", "Size", "Preview"],
+            [[variable["name"], variable["type"], variable["shape"], variable["dtype"], _format_size(variable["size"]), variable["preview"]] for variable in variables]
+        ))
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from jupyter_nbmodel_client import NotebookModel
+
+from better_jupyter_mcp_server.utils.autosave import AutoSaver
+
+
+class _RecordingSaver(AutoSaver):
+    def __init__(self, session):
+        super().__init__(session, None, debounce=0.01, max_delay=1)
+        self.written = []
+
+    def _write(self, content):
+        self.written.append(content)
+
+
+def _session(synced: bool = True) -> SimpleNamespace:
+    notebook = NotebookModel()
+    notebook._doc.set({"cells": [], "metadata": {}, "nbformat": 4, "nbformat_minor": 5})
+    notebook.synced = synced
+    return SimpleNamespace(notebook=notebook, notebook_info={"path": "test.ipynb"})
+
+
+def test_request_during_resync_is_retried():
+    async def scenario():
+        session = _session(synced=False)
+        saver = _RecordingSaver(session)
+        saver.schedule()
+        await asyncio.sleep(0.05)
+        assert saver.pending and not saver.written
+        session.notebook.synced = True
+        await asyncio.sleep(0.05)
+        assert not saver.pending and len(saver.written) == 1
+
+    asyncio.run(scenario())
+
+
+def test_unchanged_document_is_not_serialized_again():
+    async def scenario():
+        session = _session()
+        saver = _RecordingSaver(session)
+        serialized = []
+        as_dict = session.notebook.as_dict
+        session.notebook.as_dict = lambda: serialized.append(1) or as_dict()
+        session.notebook.add_code_cell("x = 1")
+        saver.schedule()
+        await saver.flush()
+        assert saver.save_count == 1
+
+        saver.schedule()
+        await saver.flush()
+        assert saver.save_count == 1 and saver.skip_count == 1 and len(serialized) == 1
+
+        session.notebook.add_code_cell("y = 2")
+        saver.schedule()
+        await saver.flush()
+        assert saver.save_count == 2
+
+    asyncio.run(scenario())
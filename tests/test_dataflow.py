@@ -0,0 +1,47 @@
+from better_jupyter_mcp_server.utils.dataflow import affected_cells, analyze_cell, build_dependencies
+
+
+def _affected(*sources: str, start: int = 0) -> set[int]:
+    return set(affected_cells(build_dependencies([analyze_cell(source) for source in sources]), start))
+
+
+def test_assignment_defines_and_uses():
+    flow = analyze_cell("y = x + 1")
+    assert flow.defines == {"y"}
+    assert flow.uses == {"x"}
+
+
+def test_read_after_write_follows_readers():
+    assert _affected("x = 1", "y = x + 1", "print(y)", "z = 3") == {0, 1, 2}
+
+
+def test_write_after_write_reruns_redefinition():
+    assert _affected("x = 1", "x = 2", "print(x)") == {0, 1, 2}
+
+
+def test_except_name_is_not_a_use():
+    flow = analyze_cell("try:\n    f()\nexcept ValueError as e:\n    print(e)")
+    assert "e" not in flow.uses
+    assert "e" not in flow.defines
+
+
+def test_match_captures_are_definitions():
+    source = "match point:\n    case (a, *rest):\n        print(a, rest)\n    case {'k': v, **others}:\n        print(v, others)\n    case _:\n        pass"
+    flow = analyze_cell(source)
+    assert flow.uses == {"point"}
+    assert {"a", "rest", "v", "others"} <= flow.defines
+
+
+def test_definition_in_one_branch_does_not_hide_use_in_other():
+    flow = analyze_cell("if flag:\n    x = 1\nelse:\n    print(x)")
+    assert flow.uses == {"flag", "x"}
+    assert flow.defines == {"x"}
+
+
+def test_conditional_definition_does_not_hide_later_use():
+    assert analyze_cell("if flag:\n    x = 1\nprint(x)").uses == {"flag", "x"}
+    assert analyze_cell("if flag:\n    x = 1\nelse:\n    x = 2\nprint(x)").uses == {"flag"}
+
+
+def test_loop_body_may_not_run():
+    assert analyze_cell("for item in items:\n    x = item\nprint(x)").uses == {"items", "x"}
@@ -0,0 +1,101 @@
+import pycrdt
+import pytest
+from jupyter_nbmodel_client import NotebookModel
+
+from better_jupyter_mcp_server.utils.edit import CellOperation, apply_cell_operations, diff_text, patch_text, set_cell_source, update_text
+
+
+def _apply(old: str, edits: list[tuple[int, int, str]]) -> str:
+    for start, end, replacement in reversed(edits):
+        old = old[:start] + replacement + old[end:]
+    return old
+
+
+def _notebook(*sources: str) -> NotebookModel:
+    notebook = NotebookModel()
+    cells = [{"cell_type": "code", "source": source, "metadata": {}, "outputs": [], "execution_count": None} for source in sources]
+    notebook._doc.set({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5})
+    return notebook
+
+
+def _sources(notebook: NotebookModel) -> list[str]:
+    return [str(cell["source"]) for cell in notebook._doc.ycells]
+
+
+@pytest.mark.parametrize("old, new", [
+    ("", "x = 1"),
+    ("x = 1", ""),
+    ("a = 1\nb = 2\nc = 3\n", "a = 1\nb = 20\nc = 3\nd = 4\n"),
+    ("print('héllo')\n# 注释\n", "print('héllo wörld')\n# 新的注释\n"),
+])
+def test_diff_text_turns_old_into_new(old, new):
+    assert _apply(old, diff_text(old, new)) == new
+
+
+def test_diff_text_is_proportional_to_the_change():
+    old = "".join(f"line_{i} = {i}\n" for i in range(1000))
+    new = old.replace("line_500 = 500", "line_500 = 5000")
+    assert diff_text(old, new) == [(old.index("500\n", old.index("line_500")) + 3, old.index("500\n", old.index("line_500")) + 3, "0")]
+
+
+@pytest.mark.parametrize("old, new", [
+    ("a🙂b", "a🙂xb"),
+    ("🙂🙂🙂", "🙂🎉🙂"),
+    ("x = '日本'\ny = 1", "x = '日本語'\ny = 2"),
+    ("é\n🙂\nend", "end"),
+])
+def test_update_text_handles_multi_byte_characters(old, new):
+    text = pycrdt.Doc().get("source", type=pycrdt.Text)
+    text += old
+    assert update_text(text, new) == old
+    assert str(text) == new
+
+
+def test_set_cell_source_only_touches_the_cell():
+    notebook = _notebook("a = '🙂'", "b = 2")
+    assert set_cell_source(notebook, 0, "a = '🙂🎉'") == "a = '🙂'"
+    assert _sources(notebook) == ["a = '🙂🎉'", "b = 2"]
+
+
+def test_patch_text_replaces_a_unique_match():
+    assert patch_text("x = 1\ny = 2", "y = 2", "y = 3") == "x = 1\ny = 3"
+    assert patch_text("a a", "a", "b", replace_all=True) == "b b"
+
+
+@pytest.mark.parametrize("source, old_text, message", [
+    ("x = 1", "", "empty"),
+    ("x = 1", "x = 2", "not found"),
+    ("x = 1", "x  = 1", "not found"),
+    ("x = 1\nx = 1", "x = 1", "occurs 2 times"),
+])
+def test_patch_text_rejects_absent_or_ambiguous_matches(source, old_text, message):
+    with pytest.raises(ValueError, match=message):
+        patch_text(source, old_text, "y")
+
+
+def test_apply_cell_operations_uses_original_indices():
+    notebook = _notebook("c0", "c1", "c2")
+    results = apply_cell_operations(notebook, [
+        CellOperation(op="delete", cell_index=1),
+        CellOperation(op="insert", cell_index=1, cell_content="new1"),
+        CellOperation(op="overwrite", cell_index=2, cell_content="c2 🙂"),
+        CellOperation(op="insert", cell_index=3, cell_type="markdown", cell_content="end"),
+        CellOperation(op="insert", cell_index=0, cell_content="first"),
+    ])
+    assert _sources(notebook) == ["first", "c0", "new1", "c2 🙂", "end"]
+    assert results == [[0, "delete", 1, "-"], [1, "insert", 1, 2], [2, "overwrite", 2, 3], [3, "insert", 3, 4], [4, "insert", 0, 0]]
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([CellOperation(op="insert", cell_index=3)], "out of range"),
+    ([CellOperation(op="delete", cell_index=-1)], "out of range"),
+    ([CellOperation(op="overwrite", cell_index=2)], "out of range"),
+    ([CellOperation(op="delete", cell_index=0), CellOperation(op="delete", cell_index=0)], "already deleted"),
+    ([CellOperation(op="overwrite", cell_index=0), CellOperation(op="delete", cell_index=0)], "overwritten"),
+    ([CellOperation(op="delete", cell_index=0), CellOperation(op="overwrite", cell_index=0)], "already deleted"),
+])
+def test_apply_cell_operations_rejects_invalid_batches_atomically(operations, message):
+    notebook = _notebook("c0", "c1")
+    with pytest.raises(ValueError, match=message):
+        apply_cell_operations(notebook, [CellOperation(op="insert", cell_index=0, cell_content="x"), *operations])
+    assert _sources(notebook) == ["c0", "c1"]
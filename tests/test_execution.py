@@ -0,0 +1,108 @@
+import asyncio, queue, threading
+from types import SimpleNamespace
+
+import pytest
+
+from better_jupyter_mcp_server.utils import execution
+from better_jupyter_mcp_server.utils.execution import execute_code
+
+
+class _Channel:
+    def __init__(self):
+        self.messages: queue.Queue = queue.Queue()
+
+    def get_msg(self, timeout=None):
+        return self.messages.get_nowait()
+
+
+class _FakeKernel:
+    """
+    Kernel client answering each request according to a script:
+    "ok", "error", "hang" (until interrupted), "late_reply" or "no_reply"
+    """
+
+    def __init__(self, behaviour: str):
+        self.behaviour = behaviour
+        self.interrupts = 0
+        self.msg_id = None
+        self._manager = SimpleNamespace(client=SimpleNamespace(
+            iopub_channel=_Channel(), shell_channel=_Channel(), execute=self._execute
+        ))
+
+    def _send(self, channel: str, msg_type: str, **content):
+        message = {"header": {"msg_type": msg_type}, "parent_header": {"msg_id": self.msg_id}, "content": content}
+        getattr(self._manager.client, channel).messages.put(message)
+
+    def _finish(self, status: str, reply: bool = True):
+        self._send("iopub_channel", "status", execution_state="idle")
+        if reply:
+            self._send("shell_channel", "execute_reply", status=status, execution_count=7)
+
+    def _execute(self, code, **kwargs):
+        self.msg_id = f"msg-{code}"
+        self._send("iopub_channel", "status", execution_state="busy")
+        self._send("iopub_channel", "execute_input", code=code, execution_count=7)
+        if self.behaviour == "hang":
+            return self.msg_id
+        if self.behaviour == "error":
+            self._send("iopub_channel", "error", ename="ValueError", evalue="boom", traceback=[])
+        else:
+            self._send("iopub_channel", "stream", name="stdout", text="hello\n")
+        if self.behaviour == "late_reply":
+            self._finish("ok", reply=False)
+            threading.Timer(1.2, lambda: self._send("shell_channel", "execute_reply", status="ok", execution_count=7)).start()
+        else:
+            self._finish("error" if self.behaviour == "error" else "ok", reply=self.behaviour != "no_reply")
+        return self.msg_id
+
+    def interrupt(self):
+        self.interrupts += 1
+        self._send("iopub_channel", "error", ename="KeyboardInterrupt", evalue="", traceback=[])
+        self._finish("error")
+
+
+@pytest.fixture(autouse=True)
+def short_grace_period(monkeypatch):
+    monkeypatch.setattr(execution, "INTERRUPT_GRACE_PERIOD", 0.5)
+
+
+@pytest.mark.parametrize("behaviour, status", [("ok", "ok"), ("error", "error"), ("late_reply", "ok")])
+def test_execute_code_reports_reply_status(behaviour, status):
+    kernel = _FakeKernel(behaviour)
+    result = asyncio.run(execute_code(kernel, "x", timeout=3))
+    assert result["status"] == status
+    assert result["execution_count"] == 7
+    assert kernel.interrupts == 0
+
+
+@pytest.mark.parametrize("behaviour, status", [("no_reply", "ok"), ("error", "error")])
+def test_execute_code_infers_status_without_reply(behaviour, status):
+    kernel = _FakeKernel(behaviour)
+    kernel._finish = lambda status, reply=True: _FakeKernel._finish(kernel, status, reply=False)
+    result = asyncio.run(execute_code(kernel, "x", timeout=0.1))
+    assert result["status"] == status
+    assert result["execution_count"] == 7
+
+
+def test_execute_code_interrupts_on_timeout_and_drains():
+    kernel = _FakeKernel("hang")
+    result = asyncio.run(execute_code(kernel, "x", timeout=0.1))
+    assert result["status"] == "timeout"
+    assert kernel.interrupts == 1
+    assert [output["output_type"] for output in result["outputs"]] == ["error"]
+    assert kernel._manager.client.iopub_channel.messages.empty()
+
+
+def test_execute_code_interrupts_and_drains_when_cancelled():
+    kernel = _FakeKernel("hang")
+
+    async def scenario():
+        task = asyncio.create_task(execute_code(kernel, "x", timeout=10))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert kernel.interrupts == 1
+    assert kernel._manager.client.iopub_channel.messages.empty()
@@ -0,0 +1,38 @@
+from jupyter_nbmodel_client import NotebookModel
+
+from better_jupyter_mcp_server.utils.index import CellIndex, build_search_query
+
+
+def _notebook(*sources: str) -> NotebookModel:
+    notebook = NotebookModel()
+    cells = [{"cell_type": "code", "source": source, "metadata": {}, "outputs": [], "execution_count": None} for source in sources]
+    notebook._doc.set({"cells": cells, "metadata": {}, "nbformat": 4, "nbformat_minor": 5})
+    return notebook
+
+
+def _search(index: CellIndex, query: str) -> list[int]:
+    words, matcher = build_search_query(query, "term")
+    hits, _ = index.search(words, matcher)
+    return [hit.cell_index for hit in hits]
+
+
+def test_search_follows_edits():
+    notebook = _notebook("alpha = 1", "beta = 2")
+    index = CellIndex(notebook)
+    assert _search(index, "beta") == [1]
+    source = notebook._doc.ycells[1]["source"]
+    source += "\ngamma = 3"
+    notebook.insert_code_cell(0, "gamma = 0")
+    assert _search(index, "gamma") == [0, 2]
+
+
+def test_words_of_edited_and_deleted_cells_are_dropped():
+    notebook = _notebook("alpha = 1", "beta = 2")
+    index = CellIndex(notebook)
+    _search(index, "alpha")
+    for step in range(20):
+        notebook._doc.ycells[0]["source"] = f"temporary_{step} = {step}"
+        _search(index, "alpha")
+    notebook.delete_cell(1)
+    _search(index, "alpha")
+    assert set(index._postings) == {"temporary_19", "19"}
@@ -0,0 +1,31 @@
+from better_jupyter_mcp_server.utils.output import OUTPUT_STORE, OutputBudget, page_output
+
+
+def test_spilled_output_is_keyed_by_cell_id():
+    OUTPUT_STORE.discard("test")
+    long_output = "line\n" * 100
+    OutputBudget(max_bytes=50, max_lines=5).apply([long_output], "test", 0, "cell-a")
+    assert OUTPUT_STORE.get("test", "cell-a", 0) == long_output
+    # 插入Cell后索引0是另一个Cell / After inserting a cell, index 0 is another cell
+    assert OUTPUT_STORE.get("test", OUTPUT_STORE.cell_key(0, "cell-b"), 0) is None
+
+
+def test_cells_without_id_use_their_index():
+    OUTPUT_STORE.discard("test")
+    OutputBudget(max_bytes=10, max_lines=5).apply(["x" * 100], "test", 3)
+    assert OUTPUT_STORE.get("test", OUTPUT_STORE.cell_key(3, None), 0) == "x" * 100
+
+
+def test_page_output_stays_within_byte_budget_for_non_ascii():
+    text = "你好世界" * 50 + "\n" + "🙂" * 40
+    pages = []
+    offset = 0
+    while True:
+        page = page_output(text, offset, 1, max_bytes=30)
+        body = page.split("=====\n")[-1]
+        assert len(body.encode("utf-8")) <= 30
+        pages.append(body)
+        if "Use offset" not in page:
+            break
+        offset += 1
+    assert "".join(pages) == text
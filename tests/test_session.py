@@ -0,0 +1,49 @@
+import asyncio
+
+from better_jupyter_mcp_server.utils.session import SessionRegistry
+
+
+def test_sessions_are_keyed_by_mcp_session_id():
+    async def scenario():
+        registry = SessionRegistry(max_sessions=0, idle_timeout=0)
+        async with registry.lifespan():
+            async with registry.use("a") as first, registry.use("b") as second:
+                assert first is not second
+            async with registry.use("a") as again:
+                assert again is first
+            assert len(registry) == 2
+        # 生命周期结束时关闭其间打开的会话 / The sessions opened during a lifespan are closed when it ends
+        assert len(registry) == 0
+        await registry.close_all()
+
+    asyncio.run(scenario())
+
+
+def test_busy_session_is_not_closed_as_idle():
+    async def scenario():
+        registry = SessionRegistry(max_sessions=0, idle_timeout=0.01)
+        async with registry.use("a") as manager:
+            await asyncio.sleep(0.05)
+            await registry._sweep()
+            assert len(registry) == 1
+            async with registry.use("a") as again:
+                assert again is manager
+        # 调用结束时刷新最近使用时间 / The last use is refreshed when a call ends
+        await registry._sweep()
+        assert len(registry) == 1
+        await asyncio.sleep(0.05)
+        await registry._sweep()
+        assert len(registry) == 0
+        await registry.close_all()
+
+    asyncio.run(scenario())
+
+
+def test_no_session_without_key():
+    async def scenario():
+        registry = SessionRegistry()
+        async with registry.use(None) as manager:
+            assert manager is None
+        assert len(registry) == 0
+
+    asyncio.run(scenario())
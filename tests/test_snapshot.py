@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+import jupyter_nbmodel_client
+
+from better_jupyter_mcp_server.utils import notebook as notebook_module
+from better_jupyter_mcp_server.utils.notebook import NotebookSession
+from better_jupyter_mcp_server.utils.snapshot import NotebookSnapshot
+
+
+class _FakeContents:
+    def __init__(self):
+        self.last_modified = "2025-01-01T00:00:00Z"
+        self.size = 100
+        self.source = "x = 1"
+        self.calls = []
+
+    def get(self, path, type=None, content=True):
+        self.calls.append(content)
+        model = SimpleNamespace(last_modified=self.last_modified, size=self.size, content=None)
+        if content:
+            model.content = {"cells": [{"cell_type": "code", "id": "a", "source": self.source}]}
+        return model
+
+
+class _FakeNbModelClient:
+    def __init__(self, ws_url, path):
+        self.synced = False
+
+    async def start(self):
+        self.synced = True
+
+    async def stop(self):
+        self.synced = False
+
+
+def _session(monkeypatch, enabled: bool = True) -> tuple[NotebookSession, _FakeContents]:
+    monkeypatch.setattr(notebook_module, "READ_SNAPSHOT", enabled)
+    monkeypatch.setattr(jupyter_nbmodel_client, "NbModelClient", _FakeNbModelClient)
+    monkeypatch.setattr(jupyter_nbmodel_client, "get_jupyter_notebook_websocket_url", lambda **kwargs: "ws://test")
+    contents = _FakeContents()
+    session = NotebookSession({"server_url": "http://test", "token": "", "path": "test.ipynb"}, SimpleNamespace(contents=contents))
+    return session, contents
+
+
+def test_snapshot_is_revalidated_by_modification_time_and_size(monkeypatch):
+    async def scenario():
+        session, contents = _session(monkeypatch)
+        first = await session.acquire()
+        assert isinstance(first, NotebookSnapshot) and first[0]["source"] == "x = 1"
+        # 文件未改变时只发送不含内容的请求 / Only a request without content while the file is unchanged
+        assert await session.acquire() is first
+        assert contents.calls == [True, False]
+
+        contents.size, contents.source = 120, "x = 2"
+        second = await session.acquire()
+        assert second is not first and second[0]["source"] == "x = 2"
+        assert contents.calls == [True, False, False, True]
+
+        contents.last_modified, contents.source = "2025-01-02T00:00:00Z", "x = 3"
+        assert (await session.acquire())[0]["source"] == "x = 3"
+
+    asyncio.run(scenario())
+
+
+def test_first_write_switches_to_the_collaboration_session(monkeypatch):
+    async def scenario():
+        session, contents = _session(monkeypatch)
+        assert isinstance(await session.acquire(), NotebookSnapshot)
+        notebook = await session.acquire(writable=True)
+        assert isinstance(notebook, _FakeNbModelClient) and notebook.synced
+        # 之后的只读操作同样使用协作会话, 即使其断开后重连 / Later reads use the collaboration session too, even after it reconnects
+        assert await session.acquire() is notebook
+        notebook.synced = False
+        assert isinstance(await session.acquire(), _FakeNbModelClient)
+        assert contents.calls == [True]
+
+    asyncio.run(scenario())
+
+
+def test_reads_use_the_collaboration_session_when_disabled(monkeypatch):
+    async def scenario():
+        session, contents = _session(monkeypatch, enabled=False)
+        assert isinstance(await session.acquire(), _FakeNbModelClient)
+        assert contents.calls == []
+
+    asyncio.run(scenario())